@@ -4,6 +4,8 @@ VERSION = (0, 6, 0)
 __version__ = '.'.join(str(v) for v in VERSION)
 
 
+default_app_config = 'partial_index.apps.PartialIndexConfig'
+
 __all__ = ['PartialIndex', 'PQ', 'PF', 'ValidatePartialUniqueMixin', 'PartialUniqueValidationError']
 
 
@@ -0,0 +1,298 @@
+"""Recommending PartialIndexes from captured query logs, without connecting to the database.
+
+Two kinds of logs are read: CSV dumps of pg_stat_statements (with a header row, and the columns query, calls and
+total_time or total_exec_time), and the debug log of the django.db.backends logger.
+
+The WHERE clause of each query is split into AND-ed comparisons. Comparisons with placeholders or varying values
+become the indexed fields, equality comparisons first. Comparisons with a constant, such as "deleted_at IS NULL",
+or a literal that is the same in every logged query, such as "status = 'open'", become the where condition.
+Only queries with at least one such constant get a recommendation, as others are better served by regular indexes.
+Recommendations are ranked by the total time of the queries they would serve.
+"""
+from collections import OrderedDict
+import csv
+import re
+
+from django.apps import apps
+
+from . import redundancy
+from .query import PQ
+
+
+DJANGO_LOG_RE = re.compile(r'\((\d+(?:\.\d+)?)\) (.*?); args=.*$')
+KEYWORDS = r'(?!(?:WHERE|SET|INNER|LEFT|RIGHT|FULL|CROSS|JOIN|ON|ORDER|GROUP|LIMIT|FOR)\b)'
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+"?(\w+)"?(?:\s+(?:AS\s+)?%s"?(\w+)"?)?' % KEYWORDS, re.IGNORECASE)
+WHERE_RE = re.compile(r'\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bFOR\s+UPDATE\b|\bRETURNING\b|$)',
+                      re.IGNORECASE | re.DOTALL)
+ORDER_BY_RE = re.compile(r'\bORDER\s+BY\b(.*?)(?:\bLIMIT\b|\bOFFSET\b|\bFOR\s+UPDATE\b|$)', re.IGNORECASE | re.DOTALL)
+COLUMN = r'(?:"?(\w+)"?\.)?"?(\w+)"?'
+NULL_RE = re.compile(r'^%s\s+IS\s+(NOT\s+)?NULL$' % COLUMN, re.IGNORECASE)
+COMPARISON_RE = re.compile(r'^%s\s*(=|<>|!=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bILIKE\b)\s*(.+)$' % COLUMN, re.IGNORECASE | re.DOTALL)
+PLACEHOLDER_RE = re.compile(r'^(\$\d+|%s|\?)$')
+STRING_RE = re.compile(r"^'((?:[^']|'')*)'$")
+NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+
+RANGE_OPERATORS = ('<', '>', '<=', '>=', 'LIKE', 'ILIKE')
+PARAMETER = object()
+
+
+class QueryStat(object):
+    """One logged query, or a group of identical queries, with their number of calls and total time in ms."""
+
+    def __init__(self, sql, calls=1, total_time=0.0):
+        self.sql = sql
+        self.calls = calls
+        self.total_time = total_time
+
+
+def read_django_log(lines):
+    """Yields QueryStats from the lines of a django.db.backends debug log. Other lines are ignored."""
+    for line in lines:
+        match = DJANGO_LOG_RE.search(line.strip())
+        if match:
+            yield QueryStat(match.group(2), total_time=float(match.group(1)) * 1000)
+
+
+def read_pg_stat_statements(lines):
+    """Yields QueryStats from the lines of a CSV dump of pg_stat_statements."""
+    for row in csv.DictReader(lines):
+        total_time = row.get('total_exec_time', row.get('total_time')) or 0
+        yield QueryStat(row['query'], calls=int(row.get('calls') or 1), total_time=float(total_time))
+
+
+def read_log(lines):
+    """Yields QueryStats from either kind of log, detected from its first line."""
+    lines = iter(lines)
+    first = next(lines, '')
+    header = [column.strip().strip('"') for column in first.split(',')]
+
+    def all_lines():
+        yield first
+        for line in lines:
+            yield line
+
+    if 'query' in header and 'calls' in header:
+        return read_pg_stat_statements(all_lines())
+    return read_django_log(all_lines())
+
+
+def _scan(sql):
+    """Yields (index, character, parenthesis depth) for sql, skipping over string literals."""
+    depth, i = 0, 0
+    while i < len(sql):
+        char = sql[i]
+        if char == "'":
+            i += 1
+            while i < len(sql) and (sql[i] != "'" or sql[i + 1:i + 2] == "'"):
+                i += 2 if sql[i] == "'" else 1
+        elif char == '(':
+            depth += 1
+            yield i, char, depth
+        elif char == ')':
+            depth -= 1
+            yield i, char, depth
+        else:
+            yield i, char, depth
+        i += 1
+
+
+def _split_top_level(sql, separator_re):
+    """Splits sql on separator_re, outside of parentheses and string literals."""
+    parts, start, skip_to = [], 0, 0
+    for i, char, depth in _scan(sql):
+        if i < skip_to or depth != 0 or (i > 0 and (sql[i - 1].isalnum() or sql[i - 1] == '_')):
+            continue
+        match = separator_re.match(sql, i)
+        if match:
+            parts.append(sql[start:i])
+            start = skip_to = match.end()
+    parts.append(sql[start:])
+    return [part.strip() for part in parts]
+
+
+def _strip_parentheses(sql):
+    """Removes parentheses around all of sql."""
+    sql = sql.strip()
+    while sql.startswith('(') and sql.endswith(')'):
+        closing = next(i for i, char, depth in _scan(sql) if char == ')' and depth == 0)
+        if closing != len(sql) - 1:
+            break
+        sql = sql[1:-1].strip()
+    return sql
+
+
+def _literal(sql):
+    """Returns the Python value of a SQL literal, PARAMETER for placeholders, or raises ValueError."""
+    sql = sql.strip()
+    if PLACEHOLDER_RE.match(sql):
+        return PARAMETER
+    match = STRING_RE.match(sql)
+    if match:
+        return match.group(1).replace("''", "'")
+    if NUMBER_RE.match(sql):
+        return float(sql) if '.' in sql else int(sql)
+    if sql.lower() in ('true', 'false'):
+        return sql.lower() == 'true'
+    raise ValueError(sql)
+
+
+def _tables(sql):
+    """Returns the table in FROM (or UPDATE), and a dict mapping the aliases of all tables in sql to table names."""
+    main_table, aliases = None, {}
+    for match in TABLE_RE.finditer(sql):
+        main_table = main_table or match.group(1)
+        aliases[match.group(1)] = match.group(1)
+        if match.group(2):
+            aliases[match.group(2)] = match.group(1)
+    return main_table, aliases
+
+
+def parse_conditions(sql):
+    """Returns the comparisons in the WHERE clause of sql, as a list of (table, column, operator, value) tuples.
+
+    operator is "isnull" for IS [NOT] NULL, with value True or False. value is PARAMETER for placeholders and
+    lists of values. Only comparisons AND-ed together at the top level are returned, and only if they compare
+    a column of the table in FROM, or of a joined table, with a literal or placeholder.
+    """
+    main_table, aliases = _tables(sql)
+    where = WHERE_RE.search(sql)
+    if main_table is None or not where:
+        return []
+
+    conditions = []
+    for part in _split_top_level(_strip_parentheses(where.group(1)), re.compile(r'AND\b', re.IGNORECASE)):
+        part = _strip_parentheses(part)
+        match = NULL_RE.match(part)
+        if match:
+            qualifier, column = match.group(1), match.group(2)
+            operator, value = 'isnull', not match.group(3)
+        else:
+            match = COMPARISON_RE.match(part)
+            if not match:
+                continue
+            qualifier, column, operator = match.group(1), match.group(2), match.group(3).upper()
+            if operator == 'IN':
+                value = PARAMETER
+            else:
+                try:
+                    value = _literal(match.group(4))
+                except ValueError:
+                    continue
+        table = main_table if qualifier is None else aliases.get(qualifier)
+        if table is not None:
+            conditions.append((table, column, operator, value))
+    return conditions
+
+
+def parse_order_by(sql):
+    """Returns the (table, column, descending) of the ORDER BY columns of sql."""
+    main_table, aliases = _tables(sql)
+    match = ORDER_BY_RE.search(sql)
+    if main_table is None or not match:
+        return []
+    columns = []
+    for part in _split_top_level(match.group(1), re.compile(r',')):
+        column_match = re.match(r'^%s(?:\s+(ASC|DESC))?$' % COLUMN, part.strip(), re.IGNORECASE)
+        if not column_match:
+            return []
+        table = main_table if column_match.group(1) is None else aliases.get(column_match.group(1))
+        columns.append((table, column_match.group(2), (column_match.group(3) or '').upper() == 'DESC'))
+    return columns
+
+
+class Recommendation(object):
+    """A proposed PartialIndex, with the calls and total time of the logged queries it would serve."""
+
+    def __init__(self, model, fields, where):
+        self.model = model
+        self.fields = fields
+        self.where = where
+        self.calls = 0
+        self.total_time = 0.0
+
+    def __repr__(self):
+        return '<%s: %s %s>' % (self.__class__.__name__, self.model._meta.label, self.declaration())
+
+    def declaration(self):
+        """Returns the PartialIndex declaration, ready for Meta.indexes."""
+        lookups = ', '.join('%s=%r' % (lookup, value) for lookup, value in self.where)
+        return 'PartialIndex(fields=%r, unique=False, where=PQ(%s)),' % (self.fields, lookups)
+
+
+def _resolve(tables, table, column):
+    model = tables.get(table)
+    if model is None:
+        return None, None
+    for field in model._meta.concrete_fields:
+        if field.column == column:
+            return model, field
+    return model, None
+
+
+def _is_covered(model, fields, where):
+    candidate = redundancy.TableIndex(
+        model, 'candidate', [(field.lstrip('-'), 'DESC' if field.startswith('-') else '') for field in fields],
+        where=PQ(**dict(where)))
+    return any(redundancy.redundancy(candidate, existing) for existing in redundancy.model_indexes(model))
+
+
+def recommend(stats, models=None):
+    """Returns a list of Recommendations for the QueryStats, ranked by total time.
+
+    models defaults to all installed models. Queries on other tables are ignored, as are recommendations
+    already covered by an index of the model.
+    """
+    tables = {model._meta.db_table: model for model in (apps.get_models() if models is None else models)}
+
+    # Group the comparisons of each table by shape: the columns and operators, without the values.
+    shapes = OrderedDict()
+    for stat in stats:
+        conditions = parse_conditions(stat.sql)
+        order_by = parse_order_by(stat.sql)
+        for table in OrderedDict.fromkeys(condition[0] for condition in conditions):
+            table_conditions = [condition for condition in conditions if condition[0] == table]
+            key = (table, tuple(sorted(set((column, operator) for _, column, operator, value in table_conditions))))
+            shape = shapes.setdefault(key, {'calls': 0, 'total_time': 0.0, 'values': {}, 'order_by': None})
+            shape['calls'] += stat.calls
+            shape['total_time'] += stat.total_time
+            for _, column, operator, value in table_conditions:
+                shape['values'].setdefault((column, operator), []).append(value)
+            if shape['order_by'] is None:
+                shape['order_by'] = [(column, desc) for order_table, column, desc in order_by if order_table == table]
+
+    recommendations = OrderedDict()
+    for (table, columns), shape in shapes.items():
+        equal, ranges, where = [], [], []
+        for column, operator in columns:
+            model, field = _resolve(tables, table, column)
+            if field is None:
+                break
+            values = shape['values'][(column, operator)]
+            distinct = [value for i, value in enumerate(values) if value not in values[:i]]
+            if operator == 'isnull':
+                if len(distinct) > 1:
+                    break
+                where.append((field.name + '__isnull', distinct[0]))
+            elif operator == '=' and PARAMETER not in distinct and len(distinct) == 1 and \
+                    (isinstance(distinct[0], bool) or shape['calls'] > 1):
+                where.append((field.name, distinct[0]))
+            elif operator == '=' or operator == 'IN':
+                equal.append(field.name)
+            elif operator in RANGE_OPERATORS:
+                ranges.append(field.name)
+        else:
+            fields = sorted(set(equal)) + [name for name in sorted(set(ranges)) if name not in equal]
+            if not ranges:
+                for column, desc in shape['order_by'] or []:
+                    model, field = _resolve(tables, table, column)
+                    if field is not None and field.name not in fields:
+                        fields.append(('-' if desc else '') + field.name)
+            if not where or not fields or _is_covered(model, fields, where):
+                continue
+            key = (model, tuple(fields), tuple(sorted(where, key=repr)))
+            if key not in recommendations:
+                recommendations[key] = Recommendation(model, fields, sorted(where, key=repr))
+            recommendations[key].calls += shape['calls']
+            recommendations[key].total_time += shape['total_time']
+
+    return sorted(recommendations.values(), key=lambda r: (-r.total_time, -r.calls))
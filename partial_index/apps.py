@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class PartialIndexConfig(AppConfig):
+    name = 'partial_index'
+    verbose_name = 'Partial Index'
+
+    def ready(self):
+        from . import checks  # noqa: F401 registers the system checks
@@ -0,0 +1,84 @@
+"""Partial unique validation for many model instances at once."""
+from collections import defaultdict
+from django.core.exceptions import ImproperlyConfigured, NON_FIELD_ERRORS
+from django.db.models import Q
+
+from .index import PartialIndex
+from . import query
+
+
+def unique_partial_indexes(model):
+    return [idx for idx in model._meta.indexes if isinstance(idx, PartialIndex) and idx.unique]
+
+
+def _where_matches(where, values):
+    try:
+        return query.q_matches(where, values)
+    except query.CannotEvaluate:
+        # The condition is too complex to evaluate in Python. Assume the rows are covered by the index,
+        # which may report duplicates that the database would accept, but never misses real ones.
+        return True
+
+
+def validate_partial_unique_batch(instances, exclude=None, chunk_size=200, using=None):
+    """Checks unique PartialIndexes for many instances of the same model, and returns errors for each instance.
+
+    This finds the conflicts with existing rows that the database would reject, with one query per index for every
+    chunk_size instances, instead of one query per index for every instance. It also finds conflicts between the
+    instances themselves, which per-instance validation cannot see.
+
+    Returns a list with a dict for each instance, mapping field names (or NON_FIELD_ERRORS) to lists of
+    ValidationErrors, in the same format as ValidationError.error_dict. Valid instances have empty dicts.
+    """
+    instances = list(instances)
+    errors = [defaultdict(list) for instance in instances]
+    if not instances:
+        return []
+    model = instances[0].__class__
+    exclude = set(exclude) if exclude else set()
+    manager = model._default_manager.db_manager(using)
+
+    for idx in unique_partial_indexes(model):
+        if not isinstance(idx.where, Q):
+            raise ImproperlyConfigured(
+                'Partial unique validation is not supported for PartialIndexes with a text-based where condition. ' +
+                'Please upgrade to Q-object based where conditions.'
+            )
+        mentioned_fields = sorted(set(idx.fields) | set(query.q_mentioned_fields(idx.where, model)))
+        if set(mentioned_fields) & exclude:
+            continue
+        key_fields = [model._meta.get_field(field_name) for field_name in idx.fields]
+
+        # Group the instances covered by the index by their values of the index fields, as the database compares them.
+        # As in validate_partial_unique(), instances with NULL values in the index fields can never conflict.
+        by_key = defaultdict(list)
+        for i, instance in enumerate(instances):
+            values = {field_name: getattr(instance, model._meta.get_field(field_name).attname) for field_name in mentioned_fields}
+            if any(values[field_name] is None for field_name in idx.fields) or not _where_matches(idx.where, values):
+                continue
+            key = tuple(field.to_python(values[field.name]) for field in key_fields)
+            by_key[key].append(i)
+
+        conflicting = set()
+        # Conflicts between the instances.
+        for key, positions in by_key.items():
+            conflicting.update(positions[1:])
+
+        # Conflicts with existing rows.
+        keys = list(by_key)
+        for start in range(0, len(keys), chunk_size):
+            matching = Q()
+            for key in keys[start:start + chunk_size]:
+                matching |= Q(**{field.name: value for field, value in zip(key_fields, key)})
+            rows = manager.filter(matching).filter(idx.where).values_list('pk', *idx.fields)
+            for row in rows:
+                key = tuple(field.to_python(value) for field, value in zip(key_fields, row[1:]))
+                for i in by_key.get(key, []):
+                    if instances[i].pk is None or instances[i].pk != row[0]:
+                        conflicting.add(i)
+
+        error_key = idx.fields[0] if len(idx.fields) == 1 else NON_FIELD_ERRORS
+        for i in sorted(conflicting):
+            errors[i][error_key].append(instances[i].unique_error_message(model, sorted(idx.fields)))
+
+    return [dict(instance_errors) for instance_errors in errors]
@@ -0,0 +1,76 @@
+"""Request-scoped caching of partial unique conflict lookups.
+
+The same instance is often validated several times while handling one request, for example by a ModelForm
+and again by full_clean() before saving. Inside partial_unique_cache(), or with PartialUniqueCacheMiddleware,
+ValidatePartialUniqueMixin remembers the result of each conflict lookup and does not repeat it.
+
+Cached results of a model are discarded whenever an instance of it is saved or deleted, through the post_save and
+post_delete signals. Changes that do not send these signals, such as QuerySet.update() or raw SQL, are not seen.
+"""
+from contextlib import contextmanager
+import threading
+
+from django.db.models.signals import post_save, post_delete
+
+
+_state = threading.local()
+
+
+def _model_labels(model):
+    concrete_model = model._meta.concrete_model
+    return [concrete_model._meta.label] + [parent._meta.label for parent in concrete_model._meta.get_parent_list()]
+
+
+@contextmanager
+def partial_unique_cache():
+    """Caches conflict lookups until the block exits. Nested blocks share the cache of the outermost block."""
+    outermost = getattr(_state, 'cache', None) is None
+    if outermost:
+        _state.cache = {}
+    try:
+        yield
+    finally:
+        if outermost:
+            _state.cache = None
+
+
+def cached_conflict_exists(model, idx, values, pk, lookup):
+    """Returns the cached result of lookup() for the given index, field values and primary key.
+
+    lookup() is called if caching is not enabled, or the result is not cached yet.
+    """
+    cache = getattr(_state, 'cache', None)
+    if cache is None:
+        return lookup()
+    try:
+        key = (idx.name, tuple(sorted(values.items())), pk)
+        hash(key)
+    except TypeError:
+        # Unhashable values, such as unsaved related instances.
+        return lookup()
+    model_cache = cache.setdefault(_model_labels(model)[0], {})
+    if key not in model_cache:
+        model_cache[key] = lookup()
+    return model_cache[key]
+
+
+def invalidate(sender, **kwargs):
+    cache = getattr(_state, 'cache', None)
+    if cache:
+        for label in _model_labels(sender):
+            cache.pop(label, None)
+
+
+post_save.connect(invalidate, dispatch_uid='partial_index.cache.invalidate')
+post_delete.connect(invalidate, dispatch_uid='partial_index.cache.invalidate')
+
+
+class PartialUniqueCacheMiddleware(object):
+    """Enables partial_unique_cache() for the duration of each request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with partial_unique_cache():
+            return self.get_response(request)
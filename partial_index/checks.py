@@ -0,0 +1,192 @@
+"""System checks for PartialIndexes."""
+from django.core import checks
+from django.core.exceptions import FieldError
+from django.db.migrations import operations
+from django.db.migrations.state import ProjectState
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.db.migrations.exceptions import BadMigrationError, CircularDependencyError, NodeNotFoundError
+
+from . import redundancy
+
+
+def _expression_field_names(value):
+    if isinstance(value, F):
+        yield value.name.split(LOOKUP_SEP)[0]
+    elif hasattr(value, 'get_source_expressions'):
+        for source in value.get_source_expressions():
+            for field_name in _expression_field_names(source):
+                yield field_name
+
+
+def where_field_names(where):
+    """Returns the set of field names mentioned in a Q where condition, without resolving them on a model.
+
+    Index conditions cannot use joins, so the first part of each lookup is a field of the indexed model.
+    """
+    field_names = set()
+    for child in where.children:
+        if isinstance(child, Q):
+            field_names |= where_field_names(child)
+        else:
+            lookup, value = child
+            field_names.add(lookup.split(LOOKUP_SEP)[0])
+            field_names.update(_expression_field_names(value))
+    return field_names
+
+
+def _state_indexes_for_field(state, app_label, model_name, field_name):
+    """Returns the PartialIndexes of a model in a migration ProjectState that reference a field."""
+    from .index import PartialIndex
+
+    model_state = state.models.get((app_label, model_name))
+    if model_state is None:
+        return []
+    referencing = []
+    for idx in model_state.options.get('indexes', []):
+        if isinstance(idx, PartialIndex):
+            field_names = set(field_name.lstrip('-') for field_name in idx.fields)
+            if isinstance(idx.where, Q):
+                field_names |= where_field_names(idx.where)
+            if field_name in field_names or field_name + '_id' in field_names:
+                referencing.append(idx)
+    return referencing
+
+
+def removed_field_warnings(migrations, state=None, app_labels=None):
+    """Returns warnings for fields referenced by a PartialIndex, which the migrations remove or rename.
+
+    migrations must be given in the order they are applied, starting from state (by default an empty
+    ProjectState). Each operation is checked against the indexes of the migration state it is applied to,
+    so fields that no longer exist on the current models are found as well. With app_labels, only the migrations
+    of these apps are reported, but all are applied to the state.
+    """
+    if state is None:
+        state = ProjectState()
+    warnings = []
+    for migration in migrations:
+        app_label = migration.app_label
+        for operation in migration.operations:
+            reported = app_labels is None or app_label in app_labels
+            if reported and isinstance(operation, (operations.RemoveField, operations.RenameField)):
+                field_name = operation.name if isinstance(operation, operations.RemoveField) else operation.old_name
+                for idx in _state_indexes_for_field(state, app_label, operation.model_name_lower, field_name):
+                    if isinstance(operation, operations.RenameField):
+                        msg = 'Migration %s.%s renames field %s.%s to %s, but PartialIndex %s still references it.' % (
+                            app_label, migration.name, operation.model_name_lower, field_name, operation.new_name,
+                            idx.name)
+                        check_id = 'partial_index.W002'
+                    else:
+                        msg = 'Migration %s.%s removes field %s.%s, but PartialIndex %s still references it.' % (
+                            app_label, migration.name, operation.model_name_lower, field_name, idx.name)
+                        check_id = 'partial_index.W001'
+                    warnings.append(checks.Warning(
+                        msg,
+                        hint='Update the fields and where condition of the PartialIndex, and remove or recreate it '
+                             'in the migration before the field is changed.',
+                        obj=idx,
+                        id=check_id,
+                    ))
+            operation.state_forwards(app_label, state)
+    return warnings
+
+
+@checks.register(checks.Tags.models, deploy=True)
+def check_removed_fields(app_configs=None, **kwargs):
+    """Warns about migrations which remove or rename fields that partial indexes depend on.
+
+    Reading all migrations is slow, so this is a deployment check, run by "manage.py check --deploy".
+    """
+    from django.db.migrations.loader import MigrationLoader
+
+    app_labels = None if app_configs is None else set(app_config.label for app_config in app_configs)
+    try:
+        # Migrations are only read from disk, without connecting to the database.
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+
+        # A single pass over all migrations, in the order they are applied, as the state of each app can depend
+        # on the migrations of others.
+        seen = set()
+        migrations = []
+        for leaf in sorted(loader.graph.leaf_nodes()):
+            for key in loader.graph.forwards_plan(leaf):
+                if key not in seen:
+                    seen.add(key)
+                    migrations.append(loader.graph.nodes[key])
+        return removed_field_warnings(migrations, app_labels=app_labels)
+    except (BadMigrationError, CircularDependencyError, NodeNotFoundError, FieldError, LookupError) as e:
+        return [checks.Error(
+            'Could not check migrations for removed fields: %s: %s' % (e.__class__.__name__, e),
+            hint='Fix the migrations or PartialIndexes, or run "manage.py makemigrations --check" for details.',
+            id='partial_index.E002',
+        )]
+
+
+@checks.register(checks.Tags.models, deploy=True)
+def check_index_names(app_configs=None, **kwargs):
+    """Reports index names used more than once in the project, as generated names can collide across tables.
+
+    Index names share one namespace per database schema, so the check covers all installed models, even when
+    only some apps are checked. Like the other checks of all indexes, this is a deployment check.
+    """
+    from django.apps import apps
+    from .index import PartialIndex
+
+    if app_configs:
+        apps = app_configs[0].apps
+    errors = []
+    models_by_name = {}
+    for model in apps.get_models():
+        if model._meta.proxy or not model._meta.managed:
+            continue
+        for idx in model._meta.indexes:
+            if isinstance(idx, PartialIndex):
+                # Generated names are cached by this key, which subclasses may extend.
+                try:
+                    hash(idx.name_hash_cache_key())
+                except Exception as e:
+                    errors.append(checks.Error(
+                        'Could not compute the name cache key of index %s on %s: %s: %s' % (
+                            idx.name, model._meta.label, e.__class__.__name__, e),
+                        hint='name_hash_cache_key() must return a tuple of hashable values.',
+                        obj=model,
+                        id='partial_index.E003',
+                    ))
+            models_by_name.setdefault(idx.name, []).append((model, idx))
+
+    for name, uses in sorted(models_by_name.items()):
+        if len(uses) > 1 and any(isinstance(idx, PartialIndex) for model, idx in uses):
+            errors.append(checks.Error(
+                'Index name %s is used by %d indexes, on %s.' % (
+                    name, len(uses), ', '.join(model._meta.label for model, idx in uses)),
+                hint='Give the PartialIndexes explicit, distinct names.',
+                obj=uses[-1][0],
+                id='partial_index.E001',
+            ))
+    return errors
+
+
+@checks.register(checks.Tags.models, deploy=True)
+def check_redundant_indexes(app_configs=None, **kwargs):
+    """Warns about indexes made redundant by another index on the same table, where one of them is a PartialIndex.
+
+    All pairs of indexes of each model are compared, so this is a deployment check.
+    """
+    from django.apps import apps
+
+    if app_configs is None:
+        models = apps.get_models()
+    else:
+        models = [model for app_config in app_configs for model in app_config.get_models()]
+
+    warnings = []
+    for model in models:
+        for found in redundancy.find_redundant_indexes(model):
+            warnings.append(checks.Warning(
+                found.describe(),
+                hint='Remove index %s, unless it is needed for other reasons. %s' % (
+                    found.index.name, redundancy.describe_write_cost(redundancy.write_cost(found.index, estimate=False))),
+                obj=model,
+                id='partial_index.W003',
+            ))
+    return warnings
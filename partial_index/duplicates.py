@@ -0,0 +1,130 @@
+"""Finding and resolving rows that would violate a unique PartialIndex, before the index is created."""
+from django.db import transaction
+from django.db.models import Count, F, Q
+import time
+
+
+def index_field_names(index):
+    return [field_name for field_name, order in index.fields_orders]
+
+
+def keyset_after(field_names, after):
+    """Returns a Q object matching rows that sort after the key tuple "after", when ordered by field_names.
+
+    (a, b) > (1, 2) becomes Q(a__gt=1) | Q(a=1, b__gt=2).
+    """
+    q = Q()
+    for i, field_name in enumerate(field_names):
+        equal = dict(zip(field_names[:i], after[:i]))
+        equal[field_name + '__gt'] = after[i]
+        q |= Q(**equal)
+    return q
+
+
+def duplicate_groups(model, fields, where, chunk_size=1000, after=None, using=None):
+    """Yields chunks (lists) of duplicate groups for a proposed or existing unique index on model.
+
+    Each group is a dict with the values of fields, and the number of rows sharing them in "duplicate_count".
+    Only rows matching the where condition are considered, and rows with NULL values are ignored,
+    as they cannot violate a unique index.
+
+    Groups are returned in key order. The key of the last yielded group can be given as "after" to resume.
+    Each chunk is a separate keyset-paginated query, so memory use does not depend on the size of the table.
+    """
+    field_names = list(fields)
+    not_null = {field_name + '__isnull': False for field_name in field_names}
+    rows = model._base_manager.using(using).filter(where).filter(**not_null)
+    groups = rows.values(*field_names).annotate(duplicate_count=Count('pk'))
+    groups = groups.filter(duplicate_count__gt=1).order_by(*field_names)
+
+    while True:
+        page = groups
+        if after is not None:
+            page = page.filter(keyset_after(field_names, after))
+        chunk = list(page[:chunk_size].iterator())
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = [chunk[-1][field_name] for field_name in field_names]
+
+
+def duplicate_group_pks(model, fields, where, groups, using=None):
+    """Returns a list of primary key lists, one for each group returned by duplicate_groups()."""
+    field_names = list(fields)
+    keys = [tuple(group[field_name] for field_name in field_names) for group in groups]
+    if not keys:
+        return []
+    matching = Q()
+    for key in keys:
+        matching |= Q(**dict(zip(field_names, key)))
+    pks = {key: [] for key in keys}
+    rows = model._base_manager.using(using).filter(where).filter(matching)
+    for row in rows.order_by('pk').values_list('pk', *field_names).iterator():
+        pks[tuple(row[1:])].append(row[0])
+    return [pks[key] for key in keys]
+
+
+def resolve_duplicates(model, fields, where, order_by='pk', keep='newest', soft_delete=None,
+                       batch_size=100, throttle=0, dry_run=False, progress=None, using=None):
+    """Resolves duplicate groups for a proposed unique index on model, keeping one row in each group.
+
+    The row that is kept is the newest or oldest by the order_by field (ties broken by primary key). Rows where
+    order_by is NULL are only kept if all rows of their group are NULL. order_by is a field name without a "-" prefix,
+    use keep="oldest" to keep the row with the lowest value.
+    Other rows are hard-deleted, or if soft_delete is a dict of field values, updated with these values.
+    The soft_delete values must make the rows no longer match the where condition, otherwise ValueError is raised.
+
+    Each batch of batch_size groups is resolved in its own transaction, followed by a sleep of throttle seconds
+    to let other writers through. After each batch, progress(groups, rows) is called with the running totals.
+
+    Returns a (groups, rows) tuple with the number of duplicate groups found and rows deleted or updated.
+    """
+    if keep not in ('newest', 'oldest'):
+        raise ValueError('keep must be "newest" or "oldest".')
+    if order_by.startswith('-'):
+        raise ValueError('order_by must be a field name without "-", use keep="oldest" to keep the lowest value.')
+    if keep == 'newest':
+        ordering = [F(order_by).desc(nulls_last=True), F('pk').desc()]
+    else:
+        ordering = [F(order_by).asc(nulls_last=True), F('pk').asc()]
+    field_names = list(fields)
+    manager = model._base_manager.using(using)
+
+    total_groups = total_rows = 0
+    for chunk in duplicate_groups(model, field_names, where, chunk_size=batch_size, using=using):
+        with transaction.atomic(using=using):
+            keys = [tuple(group[field_name] for field_name in field_names) for group in chunk]
+            matching = Q()
+            for key in keys:
+                matching |= Q(**dict(zip(field_names, key)))
+
+            kept = set()
+            remove = []
+            rows = manager.filter(where).filter(matching).order_by(*ordering)
+            if not dry_run:
+                rows = rows.select_for_update()
+            for row in rows.values_list('pk', *field_names).iterator():
+                key = tuple(row[1:])
+                if key in kept:
+                    remove.append(row[0])
+                else:
+                    kept.add(key)
+
+            if not dry_run:
+                affected = manager.filter(pk__in=remove)
+                if soft_delete:
+                    affected.update(**soft_delete)
+                    if affected.filter(where).exists():
+                        raise ValueError('Soft-deleted rows still match the index condition %s, check the soft_delete values.' % where)
+                else:
+                    affected.delete()
+
+        total_groups += len(chunk)
+        total_rows += len(remove)
+        if progress:
+            progress(total_groups, total_rows)
+        if throttle:
+            time.sleep(throttle)
+    return total_groups, total_rows
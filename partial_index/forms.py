@@ -0,0 +1,60 @@
+"""Partial unique validation for model formsets."""
+from django.conf import settings
+from django.forms.models import BaseInlineFormSet, BaseModelFormSet
+
+from .batch import validate_partial_unique_batch
+from .mixins import PartialUniqueValidationError
+
+
+class PartialUniqueFormSetMixin(object):
+    """Validates the unique PartialIndexes of all forms in a model formset at once.
+
+    Forms of a model with ValidatePartialUniqueMixin each look up conflicts on their own, with one query per index
+    for every form. With this mixin, conflicts are looked up for the whole formset with one query per index
+    for every partial_unique_chunk_size forms, and forms that conflict with each other are also found.
+    Errors are added to each conflicting form, like validate_partial_unique() does.
+
+    The mixin should be added before the formset base class:
+
+    class RoomBookingFormSet(PartialUniqueFormSetMixin, BaseModelFormSet):
+        ...
+    """
+    partial_unique_chunk_size = 200
+
+    def full_clean(self):
+        forms = self.forms
+        for form in forms:
+            form.instance._partial_unique_deferred = True
+        try:
+            super(PartialUniqueFormSetMixin, self).full_clean()
+        finally:
+            for form in forms:
+                form.instance.__dict__.pop('_partial_unique_deferred', None)
+
+    def validate_unique(self):
+        super(PartialUniqueFormSetMixin, self).validate_unique()
+
+        forms_to_delete = self.deleted_forms
+        valid_forms = [form for form in self.forms if form.is_valid() and form not in forms_to_delete]
+        if not valid_forms:
+            return
+
+        if getattr(settings, 'DJANGO_PARTIAL_INDEX_FORCE_VALIDATION', True):
+            exclude = None
+        else:
+            # Fields excluded on all forms. Fields excluded only on some forms are still validated.
+            exclude = set.intersection(*[set(form._get_validation_exclusions()) for form in valid_forms])
+
+        instances = [form.instance for form in valid_forms]
+        form_errors = validate_partial_unique_batch(instances, exclude=exclude, chunk_size=self.partial_unique_chunk_size)
+        for form, errors in zip(valid_forms, form_errors):
+            if errors:
+                form._update_errors(PartialUniqueValidationError(errors))
+
+
+class PartialUniqueModelFormSet(PartialUniqueFormSetMixin, BaseModelFormSet):
+    pass
+
+
+class PartialUniqueInlineFormSet(PartialUniqueFormSetMixin, BaseInlineFormSet):
+    pass
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.db.models import Index, Q
 from django.utils.encoding import force_bytes
+from collections import OrderedDict
+import copy
 import hashlib
+import re
 import warnings
 
 
@@ -35,6 +39,32 @@ def validate_where(where='', where_postgresql='', where_sqlite=''):
     return where, where_postgresql, where_sqlite
 
 
+def validate_build_settings(build_settings):
+    for name in build_settings:
+        if not re.match(r'^[a-z_][a-z0-9_.]*$', name):
+            raise ValueError('Invalid build setting name %r.' % name)
+    return dict(build_settings)
+
+
+def validate_where_sql_cache(where, where_sql_cache):
+    if not where_sql_cache:
+        return {}
+    if not isinstance(where, query.PQ):
+        raise ValueError('where_sql_cache can only be used with where=PQ().')
+    for vendor, sql in where_sql_cache.items():
+        if vendor not in [query.Vendor.POSTGRESQL, query.Vendor.SQLITE]:
+            raise ValueError('Invalid where_sql_cache vendor %r.' % vendor)
+        if not isinstance(sql, str) or not sql:
+            raise ValueError('where_sql_cache values must be non-empty strings.')
+    return dict(where_sql_cache)
+
+
+# Generated index names, see PartialIndex.set_name_with_model(). Model states rendered by migrations create new
+# indexes, so the least recently used names are discarded beyond NAME_CACHE_SIZE.
+NAME_CACHE_SIZE = 1024
+_name_cache = OrderedDict()
+
+
 class PartialIndex(Index):
     suffix = 'partial'
     # Allow an index name longer than 30 characters since this index can only be used on PostgreSQL and SQLite,
@@ -42,17 +72,29 @@ class PartialIndex(Index):
     # The "partial" suffix is 4 letters longer than the default "idx".
     max_name_length = 34
     sql_create_index = {
-        'postgresql': 'CREATE%(unique)s INDEX %(name)s ON %(table)s%(using)s (%(columns)s)%(extra)s WHERE %(where)s',
+        'postgresql': 'CREATE%(unique)s INDEX%(concurrently)s %(name)s ON%(only)s %(table)s%(using)s (%(columns)s)%(extra)s WHERE %(where)s',
         'sqlite': 'CREATE%(unique)s INDEX %(name)s ON %(table)s%(using)s (%(columns)s) WHERE %(where)s',
     }
 
     # Mutable default fields=[] looks wrong, but it's copied from super class.
-    def __init__(self, fields=[], name=None, unique=None, where='', where_postgresql='', where_sqlite=''):
+    def __init__(self, fields=[], name=None, unique=None, where='', where_postgresql='', where_sqlite='', build_settings=None,
+                 where_sql_cache=None, normalize_where=False):
         if unique not in [True, False]:
             raise ValueError('Unique must be True or False')
         self.unique = unique
         self.where, self.where_postgresql, self.where_sqlite = \
             validate_where(where=where, where_postgresql=where_postgresql, where_sqlite=where_sqlite)
+        # Opt-in, as normalizing an existing condition changes its SQL, and so the generated index name.
+        self.normalize_where = normalize_where
+        if normalize_where:
+            if not isinstance(self.where, query.PQ):
+                raise ValueError('normalize_where can only be used with where=PQ().')
+            self.where = query.normalize_q(self.where)
+        # PostgreSQL settings such as maintenance_work_mem, which are only applied while building the index.
+        self.build_settings = validate_build_settings(build_settings or {})
+        # The where condition compiled to SQL for each vendor, to skip compiling it in migrations.
+        # Verified by the partial_index_where_sql --check command, and ignored when comparing indexes.
+        self.where_sql_cache = validate_where_sql_cache(self.where, where_sql_cache)
         super(PartialIndex, self).__init__(fields=fields, name=name)
 
     def __repr__(self):
@@ -71,7 +113,76 @@ class PartialIndex(Index):
             'anywhere': anywhere
         }
 
+    def __deepcopy__(self, memo):
+        # Django deep-copies every index whenever a model state is rendered. The where condition and build settings
+        # are never modified in place, so the copies share them, along with the cached deconstruction.
+        clone = self.__class__.__new__(self.__class__)
+        memo[id(self)] = clone
+        for key, value in self.__dict__.items():
+            if key not in ('where', 'build_settings', 'where_sql_cache', '_deconstructed', '_fingerprint'):
+                value = copy.deepcopy(value, memo)
+            clone.__dict__[key] = value
+        return clone
+
+    def __setattr__(self, name, value):
+        # Replacing any attribute, including those deconstructed by Index (such as db_tablespace and opclasses),
+        # discards the cached deconstruction and fingerprint.
+        if name not in ('_deconstructed', '_fingerprint'):
+            self.__dict__.pop('_deconstructed', None)
+            self.__dict__.pop('_fingerprint', None)
+        super(PartialIndex, self).__setattr__(name, value)
+
+    def _definition_key(self):
+        # Lists changed in place are not seen by __setattr__.
+        return tuple(self.fields), tuple(getattr(self, 'opclasses', ()))
+
     def deconstruct(self):
+        # Migration autodetection deconstructs each index many times, once for every comparison.
+        # The result is cached on the index, until one of its attributes changes.
+        cached = self.__dict__.get('_deconstructed')
+        if cached is not None and cached[0] == self._definition_key():
+            path, args, kwargs = cached[1]
+            return path, args, dict(kwargs)
+        path, args, kwargs = self._deconstruct()
+        self._deconstructed = (self._definition_key(), (path, args, dict(kwargs)))
+        return path, args, kwargs
+
+    def _comparable_deconstruct(self):
+        # The compiled where SQL is only a cache of the where condition, and build settings only tune how the
+        # index is built. Neither makes indexes different.
+        path, args, kwargs = self.deconstruct()
+        kwargs.pop('where_sql_cache', None)
+        kwargs.pop('build_settings', None)
+        return path, args, kwargs
+
+    def fingerprint(self):
+        """Returns a hash of the repr() of the deconstructed index, for example to report changed indexes.
+
+        repr() is not injective, so equal fingerprints do not prove that indexes are equal, and values with a
+        different repr() may be equal. Compare indexes with == instead.
+        """
+        cached = self.__dict__.get('_fingerprint')
+        if cached is not None and cached[0] == self._definition_key():
+            return cached[1]
+        path, args, kwargs = self._comparable_deconstruct()
+        canonical = [(key, sorted(value.items()) if isinstance(value, dict) else value) for key, value in sorted(kwargs.items())]
+        fingerprint = hashlib.md5(force_bytes(repr((path, args, canonical)))).hexdigest()
+        self._fingerprint = (self._definition_key(), fingerprint)
+        return fingerprint
+
+    def __eq__(self, other):
+        if self.__class__ != other.__class__:
+            return False
+        # Indexes are unique by name, so the full comparison is only needed for indexes with the same name.
+        # It uses the cached deconstructions, and copies of an index share its where condition, which compares
+        # equal to itself without walking it.
+        if self is other:
+            return True
+        if self.name != other.name:
+            return False
+        return self._comparable_deconstruct() == other._comparable_deconstruct()
+
+    def _deconstruct(self):
         path, args, kwargs = super(PartialIndex, self).deconstruct()
         if path.startswith('partial_index.index'):
             path = path.replace('partial_index.index', 'partial_index')
@@ -81,9 +192,15 @@ class PartialIndex(Index):
         else:
             kwargs['where_postgresql'] = self.where_postgresql
             kwargs['where_sqlite'] = self.where_sqlite
+        if self.build_settings:
+            kwargs['build_settings'] = self.build_settings
+        if self.where_sql_cache:
+            kwargs['where_sql_cache'] = self.where_sql_cache
+        if self.normalize_where:
+            kwargs['normalize_where'] = True
         return path, args, kwargs
 
-    def get_sql_create_template_values(self, model, schema_editor, using):
+    def get_sql_create_template_values(self, model, schema_editor, using, concurrently=False, only=False, table=None, name=None):
         # This method exists on Django 1.11 Index class, but has been moved to the SchemaEditor on Django 2.0.
         # This makes it complex to call superclass methods and avoid duplicating code.
         # Can be simplified if Django 1.11 support is dropped one day.
@@ -97,8 +214,8 @@ class PartialIndex(Index):
             for field, (field_name, order) in zip(fields, self.fields_orders)
         ]
         parameters = {
-            'table': quote_name(model._meta.db_table),
-            'name': quote_name(self.name),
+            'table': quote_name(table or model._meta.db_table),
+            'name': quote_name(name or self.name),
             'columns': ', '.join(columns),
             'using': using,
             'extra': tablespace_sql,
@@ -109,25 +226,128 @@ class PartialIndex(Index):
         # Note: the WHERE predicate is not yet checked for syntax or field names, and is inserted into the CREATE INDEX query unescaped.
         # This is bad for usability, but is not a security risk, as the string cannot come from user input.
         vendor = query.get_valid_vendor(schema_editor)
+        parameters['where'] = self.get_where_sql(model, schema_editor)
+        if table and isinstance(self.where, query.PQ):
+            # Compiled columns are qualified with the table of the model.
+            parameters['where'] = parameters['where'].replace(
+                quote_name(model._meta.db_table) + '.', quote_name(table) + '.')
+
+        # CONCURRENTLY and ONLY are PostgreSQL features. SQLite does not lock tables while creating an index.
+        if only and vendor != query.Vendor.POSTGRESQL:
+            raise ValueError('Indexes on only the parent of a partitioned table are only supported on PostgreSQL.')
+        parameters['concurrently'] = ' CONCURRENTLY' if concurrently and vendor == query.Vendor.POSTGRESQL else ''
+        parameters['only'] = ' ONLY' if only else ''
+        return parameters
+
+    def get_where_sql(self, model, schema_editor):
+        """Returns the SQL of the where condition as written in CREATE INDEX, with values inlined as literals."""
+        vendor = query.get_valid_vendor(schema_editor)
         if isinstance(self.where, query.PQ):
-            parameters['where'] = query.q_to_sql(self.where, model, schema_editor)
+            if vendor in self.where_sql_cache:
+                return self.check_where_sql_cache(model, schema_editor, self.where_sql_cache[vendor])
+            return self.compile_where_sql(model, schema_editor)
         elif vendor == 'postgresql':
-            parameters['where'] = self.where_postgresql or self.where
+            return self.where_postgresql or self.where
         elif vendor == 'sqlite':
-            parameters['where'] = self.where_sqlite or self.where
+            return self.where_sqlite or self.where
         else:
             raise ValueError('Should never happen')
-        return parameters
 
-    def create_sql(self, model, schema_editor, using='', **kwargs):
+    def check_where_sql_cache(self, model, schema_editor, sql):
+        """Returns the pinned SQL, or raises ValueError if it is stale.
+
+        Pinned SQL must reference the current table of the model. With DJANGO_PARTIAL_INDEX_VERIFY_WHERE_SQL_CACHE,
+        it is also compared with the compiled where condition, which costs the compilation the cache avoids.
+        """
+        table = schema_editor.quote_name(model._meta.db_table)
+        if table + '.' not in sql:
+            raise ValueError('where_sql_cache of index %s does not reference table %s: %s' % (self.name, table, sql))
+        if getattr(settings, 'DJANGO_PARTIAL_INDEX_VERIFY_WHERE_SQL_CACHE', False):
+            compiled = self.compile_where_sql(model, schema_editor)
+            if compiled != sql:
+                raise ValueError('where_sql_cache of index %s is %r, but the where condition compiles to %r.' % (
+                    self.name, sql, compiled))
+        return sql
+
+    def compile_where_sql(self, model, schema_editor):
+        """Returns the SQL of the PQ where condition, ignoring where_sql_cache."""
+        return query.q_to_sql(self.where, model, schema_editor)
+
+    def create_sql(self, model, schema_editor, using='', concurrently=False, only=False, table=None, name=None, **kwargs):
+        """Returns the CREATE INDEX statement, with the statements applying the build settings around it.
+
+        concurrently builds the index without locking the table for writes on PostgreSQL, outside a transaction.
+        The statements must then be executed one by one, see execute_create_sql().
+        only creates the index on only the parent of a partitioned table. table and name create the index
+        on another table, such as a partition, and under another name.
+        """
+        return '; '.join(self.create_sql_statements(model, schema_editor, using, concurrently=concurrently, only=only,
+                                                    table=table, name=name))
+
+    def create_sql_statements(self, model, schema_editor, using='', concurrently=False, only=False, table=None, name=None):
+        """Returns the statements of create_sql() as a list."""
         vendor = query.get_valid_vendor(schema_editor)
         sql_template = self.sql_create_index[vendor]
-        sql_parameters = self.get_sql_create_template_values(model, schema_editor, using)
-        return sql_template % sql_parameters
+        sql_parameters = self.get_sql_create_template_values(model, schema_editor, using, concurrently=concurrently,
+                                                             only=only, table=table, name=name)
+        return self.build_settings_statements(sql_template % sql_parameters, schema_editor)
+
+    def get_build_settings(self):
+        """Returns the settings for building this index, with defaults from settings.DJANGO_PARTIAL_INDEX_BUILD_SETTINGS."""
+        build_settings = validate_build_settings(getattr(settings, 'DJANGO_PARTIAL_INDEX_BUILD_SETTINGS', {}))
+        build_settings.update(self.build_settings)
+        return build_settings
+
+    def build_settings_statements(self, sql, schema_editor):
+        """Returns a list of the CREATE INDEX statement, and the statements applying the build settings on PostgreSQL.
+
+        Inside a transaction, SET LOCAL settings are reset automatically when the transaction ends.
+        Outside of one, the settings are set for the session, and reset right after the index is created.
+        PostgreSQL runs the statements of create_sql() as one implicit transaction, so a failing CREATE INDEX
+        also rolls back the SET. Statements executed one by one must use execute_create_sql() instead.
+        """
+        before, after = self.build_settings_wrapper(schema_editor)
+        return before + [sql] + after
+
+    def build_settings_wrapper(self, schema_editor):
+        """Returns the lists of statements to execute before and after the CREATE INDEX statement."""
+        build_settings = self.get_build_settings()
+        if not build_settings or query.get_valid_vendor(schema_editor) != query.Vendor.POSTGRESQL:
+            return [], []
+        names = sorted(build_settings)
+        local = schema_editor.connection.in_atomic_block
+        before = [
+            'SET %s%s = %s' % ('LOCAL ' if local else '', name, schema_editor.quote_value(build_settings[name]))
+            for name in names
+        ]
+        after = [] if local else ['RESET %s' % name for name in names]
+        return before, after
+
+    def execute_create_sql(self, cursor, model, schema_editor, concurrently=False, only=False, table=None, name=None):
+        """Creates the index with cursor, executing the statements one by one.
+
+        The build settings are reset even when creating the index fails, so that they do not stay active for the
+        rest of the session.
+        """
+        vendor = query.get_valid_vendor(schema_editor)
+        sql = self.sql_create_index[vendor] % self.get_sql_create_template_values(
+            model, schema_editor, '', concurrently=concurrently, only=only, table=table, name=name)
+        before, after = self.build_settings_wrapper(schema_editor)
+        try:
+            for statement in before:
+                cursor.execute(statement)
+            cursor.execute(sql)
+        finally:
+            for statement in after:
+                cursor.execute(statement)
 
     def name_hash_extra_data(self):
         return [str(self.unique), self.where, self.where_postgresql, self.where_sqlite]
 
+    def name_hash_cache_key(self):
+        """Identifies name_hash_extra_data() without computing it. Subclasses extending one must extend the other."""
+        return (self.unique, str(self.where) if self.where else None, self.where_postgresql, self.where_sqlite)
+
     def set_name_with_model(self, model):
         """Sets an unique generated name for the index.
 
@@ -139,6 +359,12 @@ class PartialIndex(Index):
             (('-%s' if order else '%s') % column_name)
             for column_name, (field_name, order) in zip(column_names, self.fields_orders)
         ]
+        key = (self.__class__, table_name, tuple(column_names_with_order), self.suffix) + self.name_hash_cache_key()
+        cached = _name_cache.get(key)
+        if cached is not None:
+            _name_cache.move_to_end(key)
+            self.name = cached
+            return
         # The length of the parts of the name is based on the default max
         # length of 30 characters.
         hash_data = [table_name] + column_names_with_order + [self.suffix] + self.name_hash_extra_data()
@@ -151,6 +377,9 @@ class PartialIndex(Index):
             'Index too long for multiple database support. Is self.suffix '
             'longer than 3 characters?'
         )
+        _name_cache[key] = self.name
+        while len(_name_cache) > NAME_CACHE_SIZE:
+            _name_cache.popitem(last=False)
 
     @staticmethod
     def _hash_generator(*args):
@@ -0,0 +1,90 @@
+"""Ready-made receivers for the partial_unique_checked signal.
+
+Both receivers are plain callables, and can be connected to the signal directly:
+
+    from partial_index.signals import partial_unique_checked
+    from partial_index.instrumentation import LoggingReceiver
+
+    partial_unique_checked.connect(LoggingReceiver(), weak=False)
+"""
+import bisect
+import logging
+import threading
+
+
+def _check_key(sender, index):
+    return '%s.%s' % (sender._meta.label, index.name)
+
+
+class LoggingReceiver(object):
+    """Logs every partial unique check, with its duration and result."""
+
+    def __init__(self, logger='partial_index', level=logging.DEBUG):
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+
+    def __call__(self, sender, index, skipped, duration, conflict, **kwargs):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if skipped:
+            self.logger.log(self.level, 'Partial unique check %s skipped.', _check_key(sender, index))
+        else:
+            self.logger.log(self.level, 'Partial unique check %s took %.2fms, conflict=%s.',
+                            _check_key(sender, index), duration * 1000, conflict)
+
+
+class DurationHistogram(object):
+    """Aggregates partial unique check durations per model and index in memory.
+
+    Durations are counted into buckets with the given upper bounds in seconds, plus an overflow bucket.
+    The histogram is safe to share between threads, but is not shared between processes.
+    """
+    default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(sorted(buckets or self.default_buckets))
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def __call__(self, sender, index, skipped, duration, conflict, **kwargs):
+        key = _check_key(sender, index)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    'checks': 0,
+                    'skipped': 0,
+                    'conflicts': 0,
+                    'total_duration': 0.0,
+                    'counts': [0] * (len(self.buckets) + 1),
+                }
+            if skipped:
+                stats['skipped'] += 1
+                return
+            stats['checks'] += 1
+            stats['conflicts'] += int(bool(conflict))
+            stats['total_duration'] += duration
+            stats['counts'][bisect.bisect_left(self.buckets, duration)] += 1
+
+    def connect(self):
+        from .signals import partial_unique_checked
+        partial_unique_checked.connect(self, weak=False, dispatch_uid=id(self))
+        return self
+
+    def disconnect(self):
+        from .signals import partial_unique_checked
+        partial_unique_checked.disconnect(dispatch_uid=id(self))
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self):
+        """Returns a copy of the collected statistics, keyed by "app_label.Model.index_name"."""
+        with self._lock:
+            return {key: dict(stats, counts=list(stats['counts'])) for key, stats in self._stats.items()}
+
+    def slowest(self, n=10):
+        """Returns up to n (key, total_duration) pairs, for the indexes that have used the most time in total."""
+        totals = [(key, stats['total_duration']) for key, stats in self.snapshot().items()]
+        return sorted(totals, key=lambda pair: pair[1], reverse=True)[:n]
@@ -0,0 +1,45 @@
+"""Database locks for serializing work on PartialIndexes."""
+import hashlib
+import struct
+
+from django.db import transaction
+from django.utils.encoding import force_bytes
+
+from .query import Vendor
+
+
+def acquire_sqlite_write_lock(connection, model):
+    """Takes the SQLite database write lock for the rest of the current transaction.
+
+    SQLite has no row locks, and transactions only take the write lock at their first write. A write that changes
+    nothing takes it right away, so that other writers wait until the transaction ends.
+    """
+    pk_column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE %s SET %s = %s WHERE 0 = 1' % (connection.ops.quote_name(model._meta.db_table), pk_column, pk_column))
+
+
+def partial_unique_lock_key(idx, values):
+    """Returns the PostgreSQL advisory lock key of the index fields values of a unique PartialIndex, a signed 64-bit int.
+
+    Rows that could conflict have the same values, and so the same key. Different values rarely share a key,
+    which only makes their writers wait for each other.
+    """
+    key = repr((idx.name, [(field_name, values[field_name]) for field_name in sorted(idx.fields)]))
+    return struct.unpack('>q', hashlib.md5(force_bytes(key)).digest()[:8])[0]
+
+
+def acquire_partial_unique_locks(connection, model, keys):
+    """Takes the locks of the given keys until the end of the current transaction.
+
+    On PostgreSQL, these are transaction-scoped advisory locks, so writers of different keys never wait for each other.
+    Keys are locked in sorted order, to avoid deadlocks. On SQLite, the database write lock is taken instead.
+    """
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError('Partial unique locks can only be taken inside a transaction.')
+    if connection.vendor == Vendor.POSTGRESQL:
+        with connection.cursor() as cursor:
+            for key in sorted(set(keys)):
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+    elif keys:
+        acquire_sqlite_write_lock(connection, model)
@@ -0,0 +1,127 @@
+"""Sets of PartialIndexes that are managed at runtime, instead of through migrations.
+
+An index set is declared as an attribute of a model, and generates the PartialIndexes it wants to exist on the model's
+table, for example one per time window or one per tenant. reconcile() creates the missing ones and drops the ones no
+longer wanted, concurrently on PostgreSQL. The partial_index_reconcile command reconciles all index sets.
+
+The indexes are not part of Meta.indexes, so makemigrations does not see them. Indexes in the database are recognised
+as belonging to an index set by their generated names, which start with the table and first column, and end with
+the suffix of the index set. Two index sets of a model must not share the first column and suffix.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+
+from .index import PartialIndex
+from . import query
+
+
+_index_sets = []
+
+
+def all_index_sets():
+    """Returns the index sets of all models, in the order they were declared."""
+    return list(_index_sets)
+
+
+class ManagedIndexSet(object):
+    """Base class of index sets.
+
+    Subclasses must set suffix, and implement the two abstract hooks: get_conditions(), returning the conditions of
+    the wanted indexes, and filter(), filtering a queryset to the rows of the index that queries should use.
+    """
+    suffix = None
+
+    def __init__(self, fields, unique=False, where=None):
+        if not fields:
+            raise ValueError('At least one field is required.')
+        if unique not in [True, False]:
+            raise ValueError('Unique must be True or False')
+        self.fields = list(fields)
+        self.unique = unique
+        self.where = where
+        self.model = None
+        self.name = None
+
+    def __repr__(self):
+        return '<%s: %s.%s>' % (self.__class__.__name__, self.model._meta.label if self.model else None, self.name)
+
+    def contribute_to_class(self, cls, name):
+        self.model = cls
+        self.name = name
+        setattr(cls, name, self)
+        if not cls._meta.abstract:
+            _index_sets.append(self)
+
+    def get_conditions(self):
+        """Returns a list of the PQ where conditions of the indexes that should exist, without self.where."""
+        raise NotImplementedError('Subclasses must implement get_conditions()')
+
+    def make_index(self, condition):
+        """Returns the named PartialIndex for one condition."""
+        where = condition & self.where if self.where is not None else condition
+        index = PartialIndex(fields=self.fields, unique=self.unique, where=where)
+        index.suffix = self.suffix
+        index.set_name_with_model(self.model)
+        return index
+
+    def get_indexes(self):
+        """Returns the wanted PartialIndexes, raising ImproperlyConfigured if two of them have the same name."""
+        indexes = {}
+        for condition in self.get_conditions():
+            index = self.make_index(condition)
+            if index.name in indexes:
+                raise ImproperlyConfigured(
+                    'Index set %s.%s generates the name %s for two indexes, with where %s and %s.' % (
+                        self.model._meta.label, self.name, index.name, indexes[index.name].where, index.where))
+            indexes[index.name] = index
+        return list(indexes.values())
+
+    def is_managed_name(self, name):
+        """Returns True if an index name could have been generated by this index set."""
+        first_column = self.model._meta.get_field(self.fields[0].lstrip('-')).column
+        prefix = '%s_%s_' % (self.model._meta.db_table[:11], first_column[:7])
+        return name.startswith(prefix) and name.endswith('_' + self.suffix) and len(name) == len(prefix) + 7 + len(self.suffix)
+
+    def existing_index_names(self, connection):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, self.model._meta.db_table)
+        return set(name for name, info in constraints.items() if info['index'] and self.is_managed_name(name))
+
+    def reconcile(self, using=None, dry_run=False):
+        """Creates the missing indexes of the set, and drops the obsolete ones. Returns (created, dropped) index names.
+
+        On PostgreSQL, outside a transaction, indexes are created and dropped concurrently, without blocking writes.
+        """
+        using = using or router.db_for_write(self.model)
+        connection = connections[using]
+        if not router.allow_migrate_model(using, self.model):
+            return [], []
+        wanted = {index.name: index for index in self.get_indexes()}
+        existing = self.existing_index_names(connection)
+        create = [wanted[name] for name in sorted(wanted) if name not in existing]
+        drop = sorted(name for name in existing if name not in wanted)
+        if not dry_run:
+            schema_editor = connection.schema_editor()
+            concurrently = not connection.in_atomic_block
+            if connection.vendor == query.Vendor.POSTGRESQL and concurrently:
+                # A failed concurrent build leaves an invalid index behind, which would never be rebuilt.
+                from .partitions import index_is_valid
+                for index in wanted.values():
+                    if index.name in existing and index_is_valid(connection, index.name) is False:
+                        drop.append(index.name)
+                        create.append(index)
+            with connection.cursor() as cursor:
+                for name in drop:
+                    cursor.execute(self.drop_sql(schema_editor, name, concurrently))
+                for index in create:
+                    index.execute_create_sql(cursor, self.model, schema_editor, concurrently=concurrently)
+        return [index.name for index in create], drop
+
+    def drop_sql(self, schema_editor, name, concurrently):
+        if concurrently and schema_editor.connection.vendor == query.Vendor.POSTGRESQL:
+            return 'DROP INDEX CONCURRENTLY IF EXISTS %s' % schema_editor.quote_name(name)
+        return str(schema_editor._delete_index_sql(self.model, name))
+
+    def filter(self, queryset=None, **kwargs):
+        """Filters queryset (default: all objects) to the rows of the current index, so that queries can use it."""
+        raise NotImplementedError('Subclasses must implement filter()')
@@ -0,0 +1,64 @@
+import json
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from partial_index import PartialIndex, PQ
+from partial_index.duplicates import index_field_names
+
+
+class ModelsCommand(BaseCommand):
+    """Base class for the partial_index commands, with helpers to select models."""
+
+    def get_models(self, labels):
+        """Returns the models of the given app and app_label.ModelName labels, or all models if none are given."""
+        if not labels:
+            return apps.get_models()
+        models = []
+        for label in labels:
+            try:
+                if '.' in label:
+                    models.append(apps.get_model(label))
+                else:
+                    models.extend(apps.get_app_config(label).get_models())
+            except LookupError as e:
+                raise CommandError(str(e))
+        return models
+
+    def get_model(self, options):
+        try:
+            return apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+
+
+class PartialIndexCommand(ModelsCommand):
+    """Base class for the partial_index commands working on one unique PartialIndex of a model, declared or proposed."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model as app_label.ModelName.')
+        parser.add_argument('--index', help='Name of a unique PartialIndex declared on the model.')
+        parser.add_argument('--fields', help='Comma-separated field names of a proposed index.')
+        parser.add_argument('--where', help='Condition of a proposed index, as a JSON object of PQ() keyword arguments.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def get_index_definition(self, model, options):
+        """Returns the (field names, where condition) of the index selected by the command line options."""
+        if options['index']:
+            if options['fields'] or options['where']:
+                raise CommandError('Use either --index, or --fields and --where, not both.')
+            for idx in model._meta.indexes:
+                if isinstance(idx, PartialIndex) and idx.name == options['index']:
+                    if not isinstance(idx.where, PQ):
+                        raise CommandError('PartialIndex %s has a text-based where condition, which is not supported.' % idx.name)
+                    return index_field_names(idx), idx.where
+            raise CommandError('PartialIndex %s not found on model %s.' % (options['index'], model._meta.label))
+
+        if not options['fields'] or not options['where']:
+            raise CommandError('Either --index, or both --fields and --where must be given.')
+        try:
+            where = PQ(**json.loads(options['where']))
+        except (ValueError, TypeError) as e:
+            raise CommandError('Invalid --where: %s' % e)
+        return [field.strip() for field in options['fields'].split(',')], where
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from partial_index.advisor import read_log, recommend
+
+
+class Command(BaseCommand):
+    help = ('Recommends PartialIndexes from a CSV dump of pg_stat_statements, or a debug log of the django.db.backends logger. '
+            'The log is only read, no database connection is needed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='Log file. The format is detected from its first line.')
+        parser.add_argument('--limit', type=int, default=20, help='Maximum number of recommendations.')
+        parser.add_argument('--min-time', type=float, default=0,
+                            help='Minimum total time (ms) of the queries a recommendation would serve.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['log'], newline='') as f:
+                recommendations = recommend(read_log(f))
+        except (IOError, KeyError, ValueError) as e:
+            raise CommandError('Unable to read %s: %s' % (options['log'], e))
+
+        recommendations = [r for r in recommendations if r.total_time >= options['min_time']][:options['limit']]
+        for recommendation in recommendations:
+            self.stdout.write('# %s: %d calls, %.1f ms total' % (
+                recommendation.model._meta.label, recommendation.calls, recommendation.total_time))
+            self.stdout.write(recommendation.declaration())
+        if not recommendations:
+            self.stdout.write('No recommendations.')
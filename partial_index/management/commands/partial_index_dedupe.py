@@ -0,0 +1,68 @@
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import CommandError
+from django.db import models
+from django.utils import timezone
+
+from partial_index.duplicates import resolve_duplicates
+from partial_index.management.base import PartialIndexCommand
+
+
+class Command(PartialIndexCommand):
+    help = ('Resolves groups of rows that would violate a unique PartialIndex, keeping the newest or oldest row in each group. '
+            'The other rows are deleted, or with --soft-delete, updated so that they no longer match the index condition.')
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--keep', choices=['newest', 'oldest'], default='newest')
+        parser.add_argument('--order-by', default='pk',
+                            help='Field that decides which row is the newest, without "-". Defaults to the primary key.')
+        parser.add_argument('--soft-delete',
+                            help='JSON object of field values to set on the duplicate rows instead of deleting them. '
+                                 'The value "now" sets a date or datetime field to the current time.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of groups resolved per transaction.')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to sleep between transactions.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be changed.')
+
+    def handle(self, *args, **options):
+        model = self.get_model(options)
+        fields, where = self.get_index_definition(model, options)
+        if options['order_by'].startswith('-'):
+            raise CommandError('--order-by must be a field name without "-", use --keep oldest to keep the lowest value.')
+        soft_delete = self.get_soft_delete_values(model, options['soft_delete'])
+
+        def progress(groups, rows):
+            if options['verbosity'] >= 2:
+                self.stdout.write('Resolved %d groups, %d rows so far.' % (groups, rows))
+
+        groups, rows = resolve_duplicates(
+            model, fields, where, order_by=options['order_by'], keep=options['keep'], soft_delete=soft_delete,
+            batch_size=options['batch_size'], throttle=options['sleep'], dry_run=options['dry_run'],
+            progress=progress, using=options['database'])
+
+        action = 'updated' if soft_delete else 'deleted'
+        if options['dry_run']:
+            self.stdout.write('Found %d duplicate groups, %d rows would be %s.' % (groups, rows, action))
+        else:
+            self.stdout.write('Resolved %d duplicate groups, %d rows %s.' % (groups, rows, action))
+
+    def get_soft_delete_values(self, model, soft_delete):
+        if not soft_delete:
+            return None
+        try:
+            values = json.loads(soft_delete)
+        except ValueError as e:
+            raise CommandError('Invalid --soft-delete: %s' % e)
+        if not isinstance(values, dict) or not values:
+            raise CommandError('--soft-delete must be a non-empty JSON object.')
+        for field_name, value in values.items():
+            try:
+                field = model._meta.get_field(field_name)
+            except FieldDoesNotExist as e:
+                raise CommandError('Invalid --soft-delete: %s' % e)
+            if value == 'now' and isinstance(field, models.DateTimeField):
+                values[field_name] = timezone.now()
+            elif value == 'now' and isinstance(field, models.DateField):
+                values[field_name] = timezone.now().date()
+        return values
@@ -0,0 +1,74 @@
+import csv
+import json
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from partial_index.duplicates import duplicate_groups, duplicate_group_pks
+from partial_index.management.base import PartialIndexCommand
+
+
+class Command(PartialIndexCommand):
+    help = ('Lists groups of rows that would violate a unique PartialIndex, so they can be cleaned up before the index is created. '
+            'Use either --index for an index declared on the model, or --fields and --where for a proposed index.')
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                            help='Output format. "json" writes one JSON object per line.')
+        parser.add_argument('--output', help='Output file. Defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of groups fetched per query.')
+        parser.add_argument('--checkpoint', help='Checkpoint file for resuming an interrupted run. Removed when the run completes.')
+        parser.add_argument('--with-pks', action='store_true', help='Include the primary keys of the rows in each group.')
+
+    def handle(self, *args, **options):
+        model = self.get_model(options)
+        fields, where = self.get_index_definition(model, options)
+
+        after = None
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            with open(options['checkpoint']) as f:
+                after = json.load(f)['after']
+
+        if options['output']:
+            # Append when resuming, so that the groups written before the interruption are kept.
+            output = open(options['output'], 'a' if after is not None else 'w', newline='')
+        else:
+            output = self.stdout
+        try:
+            self.write_groups(model, fields, where, after, output, options)
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
+
+    def write_groups(self, model, fields, where, after, output, options):
+        columns = list(fields) + ['duplicate_count'] + (['pks'] if options['with_pks'] else [])
+        writer = None
+        if options['format'] == 'csv':
+            writer = csv.writer(output)
+            if after is None:
+                writer.writerow(columns)
+
+        total = 0
+        for chunk in duplicate_groups(model, fields, where, chunk_size=options['chunk_size'], after=after,
+                                      using=options['database']):
+            if options['with_pks']:
+                for group, pks in zip(chunk, duplicate_group_pks(model, fields, where, chunk, using=options['database'])):
+                    group['pks'] = pks
+            for group in chunk:
+                if writer:
+                    writer.writerow([' '.join(str(pk) for pk in group[c]) if c == 'pks' else group[c] for c in columns])
+                else:
+                    output.write(json.dumps(group, cls=DjangoJSONEncoder, sort_keys=True) + '\n')
+            output.flush()
+            total += len(chunk)
+
+            if options['checkpoint']:
+                with open(options['checkpoint'], 'w') as f:
+                    json.dump({'after': [chunk[-1][field] for field in fields]}, f, cls=DjangoJSONEncoder)
+
+        if options['verbosity'] >= 1:
+            self.stderr.write('Found %d duplicate groups.' % total)
@@ -0,0 +1,52 @@
+from django.core.management.base import CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from partial_index import PartialIndex
+from partial_index.management.base import ModelsCommand
+from partial_index.partitions import (check_unique_partition_key, create_partitioned_index, is_partitioned,
+                                      prepare_partition)
+
+
+class Command(ModelsCommand):
+    help = ('Builds the PartialIndexes of a model on each partition of its PostgreSQL partitioned table, concurrently, '
+            'and attaches them. Only missing partition indexes are built, so it can be run again after a failure.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model as app_label.ModelName.')
+        parser.add_argument('--index', help='Name of one PartialIndex of the model. Defaults to all of them.')
+        parser.add_argument('--prepare', metavar='TABLE',
+                            help='Instead, build the indexes on TABLE, before attaching it as a partition.')
+        parser.add_argument('--parallel', type=int, default=4, help='Number of partitions built at the same time.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        model = self.get_model(options)
+        indexes = [idx for idx in model._meta.indexes if isinstance(idx, PartialIndex)]
+        if options['index']:
+            indexes = [idx for idx in indexes if idx.name == options['index']]
+            if not indexes:
+                raise CommandError('PartialIndex %s not found on model %s.' % (options['index'], model._meta.label))
+        if options['parallel'] < 1:
+            raise CommandError('--parallel must be at least 1.')
+
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioned tables are only supported on PostgreSQL.')
+        schema_editor = connection.schema_editor()
+        # Before building any of the indexes.
+        for idx in indexes:
+            try:
+                check_unique_partition_key(connection, model, idx)
+            except ValueError as e:
+                raise CommandError(str(e))
+        if options['prepare']:
+            for idx in indexes:
+                prepare_partition(schema_editor, model, idx, options['prepare'])
+                self.stdout.write('Built index %s on %s.' % (idx.name, options['prepare']))
+            return
+
+        if not is_partitioned(connection, model._meta.db_table):
+            raise CommandError('Table %s is not partitioned.' % model._meta.db_table)
+        for idx in indexes:
+            durations = create_partitioned_index(schema_editor, model, idx, parallel=options['parallel'])
+            self.stdout.write('Index %s: built on %d partitions.' % (idx.name, len(durations)))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from partial_index.managed import all_index_sets
+
+
+class Command(BaseCommand):
+    help = ('Creates the missing indexes of managed index sets, such as RollingPartialIndex, and drops the obsolete ones. '
+            'On PostgreSQL, indexes are created and dropped concurrently.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='Apps (app_label) or models (app_label.ModelName). Defaults to all.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the indexes that would be created and dropped.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        labels = set(label.lower() for label in options['labels'])
+        for index_set in all_index_sets():
+            opts = index_set.model._meta
+            if labels and opts.app_label not in labels and opts.label_lower not in labels:
+                continue
+            created, dropped = index_set.reconcile(using=options['database'], dry_run=options['dry_run'])
+            prefix = 'Would ' if options['dry_run'] else ''
+            for name in created:
+                self.stdout.write('%s%s index %s for %s.%s.' % (prefix, 'create' if prefix else 'Created', name, opts.label, index_set.name))
+            for name in dropped:
+                self.stdout.write('%s%s index %s for %s.%s.' % (prefix, 'drop' if prefix else 'Dropped', name, opts.label, index_set.name))
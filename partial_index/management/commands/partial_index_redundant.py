@@ -0,0 +1,44 @@
+import json
+
+from django.db import DEFAULT_DB_ALIAS
+
+from partial_index.management.base import ModelsCommand
+from partial_index.redundancy import DEFAULT_SAMPLE_SIZE, describe_write_cost, find_redundant_indexes, write_cost
+
+
+class Command(ModelsCommand):
+    help = ('Lists indexes that are duplicated, or subsumed by another index on the same table through a longer field list '
+            'or a broader where condition, with an estimate of what each one costs on writes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='Apps (app_label) or models (app_label.ModelName). Defaults to all.')
+        parser.add_argument('--all', action='store_true', dest='all_indexes',
+                            help='Also report redundant indexes where neither index is a PartialIndex.')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Count the rows of each table, to estimate which fraction of inserts each index covers.')
+        parser.add_argument('--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE,
+                            help='Number of rows scanned without --analyze on SQLite, and on PostgreSQL tables that '
+                                 'have not been analyzed. Other PostgreSQL estimates are read from the query planner.')
+        parser.add_argument('--format', choices=['text', 'json'], default='text',
+                            help='Output format. "json" writes one JSON object per line.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in self.get_models(options['labels']):
+            for found in find_redundant_indexes(model, partial_only=not options['all_indexes']):
+                cost = write_cost(found.index, using=options['database'], analyze=options['analyze'],
+                                  sample_size=options['sample_size'])
+                if options['format'] == 'json':
+                    self.stdout.write(json.dumps({
+                        'model': model._meta.label,
+                        'index': found.index.name,
+                        'kind': found.kind,
+                        'covered_by': found.covered_by.name,
+                        'write_cost': cost,
+                    }, sort_keys=True))
+                else:
+                    self.stdout.write('%s: %s %s' % (model._meta.label, found.describe(), describe_write_cost(cost)))
+                total += 1
+        if options['format'] == 'text':
+            self.stdout.write('Found %d redundant indexes.' % total)
@@ -0,0 +1,47 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from partial_index.management.base import ModelsCommand
+from partial_index.sparse import DEFAULT_SAMPLE_SIZE, find_sparse_columns
+
+
+def format_bytes(size):
+    for unit in ['bytes', 'kB', 'MB', 'GB']:
+        if size < 1024 or unit == 'GB':
+            return ('%d %s' if unit == 'bytes' else '%.1f %s') % (size, unit)
+        size /= 1024.0
+
+
+class Command(ModelsCommand):
+    help = ('Lists nullable fields with a full index that are mostly NULL, where a PartialIndex on the non-null values '
+            'would save space, with the migration operations replacing the index.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='Apps (app_label) or models (app_label.ModelName). Defaults to all.')
+        parser.add_argument('--min-null-fraction', type=float, default=0.9,
+                            help='Minimum fraction of NULL values, between 0 and 1. Defaults to 0.9.')
+        parser.add_argument('--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE,
+                            help='Number of rows scanned on SQLite. PostgreSQL statistics are read from pg_stats.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        found = []
+        for model in self.get_models(options['labels']):
+            found.extend(find_sparse_columns(model, using=options['database'], min_null_frac=options['min_null_fraction'],
+                                             sample_size=options['sample_size']))
+        found.sort(key=lambda sparse: -sparse.stats.saved_bytes)
+
+        imports = set()
+        for sparse in found:
+            stats = sparse.stats
+            self.stdout.write('# %s.%s: %.1f%% NULL, %d distinct values, saves about %s.' % (
+                sparse.model._meta.label, sparse.field.name, stats.null_frac * 100, stats.n_distinct,
+                format_bytes(stats.saved_bytes)))
+            self.stdout.write('# Declaration: %s' % sparse.declaration())
+            operations, operation_imports = sparse.serialized_operations()
+            self.stdout.write(operations)
+            imports.update(operation_imports)
+        if imports:
+            self.stdout.write('# Imports:')
+            for line in sorted(imports):
+                self.stdout.write(line)
+        self.stdout.write('Found %d sparse indexed columns.' % len(found))
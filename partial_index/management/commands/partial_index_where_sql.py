@@ -0,0 +1,88 @@
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.operations import AddIndex, CreateModel
+
+from partial_index import PartialIndex, PQ
+from partial_index.management.base import ModelsCommand
+
+
+class Command(ModelsCommand):
+    help = ('Prints the where condition of each PartialIndex compiled to SQL, as where_sql_cache arguments. '
+            'With --check, verifies the where_sql_cache of all PartialIndexes in models and migrations instead.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='Apps (app_label) or models (app_label.ModelName). Defaults to all.')
+        parser.add_argument('--check', action='store_true',
+                            help='Verify where_sql_cache against the where conditions, and exit with an error on mismatches.')
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Database to compile SQL for. May be given once per vendor. Defaults to all databases.')
+
+    def get_schema_editors(self, aliases):
+        """Returns a dict mapping each supported vendor to a schema editor of one of the databases."""
+        schema_editors = {}
+        for alias in aliases or connections:
+            connection = connections[alias]
+            if connection.vendor in PartialIndex.sql_create_index and connection.vendor not in schema_editors:
+                schema_editors[connection.vendor] = connection.schema_editor()
+        if not schema_editors:
+            raise CommandError('No PostgreSQL or SQLite database configured.')
+        return schema_editors
+
+    def handle(self, *args, **options):
+        schema_editors = self.get_schema_editors(options['databases'])
+        if options['check']:
+            self.check_where_sql(options['labels'], schema_editors)
+            return
+
+        for model in self.get_models(options['labels']):
+            for idx in model._meta.indexes:
+                if isinstance(idx, PartialIndex) and isinstance(idx.where, PQ):
+                    where_sql = {vendor: idx.compile_where_sql(model, schema_editor)
+                                 for vendor, schema_editor in sorted(schema_editors.items())}
+                    self.stdout.write('# %s %s' % (model._meta.label, idx.name))
+                    self.stdout.write('where_sql_cache=%r,' % where_sql)
+
+    def iter_migration_indexes(self, app_labels):
+        """Yields (model, index) for PartialIndexes with where_sql_cache in migrations, with the model at that migration."""
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        for key in sorted(loader.disk_migrations):
+            if app_labels and key[0] not in app_labels:
+                continue
+            state = None
+            for operation in loader.disk_migrations[key].operations:
+                if isinstance(operation, AddIndex):
+                    model_name, indexes = operation.model_name, [operation.index]
+                elif isinstance(operation, CreateModel):
+                    model_name, indexes = operation.name, operation.options.get('indexes', [])
+                else:
+                    continue
+                for idx in indexes:
+                    if isinstance(idx, PartialIndex) and idx.where_sql_cache:
+                        if state is None:
+                            state = loader.project_state(key, at_end=True)
+                        yield state.apps.get_model(key[0], model_name), idx, 'migration %s.%s' % key
+
+    def check_where_sql(self, labels, schema_editors):
+        app_labels = set(label.split('.')[0] for label in labels)
+        indexes = [
+            (model, idx, 'model %s' % model._meta.label)
+            for model in self.get_models(labels) for idx in model._meta.indexes
+            if isinstance(idx, PartialIndex) and idx.where_sql_cache
+        ]
+        indexes.extend(self.iter_migration_indexes(app_labels))
+
+        mismatches = 0
+        for model, idx, source in indexes:
+            for vendor, cached_sql in sorted(idx.where_sql_cache.items()):
+                if vendor not in schema_editors:
+                    self.stdout.write('%s, %s: not verified for %s, no such database configured.' % (source, idx.name, vendor))
+                    continue
+                where_sql = idx.compile_where_sql(model, schema_editors[vendor])
+                if where_sql != cached_sql:
+                    mismatches += 1
+                    self.stderr.write('%s, %s: where_sql_cache for %s is %r, but the where condition compiles to %r.' % (
+                        source, idx.name, vendor, cached_sql, where_sql))
+        if mismatches:
+            raise CommandError('%d where_sql_cache entries do not match their where conditions.' % mismatches)
+        self.stdout.write('Verified where_sql_cache of %d indexes.' % len(indexes))
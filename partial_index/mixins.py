@@ -1,10 +1,12 @@
 from collections import defaultdict
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured, ValidationError, NON_FIELD_ERRORS
+from django.db import connections, router, transaction
 from django.db.models import Q
+import time
 
 from .index import PartialIndex
-from . import query
+from . import cache, locks, query, signals
 
 
 class PartialUniqueValidationError(ValidationError):
@@ -45,12 +47,14 @@ class ValidatePartialUniqueMixin(object):
             errors.update(e.error_dict)
 
         # Merge ours into the existing errors (if any)
-        try:
-            if getattr(settings, 'DJANGO_PARTIAL_INDEX_FORCE_VALIDATION', True):
-                exclude = None
-            self.validate_partial_unique(exclude=exclude)
-        except ValidationError as e:
-            errors.update(e.error_dict)
+        # Skipped while a PartialUniqueFormSetMixin validates this instance together with the rest of its formset.
+        if not getattr(self, '_partial_unique_deferred', False):
+            try:
+                if getattr(settings, 'DJANGO_PARTIAL_INDEX_FORCE_VALIDATION', True):
+                    exclude = None
+                self.validate_partial_unique(exclude=exclude)
+            except ValidationError as e:
+                errors.update(e.error_dict)
 
         if errors:
             raise PartialUniqueValidationError(errors)
@@ -71,6 +75,17 @@ class ValidatePartialUniqueMixin(object):
         Note that step 2 ensures the lookup only looks for conflicts among rows covered by the PartialIndes,
         and steps 2+3 ensures that the QuerySet is empty if the PartialIndex does not cover the current object.
         """
+        # Opt-in: serialize validation and saving of the same values, when both happen in one transaction.
+        lock_connection = connections[router.db_for_write(self.__class__, instance=self)]
+        lock = getattr(settings, 'DJANGO_PARTIAL_INDEX_LOCK_VALIDATION', False) and lock_connection.in_atomic_block
+        self._validate_partial_unique(exclude, lock_connection=lock_connection if lock else None, use_cache=not lock)
+
+    def _validate_partial_unique(self, exclude, lock_connection=None, use_cache=True):
+        """Validates the unique PartialIndexes, taking their locks on lock_connection first unless it is None.
+
+        Lookups cached by partial_unique_cache() may predate a commit of another writer, so they must not be used
+        to decide whether saving under the locks is safe.
+        """
         # Find PartialIndexes with unique=True defined on model.
         unique_idxs = [idx for idx in self._meta.indexes if isinstance(idx, PartialIndex) and idx.unique]
 
@@ -81,45 +96,21 @@ class ValidatePartialUniqueMixin(object):
 
             errors = defaultdict(list)
             for idx in unique_idxs:
-                where = idx.where
-                if not isinstance(where, Q):
-                    raise ImproperlyConfigured(
-                        'ValidatePartialUniqueMixin is not supported for PartialIndexes with a text-based where condition. ' +
-                        'Please upgrade to Q-object based where conditions.'
-                    )
-
-                mentioned_fields = set(idx.fields) | set(query.q_mentioned_fields(where, self.__class__))
-
-                missing_fields = mentioned_fields - model_fields
-                if missing_fields:
-                    raise RuntimeError('Unable to use ValidatePartialUniqueMixin: expecting to find fields %s on model. ' +
-                                       'This is a bug in the PartialIndex definition or the django-partial-index library itself.')
-
-                # Skip indexes with excluded fields
-                if mentioned_fields & exclude:
-                    continue
-
-                values = {}
-                skip = False
-                for field_name in mentioned_fields:
-                    field_value = getattr(self, field_name)
-                    if field_value is None and field_name in idx.fields:
-                        # Can never be unique if value is NULL.  If
-                        # field is non-nullable we'll get a validation
-                        # error from the field validations themselves.
-                        skip = True
-                    else:
-                        values[field_name] = field_value
-
-                if skip:
+                started = time.perf_counter()
+                values = self._partial_unique_values(idx, model_fields, exclude)
+                if values is None:
+                    signals.partial_unique_checked.send(
+                        sender=self.__class__, instance=self, index=idx, skipped=True, duration=None, conflict=False)
                     continue
 
-                conflict = self.__class__.objects.filter(**values)  # Step 1 and 3
-                conflict = conflict.filter(where)  # Step 2
-                if self.pk:
-                    conflict = conflict.exclude(pk=self.pk)  # Step 4
+                if lock_connection is not None:
+                    locks.acquire_partial_unique_locks(lock_connection, self.__class__, [self._partial_unique_lock_key(idx, values)])
+                conflict = self._partial_unique_conflict_exists(idx, values, use_cache=use_cache)
+                signals.partial_unique_checked.send(
+                    sender=self.__class__, instance=self, index=idx, skipped=False,
+                    duration=time.perf_counter() - started, conflict=conflict)
 
-                if conflict.exists():
+                if conflict:
                     if len(idx.fields) == 1:
                         key = idx.fields[0]
                     else:
@@ -128,3 +119,109 @@ class ValidatePartialUniqueMixin(object):
 
             if errors:
                 raise PartialUniqueValidationError(errors)
+
+    def _partial_unique_values(self, idx, model_fields, exclude):
+        """Returns the field values to look up conflicts for idx with, or None if the check should be skipped."""
+        where = idx.where
+        if not isinstance(where, Q):
+            raise ImproperlyConfigured(
+                'ValidatePartialUniqueMixin is not supported for PartialIndexes with a text-based where condition. ' +
+                'Please upgrade to Q-object based where conditions.'
+            )
+
+        mentioned_fields = set(idx.fields) | set(query.q_mentioned_fields(where, self.__class__))
+
+        missing_fields = mentioned_fields - model_fields
+        if missing_fields:
+            raise RuntimeError('Unable to use ValidatePartialUniqueMixin: expecting to find fields %s on model. ' +
+                               'This is a bug in the PartialIndex definition or the django-partial-index library itself.')
+
+        # Skip indexes with excluded fields
+        if mentioned_fields & exclude:
+            return None
+
+        values = {}
+        for field_name in mentioned_fields:
+            # Raw ids of related fields, to avoid fetching the related instances.
+            field_value = getattr(self, self._meta.get_field(field_name).attname)
+            if field_value is None and field_name in idx.fields:
+                # Can never be unique if value is NULL.  If
+                # field is non-nullable we'll get a validation
+                # error from the field validations themselves.
+                return None
+            else:
+                values[field_name] = field_value
+        return values
+
+    def _partial_unique_lock_key(self, idx, values):
+        return locks.partial_unique_lock_key(
+            idx, {field_name: self._meta.get_field(field_name).to_python(values[field_name]) for field_name in idx.fields})
+
+    def lock_partial_unique(self, using=None):
+        """Locks the values of this instance in its unique PartialIndexes until the end of the current transaction.
+
+        Concurrent writers of the same values wait for the lock, while writers of other values do not, on PostgreSQL.
+        On SQLite, all writers wait for the database write lock.
+        """
+        connection = connections[using or router.db_for_write(self.__class__, instance=self)]
+        model_fields = set(f.name for f in self._meta.get_fields(include_parents=True, include_hidden=True))
+        keys = []
+        for idx in self._meta.indexes:
+            if isinstance(idx, PartialIndex) and idx.unique:
+                values = self._partial_unique_values(idx, model_fields, set())
+                if values is not None:
+                    keys.append(self._partial_unique_lock_key(idx, values))
+        locks.acquire_partial_unique_locks(connection, self.__class__, keys)
+        # Lookups cached before the locks were taken may miss rows committed by other writers since.
+        cache.invalidate(self.__class__)
+
+    def save_partial_unique(self, *args, **kwargs):
+        """Validates the unique PartialIndexes and saves the instance, in a transaction holding their locks.
+
+        Unlike validating and saving separately, this cannot race with a concurrent save of the same values.
+        Raises PartialUniqueValidationError on conflicts.
+        """
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            self.lock_partial_unique(using=using)
+            self._validate_partial_unique(None, use_cache=False)
+            self.save(*args, **kwargs)
+
+    def _partial_unique_conflict_exists(self, idx, values, use_cache=True):
+        def lookup():
+            if getattr(settings, 'DJANGO_PARTIAL_INDEX_PRECOMPILED_QUERIES', False):
+                exists = self._partial_unique_conflict_exists_sql(idx, values)
+                if exists is not None:
+                    return exists
+            conflict = self.__class__.objects.filter(**values)  # Step 1 and 3
+            conflict = conflict.filter(idx.where)  # Step 2
+            if self.pk:
+                conflict = conflict.exclude(pk=self.pk)  # Step 4
+            return conflict.exists()
+        if not use_cache:
+            return lookup()
+        return cache.cached_conflict_exists(self.__class__, idx, values, self.pk, lookup)
+
+    def _partial_unique_conflict_exists_sql(self, idx, values):
+        """Same lookup as the QuerySet above, but with a precompiled SQL query.
+
+        Only the parameter values change between calls for the same index, so this skips the QuerySet compilation.
+        Returns None if the lookup cannot be precompiled, see query.conflict_sql().
+        """
+        # The database of the manager used by the QuerySet lookup.
+        connection = connections[self.__class__.objects.db]
+        raw_values = [(self._meta.get_field(field_name), values[field_name]) for field_name in sorted(values)]
+        field_names = [field.name for field, value in raw_values if value is not None]
+        null_field_names = [field.name for field, value in raw_values if value is None]
+        compiled = query.conflict_sql(self.__class__, idx, field_names, null_field_names, bool(self.pk), connection)
+        if compiled is None:
+            return None
+        sql, where_params = compiled
+
+        params = [field.get_db_prep_value(value, connection) for field, value in raw_values if value is not None]
+        params += where_params
+        if self.pk:
+            params.append(self._meta.pk.get_db_prep_value(self.pk, connection))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() is not None
@@ -0,0 +1,271 @@
+"""Migration operations for building partial indexes on large tables."""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from django.db import connections
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.operations.base import Operation
+
+from . import partitions, query
+
+
+logger = logging.getLogger('partial_index')
+
+
+def _build_index(alias, model, index):
+    """Creates the index on a separate database connection, and returns the build time in seconds.
+
+    Django connections are thread-local, so this opens a new connection when ran in a worker thread.
+    """
+    connection = connections[alias]
+    try:
+        started = time.perf_counter()
+        with connection.schema_editor() as editor:
+            editor.add_index(model, index)
+        return time.perf_counter() - started
+    finally:
+        connection.close()
+
+
+def build_indexes_in_parallel(schema_editor, models_and_indexes, parallel):
+    """Creates several indexes at the same time, each on its own database connection.
+
+    Returns a list of build times in seconds, in the same order as models_and_indexes.
+    If any of the builds fails, the indexes that were built are dropped again, and the first error is raised.
+    """
+    alias = schema_editor.connection.alias
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(_build_index, alias, model, index) for model, index in models_and_indexes]
+    errors = [future.exception() for future in futures]
+    if any(errors):
+        for (model, index), error in zip(models_and_indexes, errors):
+            if error is None:
+                schema_editor.remove_index(model, index)
+        raise next(error for error in errors if error)
+    return [future.result() for future in futures]
+
+
+class AddPartialIndexes(Operation):
+    """Adds several indexes in one operation, building them in parallel on PostgreSQL.
+
+    Takes a list of (model_name, index) pairs:
+
+        AddPartialIndexes([
+            ('booking', PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True), name='...')),
+            ('job', PartialIndex(fields=['created_at'], unique=False, where=PQ(is_complete=False), name='...')),
+        ], parallel=2)
+
+    Up to "parallel" indexes are built at the same time, each on its own database connection.
+    That requires the migration to be non-atomic (atomic = False on the Migration class), as the other connections
+    cannot see uncommitted changes. Inside an atomic migration, and on SQLite, the indexes are built one at a time.
+
+    Build times are logged to the "partial_index" logger.
+    """
+    reduces_to_sql = False
+    reversible = True
+
+    def __init__(self, indexes, parallel=4):
+        if parallel < 1:
+            raise ValueError('parallel must be at least 1.')
+        self.indexes = [(model_name, index) for model_name, index in indexes]
+        self.parallel = parallel
+        self.operations = [AddIndex(model_name, index) for model_name, index in self.indexes]
+
+    def deconstruct(self):
+        kwargs = {
+            'indexes': self.indexes,
+        }
+        if self.parallel != 4:
+            kwargs['parallel'] = self.parallel
+        return (
+            self.__class__.__name__,
+            [],
+            kwargs,
+        )
+
+    def state_forwards(self, app_label, state):
+        for operation in self.operations:
+            operation.state_forwards(app_label, state)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        models_and_indexes = [
+            (to_state.apps.get_model(app_label, operation.model_name), operation.index)
+            for operation in self.operations
+        ]
+        models_and_indexes = [
+            (model, index) for model, index in models_and_indexes
+            if self.allow_migrate_model(schema_editor.connection.alias, model)
+        ]
+        if self.can_build_in_parallel(schema_editor):
+            durations = build_indexes_in_parallel(schema_editor, models_and_indexes, self.parallel)
+        else:
+            durations = []
+            for model, index in models_and_indexes:
+                started = time.perf_counter()
+                schema_editor.add_index(model, index)
+                durations.append(time.perf_counter() - started)
+
+        for (model, index), duration in zip(models_and_indexes, durations):
+            logger.info('Built index %s on %s in %.2fs.', index.name, model._meta.db_table, duration)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        for operation in reversed(self.operations):
+            operation.database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def can_build_in_parallel(self, schema_editor):
+        return (
+            self.parallel > 1 and
+            len(self.operations) > 1 and
+            not schema_editor.collect_sql and
+            not schema_editor.connection.in_atomic_block and
+            query.get_valid_vendor(schema_editor) == query.Vendor.POSTGRESQL
+        )
+
+    def describe(self):
+        return 'Create indexes %s' % ', '.join(index.name for model_name, index in self.indexes)
+
+
+class AddPartitionedIndex(AddIndex):
+    """Adds an index to a partitioned table on PostgreSQL, without locking all partitions at once.
+
+    The index is created on only the parent table, then built concurrently on up to "parallel" partitions at a time,
+    and attached. See partial_index.partitions. This requires a non-atomic migration (atomic = False on the
+    Migration class). On tables that are not partitioned, and on SQLite, the index is added as by AddIndex.
+    """
+    reduces_to_sql = False
+
+    def __init__(self, model_name, index, parallel=4):
+        if parallel < 1:
+            raise ValueError('parallel must be at least 1.')
+        super(AddPartitionedIndex, self).__init__(model_name, index)
+        self.parallel = parallel
+
+    def deconstruct(self):
+        name, args, kwargs = super(AddPartitionedIndex, self).deconstruct()
+        if self.parallel != 4:
+            kwargs['parallel'] = self.parallel
+        return name, args, kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if query.get_valid_vendor(schema_editor) == query.Vendor.POSTGRESQL and not schema_editor.collect_sql and \
+                partitions.is_partitioned(schema_editor.connection, model._meta.db_table):
+            partitions.create_partitioned_index(schema_editor, model, self.index, self.parallel)
+        else:
+            super(AddPartitionedIndex, self).database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return 'Create index %s on partitioned table %s' % (self.index.name, self.model_name)
+
+
+STATISTICS_KINDS = ('ndistinct', 'dependencies', 'mcv')
+# Supported by PostgreSQL 10 and later. mcv requires PostgreSQL 12.
+DEFAULT_STATISTICS_KINDS = ('ndistinct', 'dependencies')
+
+
+def statistics_name(index):
+    """Returns the name of the extended statistics object created for index by CreateIndexStatistics."""
+    return '%s_stat' % index.name
+
+
+def statistics_columns(model, index):
+    """Returns the columns of the fields of index, followed by those mentioned in its where condition."""
+    field_names = [field_name for field_name, order in index.fields_orders]
+    if isinstance(index.where, query.PQ):
+        field_names += query.q_mentioned_fields(index.where, model)
+    columns = []
+    for field_name in field_names:
+        column = model._meta.get_field(field_name).column
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+class CreateIndexStatistics(Operation):
+    """Creates extended statistics over the columns of a PartialIndex and of its where condition, then analyzes the table.
+
+    PostgreSQL assumes that columns are independent when estimating how many rows a condition matches. When the
+    condition columns are correlated with the indexed ones, such as deleted_at with status, the estimates are off,
+    and the planner may skip the partial index. Extended statistics (CREATE STATISTICS) record these correlations:
+
+        migrations.AddIndex('booking', PartialIndex(fields=['status'], unique=False, where=PQ(deleted_at__isnull=True), name='...')),
+        CreateIndexStatistics('booking', '...'),
+
+    The index is looked up by name in the model state, so it must be added first. Statistics need at least two
+    columns, and the columns of text-based where conditions are not known, so only the indexed fields are used for
+    them. The default kinds work on PostgreSQL 10 and later. The mcv kind, which also records the most common
+    combinations of values, requires PostgreSQL 12.
+    On SQLite, which has no extended statistics, the table is only analyzed, which also helps its planner choose
+    partial indexes.
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, model_name, index_name, kinds=DEFAULT_STATISTICS_KINDS, analyze=True):
+        kinds = list(kinds)
+        if not kinds or any(kind not in STATISTICS_KINDS for kind in kinds):
+            raise ValueError('kinds must be a non-empty list of %s.' % ', '.join(STATISTICS_KINDS))
+        self.model_name = model_name
+        self.index_name = index_name
+        self.kinds = kinds
+        self.analyze = analyze
+
+    def deconstruct(self):
+        kwargs = {
+            'model_name': self.model_name,
+            'index_name': self.index_name,
+        }
+        if self.kinds != list(DEFAULT_STATISTICS_KINDS):
+            kwargs['kinds'] = self.kinds
+        if not self.analyze:
+            kwargs['analyze'] = False
+        return (
+            self.__class__.__name__,
+            [],
+            kwargs,
+        )
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def get_index(self, model):
+        for index in model._meta.indexes:
+            if index.name == self.index_name:
+                return index
+        raise ValueError('Index %s not found on model %s.' % (self.index_name, model._meta.label))
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        index = self.get_index(model)
+        quote_name = schema_editor.quote_name
+        if query.get_valid_vendor(schema_editor) == query.Vendor.POSTGRESQL:
+            columns = statistics_columns(model, index)
+            if 'mcv' in self.kinds and schema_editor.connection.pg_version < 120000:
+                raise ValueError('The mcv statistics kind requires PostgreSQL 12.')
+            if len(columns) < 2:
+                logger.warning('Not creating statistics for index %s, which only uses column %s.', index.name, columns[0])
+            else:
+                schema_editor.execute('CREATE STATISTICS IF NOT EXISTS %s (%s) ON %s FROM %s' % (
+                    quote_name(statistics_name(index)),
+                    ', '.join(self.kinds),
+                    ', '.join(quote_name(column) for column in columns),
+                    quote_name(model._meta.db_table),
+                ))
+        if self.analyze:
+            schema_editor.execute('ANALYZE %s' % quote_name(model._meta.db_table))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if query.get_valid_vendor(schema_editor) == query.Vendor.POSTGRESQL:
+            index = self.get_index(model)
+            schema_editor.execute('DROP STATISTICS IF EXISTS %s' % schema_editor.quote_name(statistics_name(index)))
+
+    def describe(self):
+        return 'Create statistics for index %s on %s' % (self.index_name, self.model_name)
@@ -0,0 +1,176 @@
+"""Partial indexes on PostgreSQL partitioned tables.
+
+Creating an index on a partitioned table builds it on all partitions at once, locking each of them against writes
+until the whole build is done. Instead, create_partitioned_index():
+
+1. Creates the index on only the parent table, with CREATE INDEX ... ON ONLY. It is invalid until step 3 is done
+   for every partition.
+2. Builds a matching index on each partition with CREATE INDEX CONCURRENTLY, which does not block writes.
+   Up to "parallel" partitions are built at the same time, each on its own database connection.
+3. Attaches each partition index to the parent index, with ALTER INDEX ... ATTACH PARTITION.
+
+Partitions created later with CREATE TABLE ... PARTITION OF get the index from PostgreSQL automatically.
+Tables that are filled before being attached with ALTER TABLE ... ATTACH PARTITION can be prepared with
+prepare_partition() first, so that attaching them reuses the index instead of building it under a lock.
+
+Only one level of partitioning is supported.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from django.db import connections
+
+
+logger = logging.getLogger('partial_index')
+
+
+def is_partitioned(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [connection.ops.quote_name(table)])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(connection, table):
+    """Returns the names of the partitions of a table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname',
+            [connection.ops.quote_name(table)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def attached_partitions(connection, index_name):
+    """Returns the names of the partitions with an index attached to the partitioned index."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT t.relname FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid '
+            'JOIN pg_class t ON t.oid = x.indrelid WHERE i.inhparent = to_regclass(%s) ORDER BY t.relname',
+            [connection.ops.quote_name(index_name)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def partition_key_columns(connection, table):
+    """Returns the columns of the partition key of a table, with None for expressions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT a.attname FROM pg_partitioned_table p '
+            'CROSS JOIN LATERAL unnest(p.partattrs::int2[]) WITH ORDINALITY AS k(attnum, n) '
+            'LEFT JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = k.attnum '
+            'WHERE p.partrelid = to_regclass(%s) ORDER BY k.n',
+            [connection.ops.quote_name(table)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def check_unique_partition_key(connection, model, index):
+    """Raises ValueError for a unique index that does not include the partition key columns of the table of model.
+
+    PostgreSQL can only enforce uniqueness per partition, so it rejects such indexes, but only after building
+    the partition indexes.
+    """
+    if not index.unique:
+        return
+    columns = set(model._meta.get_field(field_name).column for field_name, order in index.fields_orders)
+    key_columns = partition_key_columns(connection, model._meta.db_table)
+    if any(column is None or column not in columns for column in key_columns):
+        raise ValueError('Unique index %s on partitioned table %s must include the partition key columns (%s).' % (
+            index.name, model._meta.db_table, ', '.join(column or '<expression>' for column in key_columns)))
+
+
+def index_is_valid(connection, index_name):
+    """Returns True if the index exists and is valid, False if it exists but is invalid, or None if it does not exist.
+
+    Indexes are invalid when a concurrent build failed, and partitioned indexes until all partitions are attached.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)',
+                       [connection.ops.quote_name(index_name)])
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def partition_index_name(index, partition):
+    """Returns a stable name for the index on a partition, within the PostgreSQL limit of 63 characters."""
+    return '%s_%s_%s' % (partition[:40], index._hash_generator(index.name, partition), index.suffix)
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _build_partition_index(connection, model, index, partition, name, concurrently=True):
+    """Builds the index on one partition, dropping an invalid one left by a failed concurrent build first."""
+    schema_editor = connection.schema_editor()
+    valid = index_is_valid(connection, name)
+    if valid is False:
+        _execute(connection, ['DROP INDEX%s %s' % (' CONCURRENTLY' if concurrently else '', connection.ops.quote_name(name))])
+    if not valid:
+        # Each statement runs in its own transaction, as CREATE INDEX CONCURRENTLY requires.
+        with connection.cursor() as cursor:
+            index.execute_create_sql(cursor, model, schema_editor, concurrently=concurrently, table=partition, name=name)
+
+
+def _build_and_attach(alias, model, index, partition):
+    """Builds and attaches the index of one partition on a separate database connection, returns the build time."""
+    connection = connections[alias]
+    try:
+        started = time.perf_counter()
+        name = partition_index_name(index, partition)
+        _build_partition_index(connection, model, index, partition, name)
+        quote_name = connection.ops.quote_name
+        _execute(connection, ['ALTER INDEX %s ATTACH PARTITION %s' % (quote_name(index.name), quote_name(name))])
+        return time.perf_counter() - started
+    finally:
+        connection.close()
+
+
+def create_partitioned_index(schema_editor, model, index, parallel=4):
+    """Creates index on the partitioned table of model, and on each of its partitions.
+
+    Must be called outside of a transaction. It can be called again after a failure, and only completes the
+    partitions that are missing. Returns a dict mapping partition names to build times in seconds.
+    """
+    connection = schema_editor.connection
+    if connection.in_atomic_block:
+        raise RuntimeError('Partitioned indexes cannot be created inside a transaction.')
+    table = model._meta.db_table
+    check_unique_partition_key(connection, model, index)
+    if index_is_valid(connection, index.name) is None:
+        with connection.cursor() as cursor:
+            index.execute_create_sql(cursor, model, schema_editor, only=True)
+
+    attached = set(attached_partitions(connection, index.name))
+    partitions = [partition for partition in list_partitions(connection, table) if partition not in attached]
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [executor.submit(_build_and_attach, connection.alias, model, index, partition) for partition in partitions]
+    durations = {}
+    errors = []
+    for partition, future in zip(partitions, futures):
+        if future.exception() is not None:
+            logger.error('Failed to build index %s on partition %s: %s', index.name, partition, future.exception())
+            errors.append(future.exception())
+        else:
+            durations[partition] = future.result()
+            logger.info('Built index %s on partition %s in %.2fs.', index.name, partition, durations[partition])
+    if errors:
+        raise errors[0]
+    return durations
+
+
+def prepare_partition(schema_editor, model, index, table):
+    """Builds index concurrently on a table that is about to be attached as a partition of the table of model.
+
+    Attaching the table with ALTER TABLE ... ATTACH PARTITION then attaches this index, instead of building one.
+    """
+    connection = schema_editor.connection
+    if connection.in_atomic_block:
+        raise RuntimeError('Partition indexes cannot be prepared inside a transaction.')
+    check_unique_partition_key(connection, model, index)
+    _build_partition_index(connection, model, index, table, partition_index_name(index, table))
@@ -1,5 +1,8 @@
 """Django Q object to SQL string conversion."""
-from django.db.models import expressions, Q, F
+from collections import OrderedDict
+from django.core.exceptions import FieldError
+from django.db.models import expressions, Model, Q, F
+from django.db.models.constants import LOOKUP_SEP
 from django.db.models.sql import Query
 
 
@@ -18,6 +21,8 @@ class PQ(Q):
 
     def __eq__(self, other):
         """Copied from Django 2.0 django.utils.tree.Node.__eq__()"""
+        if self is other:
+            return True
         if self.__class__ != other.__class__:
             return False
         if (self.connector, self.negated) == (other.connector, other.negated):
@@ -112,3 +117,213 @@ def q_mentioned_fields(q, model):
     query = Query(model)
     where = query._add_q(q, used_aliases=set(), allow_joins=False)[0]
     return list(sorted(set(expression_mentioned_fields(where))))
+
+
+class CannotEvaluate(Exception):
+    """Raised by q_matches() for lookups and expressions that cannot be evaluated in Python."""
+
+
+def _comparable(value):
+    # Model instances are compared by primary key, as in database lookups.
+    return getattr(value, 'pk', value) if isinstance(value, Model) else value
+
+
+def _lookup_matches(lookup, value, values):
+    parts = lookup.split(LOOKUP_SEP)
+    if len(parts) > 2 or parts[0] not in values:
+        raise CannotEvaluate('Cannot evaluate lookup %s in Python.' % lookup)
+    field_name, lookup_name = parts[0], parts[1] if len(parts) == 2 else 'exact'
+
+    actual = _comparable(values[field_name])
+    if isinstance(value, F):
+        if value.name not in values:
+            raise CannotEvaluate('Cannot evaluate reference to %s in Python.' % value.name)
+        value = values[value.name]
+    elif hasattr(value, 'resolve_expression'):
+        raise CannotEvaluate('Cannot evaluate expression %s in Python.' % value)
+    value = _comparable(value)
+
+    if lookup_name == 'exact':
+        return actual is None if value is None else actual == value
+    elif lookup_name == 'isnull':
+        return (actual is None) == bool(value)
+    elif lookup_name == 'in':
+        return actual in [_comparable(v) for v in value]
+    elif actual is None or value is None:
+        return False
+    elif lookup_name == 'gt':
+        return actual > value
+    elif lookup_name == 'gte':
+        return actual >= value
+    elif lookup_name == 'lt':
+        return actual < value
+    elif lookup_name == 'lte':
+        return actual <= value
+    raise CannotEvaluate('Cannot evaluate lookup %s in Python.' % lookup)
+
+
+def q_matches(q, values):
+    """Evaluates a Q object against a dict of field values in Python, without querying the database.
+
+    Supports the exact, isnull, in, gt, gte, lt and lte lookups, with constants or F-expressions referencing other fields in values.
+    Raises CannotEvaluate for other lookups and expressions.
+
+    PQ(a__isnull=True) | PQ(b=PF('c')), {'a': None, 'b': 1, 'c': 2} -> True
+    """
+    results = []
+    for child in q.children:
+        if isinstance(child, Q):
+            results.append(q_matches(child, values))
+        else:
+            results.append(_lookup_matches(child[0], child[1], values))
+    matched = all(results) if q.connector == Q.AND else any(results)
+    return not matched if q.negated else matched
+
+
+def _fold_lookup(lookup, value):
+    """Returns the simplest equivalent of one lookup, such as a=1 for a__exact=1 or a__in=[1]."""
+    if lookup.endswith(LOOKUP_SEP + 'exact'):
+        lookup = lookup[:-len(LOOKUP_SEP + 'exact')]
+    if lookup.endswith(LOOKUP_SEP + 'isnull'):
+        return lookup, bool(value)
+    if lookup.endswith(LOOKUP_SEP + 'in') and isinstance(value, (list, tuple, set, frozenset)):
+        values = []
+        for v in value:
+            if v not in values:
+                values.append(v)
+        if len(values) == 1 and values[0] is not None:
+            return lookup[:-len(LOOKUP_SEP + 'in')], values[0]
+        try:
+            values = sorted(values)
+        except TypeError:
+            pass
+        return lookup, values
+    if value is None and LOOKUP_SEP not in lookup:
+        # Django matches exact=None with IS NULL.
+        return lookup + LOOKUP_SEP + 'isnull', True
+    return lookup, value
+
+
+def _sort_key(child):
+    if isinstance(child, Q):
+        return (1, repr(child.deconstruct()))
+    return (0, child[0], repr(child[1]))
+
+
+def _normalize(node, negate):
+    if not isinstance(node, Q):
+        lookup, value = _fold_lookup(node[0], node[1])
+        if not negate:
+            return (lookup, value)
+        if lookup.endswith(LOOKUP_SEP + 'isnull'):
+            return (lookup, not value)
+        # Other negated lookups also exclude NULL values, and cannot be rewritten as a single lookup.
+        return PQ((lookup, value), _negated=True)
+
+    negate = negate != node.negated
+    # De Morgan: NOT (a AND b) is (NOT a) OR (NOT b). This also holds for the NULL results of SQL comparisons.
+    connector = node.connector
+    if negate and len(node.children) > 1:
+        connector = Q.OR if connector == Q.AND else Q.AND
+    children = []
+    for child in node.children:
+        child = _normalize(child, negate)
+        if isinstance(child, Q) and not child.negated and (child.connector == connector or len(child.children) == 1):
+            candidates = child.children
+        else:
+            candidates = [child]
+        for candidate in candidates:
+            if candidate not in children:
+                children.append(candidate)
+    children.sort(key=_sort_key)
+    if len(children) == 1:
+        return children[0]
+    return PQ(*children, _connector=connector)
+
+
+def normalize_q(q):
+    """Returns a canonical PQ equivalent to the Q object q.
+
+    Nested ANDs and ORs are flattened, negations are pushed down to single lookups, duplicated lookups are
+    removed, lookups are sorted, and trivial lookups are folded, such as a__exact=1 and a__in=[1] to a=1, and
+    ~PQ(a__isnull=False) to a__isnull=True. Equivalent conditions written differently often normalize to the
+    same PQ, and so compile to the same SQL.
+
+    PQ(b__exact=1) & ~(PQ(a__isnull=False) | PQ(c__in=[2])) -> PQ(a__isnull=True, b=1) & ~PQ(c=2)
+    """
+    normalized = _normalize(q, False)
+    if not isinstance(normalized, Q):
+        return PQ(normalized)
+    if normalized.__class__ is not PQ:
+        normalized = PQ(*normalized.children, _connector=normalized.connector, _negated=normalized.negated)
+    return normalized
+
+
+# Precompiled conflict lookups, see conflict_sql(). Model states rendered by migrations create new model classes,
+# so the least recently used lookups are discarded beyond CONFLICT_SQL_CACHE_SIZE.
+CONFLICT_SQL_CACHE_SIZE = 512
+_conflict_sql_cache = OrderedDict()
+
+
+def clear_conflict_sql_cache():
+    """Discards the precompiled conflict lookups, for example after models are changed in tests."""
+    _conflict_sql_cache.clear()
+
+
+def q_to_sql_params(q, model, connection):
+    """Like q_to_sql(), but returns the SQL with placeholders, and the list of parameters separately."""
+    query = Query(model)
+    where = query._add_q(q, used_aliases=set(), allow_joins=False)[0]
+    compiler = connection.ops.compiler('SQLCompiler')(query, connection, 'default')
+    sql, params = where.as_sql(compiler, connection)
+    return sql, list(params)
+
+
+def conflict_sql(model, idx, field_names, null_field_names, has_pk, connection):
+    """Returns (sql, params) of a query that finds a row conflicting with a unique PartialIndex.
+
+    The query is built once for each combination of arguments, and cached. It expects parameters for the values of
+    field_names (in the same order), followed by the primary key if has_pk. Fields in null_field_names are matched with IS NULL.
+
+    Returns None if the lookup cannot be written as a query on the table of model alone: when one of the fields is
+    inherited from a parent model, or when the where condition needs joins.
+    """
+    # Indexes of different model states may share a name, so the cached where condition must match as well.
+    key = (connection.alias, model, idx.name, idx.fingerprint(), tuple(field_names), tuple(null_field_names), has_pk)
+    cached = _conflict_sql_cache.get(key)
+    if cached is not None and cached[0] == idx.where:
+        _conflict_sql_cache.move_to_end(key)
+        return cached[1]
+    compiled = _build_conflict_sql(model, idx, field_names, null_field_names, has_pk, connection)
+    _conflict_sql_cache[key] = (idx.where, compiled)
+    while len(_conflict_sql_cache) > CONFLICT_SQL_CACHE_SIZE:
+        _conflict_sql_cache.popitem(last=False)
+    return compiled
+
+
+def _build_conflict_sql(model, idx, field_names, null_field_names, has_pk, connection):
+    local_fields = set(model._meta.local_concrete_fields)
+    fields = [model._meta.get_field(name) for name in list(field_names) + list(null_field_names)] + [model._meta.pk]
+    if any(field not in local_fields for field in fields):
+        return None
+    try:
+        where_sql, where_params = q_to_sql_params(idx.where, model, connection)
+    except FieldError:
+        # Joined fields are not allowed.
+        return None
+    if any(field not in local_fields for field in map(model._meta.get_field, q_mentioned_fields(idx.where, model))):
+        return None
+
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+
+    def column(field):
+        return '%s.%s' % (table, quote_name(field.column))
+
+    conditions = ['%s = %%s' % column(model._meta.get_field(name)) for name in field_names]
+    conditions += ['%s IS NULL' % column(model._meta.get_field(name)) for name in null_field_names]
+    conditions.append('(%s)' % where_sql)
+    if has_pk:
+        conditions.append('NOT (%s = %%s)' % column(model._meta.pk))
+    sql = 'SELECT 1 FROM %s WHERE %s LIMIT 1' % (table, ' AND '.join(conditions))
+    return sql, where_params
@@ -0,0 +1,203 @@
+"""QuerySets scoped to a PartialIndex, with its where condition inlined as SQL literals.
+
+PostgreSQL only uses a partial index for a query if it can prove that the query condition implies the index
+condition. With server-side parameter binding (psycopg 3, prepared statements), a filter such as
+status = $1 proves nothing in a generic plan, and the index is not used:
+
+    Job.objects.filter(status='open')          # WHERE status = $1, may not use the index.
+    Job.objects.for_index('job_open_index')    # WHERE status = 'open', written as in CREATE INDEX.
+
+for_index() adds the where condition of the index exactly as it is written in CREATE INDEX, with its values
+inlined as literals. Further filters keep their values as parameters:
+
+    class Job(models.Model):
+        ...
+        objects = PartialIndexQuerySet.as_manager()
+
+    Job.objects.for_index(Job._meta.indexes[0]).filter(user=user).order_by('created_at')
+"""
+from django.core.exceptions import ImproperlyConfigured, NON_FIELD_ERRORS
+from django.db import connections
+from django.db.models import Exists, F, OuterRef, Q, QuerySet, Value
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.sql.where import AND
+
+from .batch import unique_partial_indexes
+from .index import PartialIndex
+from .mixins import PartialUniqueValidationError
+from .query import PQ, normalize_q, q_mentioned_fields
+
+
+_where_sql_cache = {}
+
+
+def get_index(model, index):
+    """Returns the PartialIndex of model named index, or index itself if it is a PartialIndex."""
+    if not isinstance(index, PartialIndex):
+        index = next((idx for idx in model._meta.indexes if idx.name == index), None)
+        if not isinstance(index, PartialIndex):
+            raise ValueError('PartialIndex not found on model %s.' % model._meta.label)
+    return index
+
+
+def inline_where_sql(model, index, connection):
+    """Returns the where condition of index as written in CREATE INDEX, escaped for QuerySet.extra()."""
+    key = (connection.vendor, model, index.name)
+    cached = _where_sql_cache.get(key)
+    if cached is None or cached[0] is not index.where:
+        sql = index.get_where_sql(model, connection.schema_editor())
+        # QuerySet.extra() interpolates parameters into the SQL, so literal % signs must be doubled.
+        cached = _where_sql_cache[key] = (index.where, sql.replace('%', '%%'))
+    return cached[1]
+
+
+class InlinedWhere(object):
+    """A where clause node, compiled with the values of its lookups inlined as SQL literals.
+
+    Its columns follow the aliases of the query, so that the condition stays valid when the table is aliased,
+    such as in subqueries.
+    """
+    contains_aggregate = False
+    contains_over_clause = False
+
+    def __init__(self, node):
+        self.node = node
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.node)
+        sql = sql % tuple(map(connection.schema_editor().quote_value, params))
+        # The condition is part of a query with parameters, so literal % signs must be doubled.
+        return sql.replace('%', '%%'), []
+
+    def clone(self):
+        return InlinedWhere(self.node.clone())
+
+    def relabeled_clone(self, change_map):
+        return InlinedWhere(self.node.relabeled_clone(change_map))
+
+
+def filter_for_index(queryset, index):
+    """Filters queryset to the rows covered by index, a PartialIndex of its model or its name.
+
+    Text-based where conditions are added with QuerySet.extra(), as written.
+    """
+    index = get_index(queryset.model, index)
+    if not isinstance(index.where, Q):
+        return queryset.extra(where=[inline_where_sql(queryset.model, index, connections[queryset.db])])
+    queryset = queryset._chain()
+    node = queryset.query._add_q(index.where, used_aliases=set(), allow_joins=False)[0]
+    queryset.query.where.add(InlinedWhere(node), AND)
+    return queryset
+
+
+class PartialIndexQuerySet(QuerySet):
+    def for_index(self, index):
+        """Filters to the rows covered by index, with its where condition inlined as SQL literals."""
+        return filter_for_index(self, index)
+
+    def filter_normalized(self, *args, **kwargs):
+        """Like filter(), with the condition normalized as in PartialIndexes with normalize_where=True."""
+        return self.filter(normalize_q(PQ(*args, **kwargs)))
+
+
+def _new_value_name(field_name):
+    return '_partial_unique_new_%s' % field_name
+
+
+def _rename_q(q, rename):
+    """Returns a copy of q with the field names in lookups and F-expressions replaced by rename(field_name)."""
+    children = []
+    for child in q.children:
+        if isinstance(child, Q):
+            children.append(_rename_q(child, rename))
+        else:
+            lookup, value = child
+            parts = lookup.split(LOOKUP_SEP)
+            if isinstance(value, F):
+                value = F(rename(value.name))
+            children.append((LOOKUP_SEP.join([rename(parts[0])] + parts[1:]), value))
+    return PQ(*children, _connector=q.connector, _negated=q.negated)
+
+
+class PartialUniqueQuerySet(PartialIndexQuerySet):
+    """A QuerySet that checks unique PartialIndexes before updates, with set-based queries.
+
+    QuerySet.update() bypasses ValidatePartialUniqueMixin, and fails with an IntegrityError when the updated rows
+    conflict with each other or with other rows. For example, undeleting several bookings of the same room:
+
+        Booking.objects.filter(room=room).safe_update(deleted_at=None)  # Raises PartialUniqueValidationError.
+        Booking.objects.filter(room=room).safe_update(deleted_at=None, on_conflict='skip')  # Undeletes one of them.
+    """
+
+    def update_conflicts(self, **kwargs):
+        """Returns a dict mapping the names of unique PartialIndexes of the model to QuerySets of the rows of this
+        QuerySet that would violate them after update(**kwargs). Indexes without conflicts are left out.
+
+        Rows conflict with other rows that are not updated, and with other updated rows with a lower primary key,
+        so that updating all rows but the conflicting ones succeeds. No rows are loaded.
+        """
+        model = self.model
+        opts = model._meta
+        updated_fields = {}
+        for name, value in kwargs.items():
+            field = opts.get_field(name)
+            if not hasattr(value, 'resolve_expression'):
+                if field.is_relation:
+                    value = Value(getattr(value, 'pk', value), output_field=field.target_field)
+                else:
+                    value = Value(value, output_field=field)
+            updated_fields[field.name] = value
+
+        conflicts = {}
+        for idx in unique_partial_indexes(model):
+            if not isinstance(idx.where, Q):
+                raise ImproperlyConfigured(
+                    'Partial unique validation is not supported for PartialIndexes with a text-based where condition. ' +
+                    'Please upgrade to Q-object based where conditions.'
+                )
+            mentioned_fields = sorted(set(idx.fields) | set(q_mentioned_fields(idx.where, model)))
+            if not set(mentioned_fields) & set(updated_fields):
+                # The update changes neither the key nor whether rows are covered.
+                continue
+
+            # The values of the updated rows after the update, as annotations.
+            new_values = {_new_value_name(name): updated_fields.get(name, F(name)) for name in mentioned_fields}
+            updated = self.annotate(**new_values).filter(_rename_q(idx.where, _new_value_name))
+            same_key = {field_name: OuterRef(_new_value_name(field_name)) for field_name in idx.fields}
+            renamed_key = {_new_value_name(field_name): value for field_name, value in same_key.items()}
+
+            other_rows = model._default_manager.db_manager(self.db).filter(idx.where).exclude(pk__in=self.values('pk'))
+            conflicting = updated.annotate(
+                _partial_unique_existing=Exists(other_rows.filter(**same_key)),
+                _partial_unique_updated=Exists(updated.filter(pk__lt=OuterRef('pk'), **renamed_key)),
+            ).filter(Q(_partial_unique_existing=True) | Q(_partial_unique_updated=True))
+            if conflicting.exists():
+                conflicts[idx.name] = conflicting
+        return conflicts
+
+    def safe_update(self, on_conflict='raise', **kwargs):
+        """Like update(**kwargs), but checks unique PartialIndexes first. Returns the number of updated rows.
+
+        With on_conflict='raise', raises PartialUniqueValidationError if any row would conflict, and updates nothing.
+        With on_conflict='skip', the conflicting rows are left out of the update.
+        Rows inserted or updated concurrently are not seen, so the update may still fail with an IntegrityError.
+        """
+        if on_conflict not in ('raise', 'skip'):
+            raise ValueError('on_conflict must be "raise" or "skip".')
+        queryset = self
+        # Leaving out rows can make them conflict with other updated rows, so check again until there are no conflicts.
+        while True:
+            conflicts = queryset.update_conflicts(**kwargs)
+            if not conflicts:
+                return queryset.update(**kwargs)
+            if on_conflict == 'raise':
+                errors = {}
+                for name, conflicting in conflicts.items():
+                    idx = get_index(self.model, name)
+                    key = idx.fields[0] if len(idx.fields) == 1 else NON_FIELD_ERRORS
+                    errors.setdefault(key, []).append(
+                        'Updating would violate the unique index %s on %s for %d rows.' % (
+                            idx.name, ', '.join(idx.fields), conflicting.count()))
+                raise PartialUniqueValidationError(errors)
+            for conflicting in conflicts.values():
+                queryset = queryset.exclude(pk__in=conflicting.values('pk'))
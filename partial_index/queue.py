@@ -0,0 +1,115 @@
+"""A work queue on a table with a partial index on its pending rows.
+
+    class Job(models.Model):
+        order = models.IntegerField()
+        is_complete = models.BooleanField(default=False)
+
+        class Meta:
+            indexes = [PartialIndex(fields=['order'], unique=False, where=PQ(is_complete=False))]
+
+    queue = PartialIndexQueue(Job, Job._meta.indexes[0], completed={'is_complete': True})
+    with transaction.atomic():
+        jobs = queue.claim(10)
+        ...
+        queue.complete(jobs)
+
+claim() selects pending rows with exactly the condition and order of the index, inlined as in CREATE INDEX (see
+partial_index.queryset), so that PostgreSQL can read them with an index scan, and locks them with FOR UPDATE SKIP
+LOCKED, so that concurrent workers claim different rows. The rows stay claimed until the transaction ends.
+On SQLite, which has no row locks, claim() takes the database write lock instead, so workers claim rows one
+transaction at a time.
+"""
+import threading
+import time
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .locks import acquire_sqlite_write_lock
+from .queryset import filter_for_index, get_index
+from . import query
+
+
+class PartialIndexQueue(object):
+    def __init__(self, model, index, completed, using=None):
+        """Creates a queue of the rows of model matching the condition of index.
+
+        index is a PartialIndex of the model, or its name. completed is a dict of field values that complete a row,
+        taking it out of the index, for example {'is_complete': True}.
+        """
+        index = get_index(model, index)
+        if not isinstance(index.where, Q):
+            raise ValueError('PartialIndexQueue requires a PartialIndex with a PQ where condition.')
+        try:
+            matches = query.q_matches(index.where, completed)
+        except query.CannotEvaluate:
+            matches = False
+        if matches:
+            raise ValueError('The completed values %r still match the index condition.' % completed)
+        self.model = model
+        self.index = index
+        self.completed = dict(completed)
+        self.using = using
+        self._lock = threading.Lock()
+        self.reset_metrics()
+
+    def get_using(self):
+        return self.using or router.db_for_write(self.model)
+
+    def pending(self):
+        """Returns a QuerySet of the pending rows, with exactly the condition and order of the index."""
+        queryset = self.model._default_manager.db_manager(self.get_using()).all()
+        return filter_for_index(queryset, self.index).order_by(*self.index.fields)
+
+    def claim(self, n=1):
+        """Claims up to n pending rows for the current transaction, and returns them in index order."""
+        using = self.get_using()
+        connection = connections[using]
+        if not connection.in_atomic_block:
+            raise transaction.TransactionManagementError('PartialIndexQueue.claim() must be called inside a transaction.')
+        started = time.perf_counter()
+        if connection.features.has_select_for_update_skip_locked:
+            rows = list(self.pending().select_for_update(skip_locked=True)[:n])
+        else:
+            acquire_sqlite_write_lock(connection, self.model)
+            rows = list(self.pending()[:n])
+        duration = time.perf_counter() - started
+
+        with self._lock:
+            self.metrics['claims'] += 1
+            self.metrics['claimed'] += len(rows)
+            self.metrics['empty_claims'] += 0 if rows else 1
+            self.metrics['claim_seconds'] += duration
+            if self.metrics['started'] is None:
+                self.metrics['started'] = time.time()
+        return rows
+
+    def complete(self, rows):
+        """Marks claimed rows (instances or primary keys) as completed. Returns the number of rows updated."""
+        pks = [getattr(row, 'pk', row) for row in rows]
+        updated = self.model._default_manager.db_manager(self.get_using()).filter(pk__in=pks).update(**self.completed)
+        for row in rows:
+            if isinstance(row, self.model):
+                for name, value in self.completed.items():
+                    setattr(row, name, value)
+        with self._lock:
+            self.metrics['completed'] += updated
+        return updated
+
+    def reset_metrics(self):
+        self.metrics = {
+            'claims': 0,
+            'claimed': 0,
+            'empty_claims': 0,
+            'completed': 0,
+            'claim_seconds': 0.0,
+            'started': None,
+        }
+
+    def get_metrics(self):
+        """Returns a copy of the metrics, with the number of completed rows per second since the first claim."""
+        with self._lock:
+            metrics = dict(self.metrics)
+        elapsed = time.time() - metrics['started'] if metrics['started'] is not None else 0
+        metrics['completed_per_second'] = metrics['completed'] / elapsed if elapsed > 0 else 0.0
+        return metrics
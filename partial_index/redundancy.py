@@ -0,0 +1,240 @@
+"""Finding indexes that are made redundant by another index on the same table.
+
+An index is redundant if another index on the same table can serve the same lookups, and covers at least the same
+rows. All indexes of a model are compared: PartialIndexes and other Meta.indexes, unique_together, index_together,
+and the indexes Django creates for primary keys, unique fields, ForeignKeys and fields with db_index=True.
+
+Where conditions are compared conservatively: a condition implies another one only if it is equal to it, or has all
+of its AND-ed lookups. Text-based where conditions are only compared for equality.
+"""
+import json
+
+from django.db import connections
+from django.db.models import Q
+
+from .index import PartialIndex
+from . import query
+
+
+DUPLICATE = 'duplicate'
+PREFIX = 'prefix'
+PREDICATE = 'predicate'
+DEFAULT_SAMPLE_SIZE = 100000
+
+
+class TableIndex(object):
+    """An index of a model, as created in the database."""
+
+    def __init__(self, model, name, fields_orders, unique=False, where=None, declared=None):
+        self.model = model
+        self.name = name
+        self.fields_orders = list(fields_orders)
+        self.unique = unique
+        # A Q object, a normalized text-based condition, or None for indexes covering all rows.
+        self.where = where
+        # The Index in Meta.indexes, if this index was declared there.
+        self.declared = declared
+
+    def __repr__(self):
+        return '<%s: %s.%s>' % (self.__class__.__name__, self.model._meta.label, self.name)
+
+    @property
+    def field_names(self):
+        return [field_name for field_name, order in self.fields_orders]
+
+
+class Redundancy(object):
+    """An index that is redundant because of another index on the same table."""
+
+    def __init__(self, kind, index, covered_by):
+        self.kind = kind
+        self.index = index
+        self.covered_by = covered_by
+
+    def __repr__(self):
+        return '<%s: %s %s of %s>' % (self.__class__.__name__, self.index, self.kind, self.covered_by)
+
+    def describe(self):
+        if self.kind == DUPLICATE:
+            return 'Index %s duplicates index %s.' % (self.index.name, self.covered_by.name)
+        if self.kind == PREFIX:
+            return 'The fields of index %s are a prefix of index %s, which covers the same rows.' % (
+                self.index.name, self.covered_by.name)
+        return 'Index %s only covers rows that index %s on the same fields also covers.' % (
+            self.index.name, self.covered_by.name)
+
+
+def _text_where(idx):
+    where = ' '.join([idx.where, idx.where_postgresql, idx.where_sqlite])
+    return ' '.join(where.lower().split())
+
+
+def field_index_name(field):
+    """Returns the TableIndex name of the index created for a field with db_index=True."""
+    return '%s (field index)' % field.name
+
+
+def model_indexes(model):
+    """Returns a list of TableIndexes for all indexes on the table of model."""
+    opts = model._meta
+    indexes = []
+    for field in opts.local_fields:
+        if field.primary_key or field.unique:
+            indexes.append(TableIndex(model, '%s (unique field)' % field.name, [(field.name, '')], unique=True))
+        elif field.db_index:
+            indexes.append(TableIndex(model, field_index_name(field), [(field.name, '')]))
+    for fields in opts.unique_together:
+        indexes.append(TableIndex(model, 'unique_together %s' % ', '.join(fields), [(f, '') for f in fields], unique=True))
+    for fields in opts.index_together:
+        indexes.append(TableIndex(model, 'index_together %s' % ', '.join(fields), [(f, '') for f in fields]))
+    for idx in opts.indexes:
+        if isinstance(idx, PartialIndex):
+            where = idx.where if isinstance(idx.where, Q) else _text_where(idx)
+            indexes.append(TableIndex(model, idx.name, idx.fields_orders, unique=idx.unique, where=where, declared=idx))
+        else:
+            indexes.append(TableIndex(model, idx.name, idx.fields_orders, where=getattr(idx, 'condition', None), declared=idx))
+    return indexes
+
+
+def _conjuncts(q):
+    """Returns the list of lookups that are AND-ed together in q, or None if q is not a plain conjunction."""
+    if q.negated or (q.connector != Q.AND and len(q.children) > 1):
+        return None
+    lookups = []
+    for child in q.children:
+        if isinstance(child, Q):
+            child_lookups = _conjuncts(child)
+            if child_lookups is None:
+                return None
+            lookups.extend(child_lookups)
+        else:
+            lookups.append(tuple(child))
+    return lookups
+
+
+def where_implies(where, other):
+    """Returns True if every row matching where also matches other. None matches all rows.
+
+    False is returned whenever this cannot be shown, so False does not prove that some row does not match.
+    """
+    if other is None:
+        return True
+    if where is None:
+        return False
+    if isinstance(where, Q) and isinstance(other, Q):
+        if where.connector == other.connector and where.negated == other.negated and where.children == other.children:
+            return True
+        lookups, other_lookups = _conjuncts(where), _conjuncts(other)
+        if lookups is None or other_lookups is None:
+            return False
+        return all(lookup in lookups for lookup in other_lookups)
+    return where == other
+
+
+def redundancy(idx, other):
+    """Returns the kind of redundancy of idx because of other, or None if other does not make idx redundant."""
+    if idx.fields_orders == other.fields_orders and idx.unique == other.unique and \
+            where_implies(idx.where, other.where) and where_implies(other.where, idx.where):
+        return DUPLICATE
+    if not where_implies(idx.where, other.where):
+        return None
+    if idx.unique:
+        # A unique index enforces a constraint, which is only redundant if other enforces the same one.
+        if other.unique and idx.fields_orders == other.fields_orders:
+            return PREDICATE
+        return None
+    if idx.fields_orders == other.fields_orders:
+        return PREDICATE
+    if len(idx.fields_orders) < len(other.fields_orders) and other.fields_orders[:len(idx.fields_orders)] == idx.fields_orders:
+        return PREFIX
+    return None
+
+
+def find_redundant_indexes(model, partial_only=True):
+    """Returns a list of Redundancy objects for the redundant indexes of model.
+
+    With partial_only, only pairs of indexes involving at least one PartialIndex are reported.
+    Duplicated indexes are reported once, for the index declared later.
+    """
+    opts = model._meta
+    if opts.abstract or opts.proxy or not opts.managed:
+        return []
+    indexes = model_indexes(model)
+    found = []
+    for i, idx in enumerate(indexes):
+        for j, other in enumerate(indexes):
+            if i == j:
+                continue
+            if partial_only and not isinstance(idx.declared, PartialIndex) and not isinstance(other.declared, PartialIndex):
+                continue
+            kind = redundancy(idx, other)
+            if kind is None or (kind == DUPLICATE and j > i):
+                continue
+            found.append(Redundancy(kind, idx, other))
+            break
+    return found
+
+
+def estimate_fraction(queryset, where, sample_size=DEFAULT_SAMPLE_SIZE):
+    """Estimates which fraction of the rows of queryset match where, without counting all of them.
+
+    On PostgreSQL, the row estimate of the query planner is divided by the number of rows of the table, both taken
+    from the statistics of the last ANALYZE. On other databases, and for tables that have not been analyzed, the
+    first sample_size rows by primary key are scanned. Returns None for empty tables.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == query.Vendor.POSTGRESQL:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+            if row is not None and row[0] > 0:
+                sql, params = queryset.filter(where).query.sql_with_params()
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if not isinstance(plan, list):
+                    plan = json.loads(plan)
+                return min(1.0, plan[0]['Plan']['Plan Rows'] / float(row[0]))
+
+    sample = queryset.order_by('pk').values('pk')[:sample_size]
+    sampled = sample.count()
+    if not sampled:
+        return None
+    return float(queryset.filter(pk__in=sample).filter(where).count()) / sampled
+
+
+def write_cost(index, using=None, analyze=False, estimate=True, sample_size=DEFAULT_SAMPLE_SIZE):
+    """Returns an estimate of the cost of maintaining index on writes, as a dict.
+
+    "fields" are the fields whose updates must also update the index. Updating any of them also prevents
+    heap-only tuple (HOT) updates on PostgreSQL. "entries_per_insert" is the expected number of index entries
+    added for each inserted row, 1 for indexes covering all rows.
+
+    For partial indexes, it is the fraction of the rows of the table matching the where condition, estimated with
+    estimate_fraction(). With analyze, the rows of the table are counted instead. It is None for empty tables, for
+    text-based where conditions, and without estimate, which does not query the database at all.
+    """
+    fields = set(index.field_names)
+    if isinstance(index.where, Q):
+        fields.update(query.q_mentioned_fields(index.where, index.model))
+    cost = {'fields': sorted(fields), 'entries_per_insert': 1.0 if index.where is None else None}
+    rows = index.model._base_manager.using(using)
+    if analyze:
+        cost['rows'] = rows.count()
+        if index.where is None:
+            cost['indexed_rows'] = cost['rows']
+        elif isinstance(index.where, Q):
+            cost['indexed_rows'] = rows.filter(index.where).count()
+            cost['entries_per_insert'] = float(cost['indexed_rows']) / cost['rows'] if cost['rows'] else None
+    elif estimate and isinstance(index.where, Q):
+        cost['entries_per_insert'] = estimate_fraction(rows, index.where, sample_size=sample_size)
+    return cost
+
+
+def describe_write_cost(cost):
+    """Returns a short description of a write cost estimate returned by write_cost()."""
+    if cost['entries_per_insert'] is None:
+        inserts = 'inserts matching its condition'
+    else:
+        inserts = '%d%% of inserts' % round(cost['entries_per_insert'] * 100)
+    return 'Maintained on %s, and on updates of %s.' % (inserts, ', '.join(cost['fields']))
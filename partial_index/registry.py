@@ -0,0 +1,68 @@
+"""Reverse lookup of the PartialIndexes that reference each model field.
+
+A field is referenced by a PartialIndex if it is one of the indexed fields, or is mentioned in its Q-object based
+where condition. Text-based where conditions are not parsed, so only their indexed fields are registered.
+
+The registry is built once for all installed models, the first time it is used after the app registry is ready.
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+from .index import PartialIndex
+from . import query
+
+
+_registry = None
+
+
+def index_mentioned_fields(idx, model):
+    """Returns the sorted names of the fields in idx.fields and in its where condition."""
+    field_names = set(field_name.lstrip('-') for field_name in idx.fields)
+    if isinstance(idx.where, Q):
+        field_names.update(query.q_mentioned_fields(idx.where, model))
+    return sorted(field_names)
+
+
+def build_registry():
+    """Returns a dict mapping (model label, field name) to a tuple of the PartialIndexes referencing the field."""
+    apps.check_models_ready()
+    registry = defaultdict(list)
+    for model in apps.get_models():
+        for idx in model._meta.indexes:
+            if isinstance(idx, PartialIndex):
+                for field_name in index_mentioned_fields(idx, model):
+                    registry[(model._meta.label_lower, field_name)].append(idx)
+    return {key: tuple(indexes) for key, indexes in registry.items()}
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = build_registry()
+    return _registry
+
+
+def reset_registry():
+    """Discards the registry, so that it is built again on next use. Only needed if models are added at runtime."""
+    global _registry
+    _registry = None
+
+
+def indexes_for_field(model, field_name):
+    """Returns a tuple of the PartialIndexes referencing a field.
+
+    model is a model class or an 'app_label.model_name' label. With a model class, field_name may also be the
+    attname of a field, such as 'user_id' for a ForeignKey named 'user'.
+    """
+    if isinstance(model, str):
+        label = model.lower()
+    else:
+        label = model._meta.label_lower
+        try:
+            field_name = model._meta.get_field(field_name).name
+        except FieldDoesNotExist:
+            pass
+    return get_registry().get((label, field_name), ())
@@ -0,0 +1,100 @@
+"""Partial indexes over a rolling time window, such as the rows created in the last three months.
+
+    class Event(models.Model):
+        user = models.ForeignKey(User, on_delete=models.CASCADE)
+        created_at = models.DateTimeField()
+
+        recent = RollingPartialIndex(fields=['user'], field='created_at', granularity='month', window=3)
+
+    Event.recent.filter().filter(user=user)  # Uses the index of the current window.
+
+Each window has its own index, with the condition "created_at >= start of the window". The window starts at the
+beginning of the current period (day, week or month), minus window - 1 periods. The partial_index_reconcile command
+creates the index of the current window and of the next one, so that filter() can switch to it as soon as the next
+period starts, and drops the indexes of earlier windows. It should run at least once per period.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .managed import ManagedIndexSet
+from .query import PQ
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def period_start(day, granularity):
+    """Returns the first day of the period containing day."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def add_periods(day, granularity, periods):
+    """Adds periods to the first day of a period."""
+    if granularity == 'day':
+        return day + datetime.timedelta(days=periods)
+    if granularity == 'week':
+        return day + datetime.timedelta(weeks=periods)
+    months = day.year * 12 + day.month - 1 + periods
+    return day.replace(year=months // 12, month=months % 12 + 1)
+
+
+class RollingPartialIndex(ManagedIndexSet):
+    suffix = 'rolling'
+
+    def __init__(self, fields, field, granularity='month', window=1, unique=False, where=None):
+        if granularity not in GRANULARITIES:
+            raise ValueError('Granularity must be one of %s.' % ', '.join(GRANULARITIES))
+        if window < 1:
+            raise ValueError('window must be at least 1.')
+        super(RollingPartialIndex, self).__init__(fields, unique=unique, where=where)
+        self.field = field
+        self.granularity = granularity
+        self.window = window
+
+    def is_utc(self):
+        """Returns True if windows start at midnight UTC, rather than at midnight in the current time zone."""
+        return settings.USE_TZ and isinstance(self.model._meta.get_field(self.field), models.DateTimeField)
+
+    def today(self, now=None):
+        """Returns the current date (or the date of now) in the time zone of the window boundaries."""
+        if now is None:
+            now = timezone.now()
+        if self.is_utc():
+            return now.astimezone(datetime.timezone.utc).date()
+        return timezone.localdate(now) if settings.USE_TZ else now.date()
+
+    def window_start(self, today=None):
+        """Returns the first day of the window that is current on the given day, by default today()."""
+        if today is None:
+            today = self.today()
+        return add_periods(period_start(today, self.granularity), self.granularity, 1 - self.window)
+
+    def boundary(self, day):
+        """Returns the value the field is compared with for a window starting on day."""
+        if isinstance(self.model._meta.get_field(self.field), models.DateTimeField):
+            # A fixed time zone keeps the condition, and so the generated index name, independent of settings.
+            tzinfo = datetime.timezone.utc if self.is_utc() else None
+            return datetime.datetime(day.year, day.month, day.day, tzinfo=tzinfo)
+        return day
+
+    def condition(self, day):
+        return PQ(**{self.field + '__gte': self.boundary(day)})
+
+    def get_conditions(self, today=None):
+        """Returns the conditions of the current and the next window."""
+        current = self.window_start(today)
+        return [self.condition(current), self.condition(add_periods(current, self.granularity, 1))]
+
+    def filter(self, queryset=None, today=None):
+        """Filters queryset (default: all objects) to the rows of the current window, matching its index exactly."""
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        condition = self.condition(self.window_start(today))
+        return queryset.filter(condition & self.where if self.where is not None else condition)
@@ -0,0 +1,60 @@
+"""Partial unique validation for Django Rest Framework list serializers.
+
+This module requires djangorestframework to be installed.
+"""
+import copy
+
+from django.core.exceptions import NON_FIELD_ERRORS
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .batch import validate_partial_unique_batch
+
+
+class PartialUniqueListSerializer(serializers.ListSerializer):
+    """ListSerializer that validates the unique PartialIndexes of all items in one go.
+
+    Use it as the list_serializer_class of a ModelSerializer for a model with unique PartialIndexes:
+
+    class BookingSerializer(serializers.ModelSerializer):
+        class Meta:
+            model = RoomBooking
+            fields = ('user', 'room')
+            list_serializer_class = PartialUniqueListSerializer
+
+    With many=True, conflicts with existing rows are looked up with one query per index for every
+    partial_unique_chunk_size items. Items that conflict with each other are also reported.
+    Errors are returned in the usual list format, with one dict of errors for each item.
+    """
+    partial_unique_chunk_size = 200
+
+    def to_internal_value(self, data):
+        validated_data = super(PartialUniqueListSerializer, self).to_internal_value(data)
+        instances = self.get_partial_unique_instances(validated_data)
+        item_errors = validate_partial_unique_batch(instances, chunk_size=self.partial_unique_chunk_size)
+        if any(item_errors):
+            raise serializers.ValidationError([self.as_item_errors(errors) for errors in item_errors])
+        return validated_data
+
+    def get_partial_unique_instances(self, validated_data):
+        """Returns unsaved model instances with the validated values of each item.
+
+        When updating, self.instance is expected to be a list of instances in the same order as the items.
+        """
+        model = self.child.Meta.model
+        field_names = set(f.name for f in model._meta.concrete_fields)
+        existing = list(self.instance) if self.instance is not None else []
+        instances = []
+        for i, attrs in enumerate(validated_data):
+            instance = copy.copy(existing[i]) if i < len(existing) else model()
+            for attr, value in attrs.items():
+                if attr in field_names:
+                    setattr(instance, attr, value)
+            instances.append(instance)
+        return instances
+
+    def as_item_errors(self, errors):
+        return {
+            (api_settings.NON_FIELD_ERRORS_KEY if key == NON_FIELD_ERRORS else key): [error.message % error.params for error in key_errors]
+            for key, key_errors in errors.items()
+        }
@@ -0,0 +1,13 @@
+"""Signals sent by django-partial-index."""
+from django.dispatch import Signal
+
+
+# Sent by ValidatePartialUniqueMixin.validate_partial_unique() after each unique PartialIndex has been checked.
+#
+# sender: the model class being validated.
+# instance: the model instance being validated.
+# index: the PartialIndex that was checked.
+# skipped: True if no conflict query was run, because an index field was excluded from validation or is NULL.
+# duration: time in seconds spent on the check, or None if it was skipped.
+# conflict: True if a conflicting row was found.
+partial_unique_checked = Signal()
@@ -0,0 +1,166 @@
+"""Finding sparse indexed columns, whose full indexes could be replaced by partial indexes on their non-null values.
+
+Btree indexes store an entry for every row, including rows where the indexed column is NULL. When most rows are
+NULL and queries only look up non-null values, PartialIndex(fields=[column], where=PQ(column__isnull=False)) serves
+the same lookups from a fraction of the space, and is not maintained on inserts of NULL values.
+
+Only single-column indexes covering all rows of nullable fields are considered: fields with db_index=True (including
+ForeignKeys), index_together and Meta.indexes entries. Unique fields are left alone, as their constraint is part of the
+model. On PostgreSQL, the fraction of NULL values and the number of distinct values are read from pg_stats, so tables
+must have been analyzed, and savings are estimated from the size of the existing index. On SQLite, the first rows by
+primary key are scanned, and savings are estimated from the number of NULL values.
+"""
+from django.db import connections, router
+from django.db.migrations import operations
+from django.db.migrations.writer import OperationWriter
+
+from .index import PartialIndex
+from .query import PQ, Vendor
+from . import redundancy
+
+
+# Estimated size of an index entry for a NULL value on SQLite, including the row id and page overhead.
+NULL_ENTRY_BYTES = 16
+DEFAULT_SAMPLE_SIZE = 100000
+
+
+class ColumnStats(object):
+    """Statistics of one column. index_bytes is the size of its index, if known."""
+
+    def __init__(self, rows, null_frac, n_distinct, index_bytes=None):
+        self.rows = rows
+        self.null_frac = null_frac
+        self.n_distinct = n_distinct
+        self.index_bytes = index_bytes
+
+    @property
+    def saved_bytes(self):
+        """Estimates the space saved by not indexing the NULL values."""
+        if self.index_bytes is not None:
+            return int(self.index_bytes * self.null_frac)
+        return int(self.rows * self.null_frac * NULL_ENTRY_BYTES)
+
+
+class SparseColumn(object):
+    """A nullable field with a full single-column index, which could be a partial index on its non-null values."""
+
+    def __init__(self, model, field, index, stats):
+        self.model = model
+        self.field = field
+        self.index = index
+        self.stats = stats
+
+    def __repr__(self):
+        return '<%s: %s.%s>' % (self.__class__.__name__, self.model._meta.label, self.field.name)
+
+    def partial_index(self):
+        index = PartialIndex(fields=[self.field.name], unique=False, where=PQ(**{self.field.name + '__isnull': False}))
+        index.set_name_with_model(self.model)
+        return index
+
+    def declaration(self):
+        """Returns the PartialIndex declaration, ready for Meta.indexes."""
+        return 'PartialIndex(fields=[%r], unique=False, where=PQ(%s__isnull=False)),' % (self.field.name, self.field.name)
+
+    def operations(self):
+        """Returns the migration operations that replace the index with a partial index."""
+        opts = self.model._meta
+        if self.index.declared is not None:
+            remove = operations.RemoveIndex(opts.model_name, self.index.declared.name)
+        elif self.index.name == redundancy.field_index_name(self.field):
+            name, path, args, kwargs = self.field.deconstruct()
+            kwargs['db_index'] = False
+            remove = operations.AlterField(opts.model_name, self.field.name, self.field.__class__(*args, **kwargs))
+        else:
+            index_together = set(tuple(fields) for fields in opts.index_together if list(fields) != [self.field.name])
+            remove = operations.AlterIndexTogether(opts.model_name, index_together)
+        return [remove, operations.AddIndex(opts.model_name, self.partial_index())]
+
+    def serialized_operations(self):
+        """Returns the operations as they would be written in a migration file, and the imports they need."""
+        lines, imports = [], set()
+        for operation in self.operations():
+            string, operation_imports = OperationWriter(operation, indentation=0).serialize()
+            lines.append(string)
+            imports.update(operation_imports)
+        return '\n'.join(lines), sorted(imports)
+
+
+def indexed_sparse_candidates(model):
+    """Yields (field, TableIndex) for the full single-column indexes of nullable fields of model."""
+    opts = model._meta
+    if opts.abstract or opts.proxy or not opts.managed:
+        return
+    for index in redundancy.model_indexes(model):
+        if index.unique or index.where is not None or len(index.fields_orders) != 1:
+            continue
+        field = opts.get_field(index.fields_orders[0][0])
+        if field.null and field.concrete:
+            yield field, index
+
+
+def _index_db_name(connection, model, field, index):
+    """Returns the database name of the TableIndex index on field, as Django created it."""
+    if index.declared is not None:
+        return index.declared.name
+    # Django names field indexes (db_index=True and ForeignKeys) without a suffix, and index_together indexes with "_idx".
+    suffix = '' if index.name == redundancy.field_index_name(field) else '_idx'
+    return connection.schema_editor()._create_index_name(model._meta.db_table, [field.column], suffix=suffix)
+
+
+def _index_bytes(connection, name):
+    """Returns the size of the named index, or None if it does not exist."""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_relation_size(to_regclass(%s))', [connection.ops.quote_name(name)])
+        return cursor.fetchone()[0]
+
+
+def column_stats(model, field, using=None, sample_size=DEFAULT_SAMPLE_SIZE, index=None):
+    """Returns the ColumnStats of field, or None if the table is empty or has not been analyzed.
+
+    On PostgreSQL, the size of index, the TableIndex of field, is read as well.
+    """
+    using = using or router.db_for_read(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    quote_name = connection.ops.quote_name
+    if connection.vendor == Vendor.POSTGRESQL:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT s.null_frac, s.n_distinct, c.reltuples FROM pg_stats s JOIN pg_class c ON c.oid = to_regclass(%s) '
+                'WHERE s.schemaname = current_schema() AND s.tablename = %s AND s.attname = %s',
+                [quote_name(table), table, field.column],
+            )
+            row = cursor.fetchone()
+        if row is None or row[2] <= 0:
+            return None
+        null_frac, n_distinct, rows = row
+        # Negative values are a fraction of the number of rows, for columns whose distinct values grow with the table.
+        n_distinct = -n_distinct * rows if n_distinct < 0 else n_distinct
+        index_bytes = _index_bytes(connection, _index_db_name(connection, model, field, index)) if index else None
+        return ColumnStats(int(rows), null_frac, int(n_distinct), index_bytes)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM %s' % quote_name(table))
+        rows = cursor.fetchone()[0]
+        cursor.execute(
+            'SELECT COUNT(*), SUM(CASE WHEN %(column)s IS NULL THEN 1 ELSE 0 END), COUNT(DISTINCT %(column)s) '
+            'FROM (SELECT %(column)s FROM %(table)s ORDER BY %(pk)s LIMIT %%s)' % {
+                'column': quote_name(field.column), 'table': quote_name(table), 'pk': quote_name(model._meta.pk.column)},
+            [sample_size],
+        )
+        sampled, nulls, n_distinct = cursor.fetchone()
+    if not sampled:
+        return None
+    return ColumnStats(rows, float(nulls) / sampled, n_distinct)
+
+
+def find_sparse_columns(model, using=None, min_null_frac=0.9, sample_size=DEFAULT_SAMPLE_SIZE):
+    """Returns SparseColumns for the indexed fields of model with at least min_null_frac NULL values,
+    ordered by the estimated space saved."""
+    found = []
+    for field, index in indexed_sparse_candidates(model):
+        stats = column_stats(model, field, using=using, sample_size=sample_size, index=index)
+        if stats is not None and stats.null_frac >= min_null_frac:
+            found.append(SparseColumn(model, field, index, stats))
+    return sorted(found, key=lambda sparse: -sparse.stats.saved_bytes)
@@ -0,0 +1,42 @@
+"""Partial indexes for a list of values of one field, such as one index per large tenant.
+
+    class Document(models.Model):
+        tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+        created_at = models.DateTimeField()
+
+        large_tenants = TenantPartialIndexes(fields=['created_at'], field='tenant', values=lambda: settings.LARGE_TENANTS)
+
+    Document.large_tenants.filter(42).order_by('-created_at')  # Uses the index of tenant 42, if it has one.
+
+Each value gets its own index, with the condition "tenant = value". values is a list, or a callable returning one,
+so that the list can change without a migration. The partial_index_reconcile command creates the indexes of new
+values and drops those of removed values.
+"""
+from .managed import ManagedIndexSet
+from .query import PQ
+
+
+class TenantPartialIndexes(ManagedIndexSet):
+    suffix = 'tenant'
+
+    def __init__(self, fields, field, values, unique=False, where=None):
+        super(TenantPartialIndexes, self).__init__(fields, unique=unique, where=where)
+        self.field = field
+        self.values = values
+
+    def get_values(self):
+        values = self.values() if callable(self.values) else self.values
+        return sorted(set(getattr(value, 'pk', value) for value in values))
+
+    def condition(self, value):
+        return PQ(**{self.field: getattr(value, 'pk', value)})
+
+    def get_conditions(self):
+        return [self.condition(value) for value in self.get_values()]
+
+    def filter(self, value, queryset=None):
+        """Filters queryset (default: all objects) to the rows of one value, matching the condition of its index."""
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        condition = self.condition(value)
+        return queryset.filter(condition & self.where if self.where is not None else condition)
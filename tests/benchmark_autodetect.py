@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Times migration autodetection for a synthetic project with many PartialIndexes.
+
+Compares the cached PartialIndex comparison against uncached deconstruction, as used before.
+"""
+from __future__ import print_function
+
+import argparse
+from os.path import abspath, dirname
+import sys
+import time
+
+REPO_DIR = dirname(dirname(abspath(__file__)))
+sys.path.append(REPO_DIR)
+
+
+def build_state(models, indexes_per_model):
+    from django.db import models as db_models
+    from django.db.migrations.state import ModelState, ProjectState
+    from partial_index import PartialIndex, PQ, PF
+
+    state = ProjectState()
+    for m in range(models):
+        fields = [('id', db_models.AutoField(primary_key=True))]
+        fields += [('f%d' % f, db_models.IntegerField(null=True)) for f in range(indexes_per_model + 1)]
+        indexes = [
+            PartialIndex(fields=['f%d' % i, 'f%d' % (i + 1)], unique=bool(i % 2),
+                         where=PQ(f0__isnull=True) & (PQ(f1=PF('f2')) | PQ(f3__gt=i)), name='bench_%d_%d_partial' % (m, i))
+            for i in range(indexes_per_model)
+        ]
+        state.add_model(ModelState('bench', 'model%d' % m, fields, options={'indexes': indexes}))
+    return state
+
+
+def autodetect(from_state, to_state):
+    from django.db.migrations.autodetector import MigrationAutodetector
+    started = time.perf_counter()
+    changes = MigrationAutodetector(from_state, to_state)._detect_changes()
+    assert not changes, changes
+    return time.perf_counter() - started
+
+
+def main(args):
+    import django
+    from django.conf import settings
+    settings.configure(INSTALLED_APPS=[])
+    django.setup()
+
+    from partial_index import PartialIndex
+
+    models = args.indexes // args.indexes_per_model
+    cached = autodetect(build_state(models, args.indexes_per_model), build_state(models, args.indexes_per_model))
+
+    # Same comparison without the fingerprint and deconstruction caches, and with full deep copies.
+    eq, deconstruct, deepcopy = PartialIndex.__eq__, PartialIndex.deconstruct, PartialIndex.__deepcopy__
+    PartialIndex.__eq__ = lambda self, other: self.__class__ == other.__class__ and self._deconstruct() == other._deconstruct()
+    PartialIndex.deconstruct = PartialIndex._deconstruct
+    del PartialIndex.__deepcopy__
+    try:
+        uncached = autodetect(build_state(models, args.indexes_per_model), build_state(models, args.indexes_per_model))
+    finally:
+        PartialIndex.__eq__, PartialIndex.deconstruct, PartialIndex.__deepcopy__ = eq, deconstruct, deepcopy
+
+    print('%d indexes on %d models' % (models * args.indexes_per_model, models))
+    print('uncached: %.3fs' % uncached)
+    print('cached:   %.3fs' % cached)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks migration autodetection.')
+    parser.add_argument('--indexes', type=int, default=2000)
+    parser.add_argument('--indexes-per-model', type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,123 @@
+"""
+Tests for recommending PartialIndexes from query logs.
+"""
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from io import StringIO
+
+from partial_index import advisor
+from partial_index.advisor import PARAMETER, QueryStat
+from testapp.models import JobQ, Label, NullableRoomNumberQ
+
+
+DJANGO_LOG = '''\
+(0.004) SELECT "testapp_nullableroomnumberq"."id" FROM "testapp_nullableroomnumberq" WHERE ("testapp_nullableroomnumberq"."deleted_at" IS NULL AND "testapp_nullableroomnumberq"."room_number" = 1); args=(1,)
+(0.006) SELECT "testapp_nullableroomnumberq"."id" FROM "testapp_nullableroomnumberq" WHERE ("testapp_nullableroomnumberq"."deleted_at" IS NULL AND "testapp_nullableroomnumberq"."room_number" = 2); args=(2,)
+Not a query
+(0.001) SELECT "testapp_label"."id" FROM "testapp_label" WHERE ("testapp_label"."label" = 'open' AND "testapp_label"."deleted_at" > '2020-01-01'); args=('open', '2020-01-01')
+(0.002) SELECT "testapp_label"."id" FROM "testapp_label" WHERE ("testapp_label"."label" = 'open' AND "testapp_label"."deleted_at" > '2020-02-01'); args=('open', '2020-02-01')
+'''
+
+PG_STAT_STATEMENTS = '''\
+query,calls,total_exec_time
+"SELECT ""testapp_jobq"".""id"" FROM ""testapp_jobq"" WHERE NOT ""testapp_jobq"".""is_complete"" ORDER BY ""testapp_jobq"".""order"" DESC",10,5.5
+"SELECT ""testapp_jobq"".""id"" FROM ""testapp_jobq"" WHERE ""testapp_jobq"".""is_complete"" = false ORDER BY ""testapp_jobq"".""order"" DESC",10,5.5
+"SELECT ""testapp_roombookingq"".""id"" FROM ""testapp_roombookingq"" WHERE ""testapp_roombookingq"".""user_id"" = $1 AND ""testapp_roombookingq"".""deleted_at"" IS NULL",100,80.0
+"SELECT ""testapp_nullableroomnumberq"".""id"" FROM ""testapp_nullableroomnumberq"" WHERE ""testapp_nullableroomnumberq"".""room_number"" IN ($1, $2) AND ""testapp_nullableroomnumberq"".""deleted_at"" IS NOT NULL",20,120.0
+'''
+
+
+class ParseTest(SimpleTestCase):
+    def test_conditions(self):
+        sql = ('SELECT "t"."id" FROM "testapp_roombookingq" "t" INNER JOIN "testapp_user" ON ("t"."user_id" = "testapp_user"."id") '
+               'WHERE ("t"."deleted_at" IS NOT NULL AND "t"."room_id" = 5 AND "testapp_user"."name" = \'O\'\'Brien AND\' '
+               'AND ("t"."id" = 1 OR "t"."id" = 2) AND "t"."user_id" IN (%s, %s)) ORDER BY "t"."id" DESC LIMIT 21')
+        self.assertEqual(advisor.parse_conditions(sql), [
+            ('testapp_roombookingq', 'deleted_at', 'isnull', False),
+            ('testapp_roombookingq', 'room_id', '=', 5),
+            ('testapp_user', 'name', '=', "O'Brien AND"),
+            ('testapp_roombookingq', 'user_id', 'IN', PARAMETER),
+        ])
+        self.assertEqual(advisor.parse_order_by(sql), [('testapp_roombookingq', 'id', True)])
+
+    def test_update(self):
+        sql = 'UPDATE "testapp_jobq" SET "is_complete" = true WHERE "group" = $1 AND is_complete = false'
+        self.assertEqual(advisor.parse_conditions(sql), [
+            ('testapp_jobq', 'group', '=', PARAMETER),
+            ('testapp_jobq', 'is_complete', '=', False),
+        ])
+
+    def test_no_where(self):
+        self.assertEqual(advisor.parse_conditions('SELECT 1'), [])
+        self.assertEqual(advisor.parse_conditions('SELECT "id" FROM "testapp_jobq" ORDER BY "id"'), [])
+
+    def test_read_django_log(self):
+        stats = list(advisor.read_log(DJANGO_LOG.splitlines()))
+        self.assertEqual(len(stats), 4)
+        self.assertEqual(stats[0].calls, 1)
+        self.assertAlmostEqual(stats[0].total_time, 4.0)
+        self.assertTrue(stats[0].sql.startswith('SELECT "testapp_nullableroomnumberq"."id" FROM'))
+        self.assertTrue(stats[0].sql.endswith('"room_number" = 1)'))
+
+    def test_read_pg_stat_statements(self):
+        stats = list(advisor.read_log(PG_STAT_STATEMENTS.splitlines()))
+        self.assertEqual(len(stats), 4)
+        self.assertEqual((stats[2].calls, stats[2].total_time), (100, 80.0))
+        self.assertIn('"testapp_roombookingq"."user_id" = $1', stats[2].sql)
+
+
+class RecommendTest(SimpleTestCase):
+    def recommend(self, log):
+        return [(r.model, r.declaration(), r.calls, r.total_time) for r in advisor.recommend(advisor.read_log(log.splitlines()))]
+
+    def test_django_log(self):
+        self.assertEqual(self.recommend(DJANGO_LOG), [
+            (NullableRoomNumberQ, "PartialIndex(fields=['room_number'], unique=False, where=PQ(deleted_at__isnull=True)),", 2, 10.0),
+            (Label, "PartialIndex(fields=['deleted_at'], unique=False, where=PQ(label='open')),", 2, 3.0),
+        ])
+
+    def test_pg_stat_statements(self):
+        # The query by user_id is covered by the existing index on user and room, and the one on is_complete = false
+        # by the index on -order. NOT is_complete is not a comparison, so that query has no constant.
+        self.assertEqual(self.recommend(PG_STAT_STATEMENTS), [
+            (NullableRoomNumberQ, "PartialIndex(fields=['room_number'], unique=False, where=PQ(deleted_at__isnull=False)),", 20, 120.0),
+        ])
+
+    def test_varying_constant(self):
+        stats = [
+            QueryStat('SELECT "id" FROM "testapp_roombookingq" WHERE "deleted_at" IS NULL AND "room_id" = 1'),
+            QueryStat('SELECT "id" FROM "testapp_roombookingq" WHERE "deleted_at" IS NOT NULL AND "room_id" = 1'),
+        ]
+        self.assertEqual(advisor.recommend(stats), [])
+
+    def test_single_literal(self):
+        # A literal seen only once cannot be told apart from a parameter, unless it is a boolean.
+        stats = [QueryStat('SELECT "id" FROM "testapp_jobq" WHERE "group" = 1 AND "order" = 2')]
+        self.assertEqual(advisor.recommend(stats), [])
+        stats = [QueryStat('SELECT "id" FROM "testapp_jobq" WHERE "group" = 1 AND "is_complete" = true')]
+        self.assertEqual([r.declaration() for r in advisor.recommend(stats)],
+                         ["PartialIndex(fields=['group'], unique=False, where=PQ(is_complete=True)),"])
+
+    def test_unknown_table(self):
+        stats = [QueryStat('SELECT "id" FROM "other" WHERE "deleted_at" IS NULL AND "a" = $1')]
+        self.assertEqual(advisor.recommend(stats), [])
+        self.assertEqual(advisor.recommend(stats[:1], models=[JobQ]), [])
+
+
+class AdviseCommandTest(SimpleTestCase):
+    def test_command(self):
+        fd, path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write(DJANGO_LOG)
+        try:
+            out = StringIO()
+            call_command('partial_index_advise', path, '--limit', '1', stdout=out)
+        finally:
+            os.remove(path)
+        self.assertEqual(out.getvalue(), (
+            '# testapp.NullableRoomNumberQ: 2 calls, 10.0 ms total\n'
+            "PartialIndex(fields=['room_number'], unique=False, where=PQ(deleted_at__isnull=True)),\n"
+        ))
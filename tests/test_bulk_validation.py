@@ -0,0 +1,93 @@
+"""
+Tests for validating unique PartialIndexes of many items at once.
+"""
+import datetime
+import uuid
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from partial_index.batch import validate_partial_unique_batch
+from testapp.serializers import RoomBookingBulkSerializer, LabelBulkSerializer
+from testapp.models import User, Room, RoomBookingQ, Label, Ticket
+
+
+class BulkSerializerTest(TransactionTestCase):
+    """Test that PartialUniqueListSerializer validates all items at once."""
+    conflict_error = 'Room booking q with this Room and User already exists.'
+
+    def setUp(self):
+        self.user1 = User.objects.create(name='User1')
+        self.user2 = User.objects.create(name='User2')
+        self.room1 = Room.objects.create(name='Room1')
+        self.room2 = Room.objects.create(name='Room2')
+        self.booking1 = RoomBookingQ.objects.create(user=self.user1, room=self.room1)
+
+    def test_valid(self):
+        ser = RoomBookingBulkSerializer(many=True, data=[
+            {'user': self.user1.id, 'room': self.room2.id},
+            {'user': self.user2.id, 'room': self.room1.id},
+        ])
+        self.assertTrue(ser.is_valid(), 'Serializer errors: %s' % ser.errors)
+
+    def test_conflict_with_existing(self):
+        ser = RoomBookingBulkSerializer(many=True, data=[
+            {'user': self.user1.id, 'room': self.room2.id},
+            {'user': self.user1.id, 'room': self.room1.id},
+        ])
+        self.assertFalse(ser.is_valid())
+        self.assertEqual(ser.errors, [{}, {'non_field_errors': [self.conflict_error]}])
+
+    def test_conflict_with_existing_deleted_valid(self):
+        self.booking1.deleted_at = timezone.now()
+        self.booking1.save()
+        ser = RoomBookingBulkSerializer(many=True, data=[{'user': self.user1.id, 'room': self.room1.id}])
+        self.assertTrue(ser.is_valid(), 'Serializer errors: %s' % ser.errors)
+
+    def test_conflict_within_payload(self):
+        ser = RoomBookingBulkSerializer(many=True, data=[
+            {'user': self.user2.id, 'room': self.room2.id},
+            {'user': self.user1.id, 'room': self.room2.id},
+            {'user': self.user2.id, 'room': self.room2.id},
+        ])
+        self.assertFalse(ser.is_valid())
+        self.assertEqual(ser.errors, [{}, {}, {'non_field_errors': [self.conflict_error]}])
+
+    def test_duplicates_within_payload_deleted_valid(self):
+        deleted_at = timezone.now().isoformat()
+        ser = RoomBookingBulkSerializer(many=True, data=[
+            {'user': self.user2.id, 'room': self.room2.id, 'deleted_at': deleted_at},
+            {'user': self.user2.id, 'room': self.room2.id, 'deleted_at': deleted_at},
+            {'user': self.user2.id, 'room': self.room2.id},
+        ])
+        self.assertTrue(ser.is_valid(), 'Serializer errors: %s' % ser.errors)
+
+    def test_single_field_error_key(self):
+        label_uuid = uuid.uuid4()
+        Label.objects.create(label='a', uuid=label_uuid, created_at=timezone.now())
+        ser = LabelBulkSerializer(many=True, data=[
+            {'room': self.room2.id, 'user': self.user2.id, 'label': 'b', 'uuid': str(label_uuid), 'created_at': (timezone.now() + datetime.timedelta(days=1)).isoformat()},
+        ])
+        self.assertFalse(ser.is_valid())
+        self.assertEqual(list(ser.errors[0].keys()), ['uuid'])
+
+    def test_one_query_per_index(self):
+        instances = [RoomBookingQ(user=self.user2, room=self.room1), RoomBookingQ(user=self.user1, room=self.room1)]
+        with self.assertNumQueries(1):
+            errors = validate_partial_unique_batch(instances)
+        self.assertEqual(errors[0], {})
+        self.assertEqual([e.message % e.params for e in errors[1]['__all__']], [self.conflict_error])
+
+
+class BatchWhereFieldsTest(TransactionTestCase):
+    """Test that items conflict on the index fields alone, whichever values of the where fields cover them."""
+
+    def test_within_payload(self):
+        tickets = [Ticket(code='a', status=1), Ticket(code='a', status=2), Ticket(code='a', status=3)]
+        errors = validate_partial_unique_batch(tickets)
+        self.assertEqual([list(item_errors) for item_errors in errors], [[], ['code'], []])
+
+    def test_with_existing(self):
+        Ticket.objects.create(code='a', status=1)
+        errors = validate_partial_unique_batch([Ticket(code='a', status=2), Ticket(code='a', status=3)])
+        self.assertEqual([list(item_errors) for item_errors in errors], [['code'], []])
@@ -0,0 +1,66 @@
+"""
+Tests for request-scoped caching of partial unique conflict lookups.
+"""
+from django.test import TransactionTestCase
+
+from partial_index import PartialUniqueValidationError
+from partial_index.cache import partial_unique_cache, PartialUniqueCacheMiddleware
+from testapp.models import User, Room, RoomBookingQ
+
+
+class PartialUniqueCacheTest(TransactionTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(name='User1')
+        self.room1 = Room.objects.create(name='Room1')
+        self.room2 = Room.objects.create(name='Room2')
+
+    def test_no_cache_by_default(self):
+        booking = RoomBookingQ(user=self.user1, room=self.room1)
+        with self.assertNumQueries(2):
+            booking.validate_partial_unique()
+            booking.validate_partial_unique()
+
+    def test_repeated_validation_cached(self):
+        booking = RoomBookingQ(user=self.user1, room=self.room1)
+        with partial_unique_cache():
+            with self.assertNumQueries(1):
+                booking.validate_partial_unique()
+                booking.validate_partial_unique()
+                RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+
+    def test_different_values_not_cached(self):
+        with partial_unique_cache():
+            with self.assertNumQueries(2):
+                RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+                RoomBookingQ(user=self.user1, room=self.room2).validate_partial_unique()
+
+    def test_save_invalidates(self):
+        with partial_unique_cache():
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+            RoomBookingQ.objects.create(user=self.user1, room=self.room1)
+            with self.assertRaises(PartialUniqueValidationError):
+                RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+
+    def test_delete_invalidates(self):
+        booking = RoomBookingQ.objects.create(user=self.user1, room=self.room1)
+        with partial_unique_cache():
+            with self.assertRaises(PartialUniqueValidationError):
+                RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+            booking.delete()
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+
+    def test_cache_cleared_on_exit(self):
+        with partial_unique_cache():
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+        with partial_unique_cache():
+            with self.assertNumQueries(1):
+                RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+
+    def test_middleware(self):
+        def view(request):
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+            return 'response'
+
+        with self.assertNumQueries(1):
+            self.assertEqual(PartialUniqueCacheMiddleware(view)(None), 'response')
@@ -0,0 +1,168 @@
+"""
+Tests for finding rows that would violate a unique PartialIndex.
+"""
+from io import StringIO
+import json
+import os
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.test import TransactionTestCase
+
+from partial_index import PQ
+from partial_index.duplicates import duplicate_groups, duplicate_group_pks, resolve_duplicates
+from testapp.models import ABC, NullableRoomNumberQ, User, Room, RoomBookingQ
+
+
+class DuplicateGroupsTest(TransactionTestCase):
+    def setUp(self):
+        for a, b, c in [('1', '1', 'x'), ('1', '1', 'x'), ('1', '1', 'y'),
+                        ('1', '2', 'x'), ('1', '2', 'x'), ('1', '2', 'x'),
+                        ('2', '1', 'x'), ('2', '1', 'y'),
+                        ('3', '1', 'x'), ('3', '1', 'x')]:
+            ABC.objects.create(a=a, b=b, c=c)
+
+    def groups(self, **kwargs):
+        return [chunk for chunk in duplicate_groups(ABC, ['a', 'b'], PQ(c='x'), **kwargs)]
+
+    def test_single_chunk(self):
+        self.assertEqual(self.groups(), [[
+            {'a': '1', 'b': '1', 'duplicate_count': 2},
+            {'a': '1', 'b': '2', 'duplicate_count': 3},
+            {'a': '3', 'b': '1', 'duplicate_count': 2},
+        ]])
+
+    def test_chunks(self):
+        chunks = self.groups(chunk_size=2)
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+
+    def test_resume_after(self):
+        chunks = self.groups(after=['1', '1'])
+        self.assertEqual([(g['a'], g['b']) for g in chunks[0]], [('1', '2'), ('3', '1')])
+
+    def test_pks(self):
+        chunk = self.groups()[0]
+        pks = duplicate_group_pks(ABC, ['a', 'b'], PQ(c='x'), chunk)
+        self.assertEqual([len(group_pks) for group_pks in pks], [2, 3, 2])
+        self.assertEqual(set(ABC.objects.filter(pk__in=pks[0]).values_list('c', flat=True)), {'x'})
+
+
+class DuplicatesCommandTest(TransactionTestCase):
+    def setUp(self):
+        ABC.objects.create(a='1', b='1', c='x')
+        ABC.objects.create(a='1', b='1', c='x')
+        ABC.objects.create(a='2', b='1', c='x')
+        ABC.objects.create(a='2', b='1', c='x')
+
+    def call(self, *args, **kwargs):
+        out = StringIO()
+        call_command('partial_index_duplicates', *args, stdout=out, stderr=StringIO(), **kwargs)
+        return out.getvalue()
+
+    def test_csv(self):
+        out = self.call('testapp.ABC', fields='a,b', where='{"c": "x"}')
+        self.assertEqual(out.splitlines(), ['a,b,duplicate_count', '1,1,2', '2,1,2'])
+
+    def test_json_with_pks(self):
+        out = self.call('testapp.ABC', fields='a,b', where='{"c": "x"}', format='json', with_pks=True)
+        groups = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual([g['duplicate_count'] for g in groups], [2, 2])
+        self.assertEqual([len(g['pks']) for g in groups], [2, 2])
+
+    def test_checkpoint_resume(self):
+        directory = tempfile.mkdtemp()
+        checkpoint = os.path.join(directory, 'checkpoint.json')
+        output = os.path.join(directory, 'out.csv')
+        with open(checkpoint, 'w') as f:
+            json.dump({'after': ['1', '1']}, f)
+        self.call('testapp.ABC', fields='a,b', where='{"c": "x"}', checkpoint=checkpoint, output=output)
+        with open(output) as f:
+            self.assertEqual(f.read().splitlines(), ['2,1,2'])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_declared_index_no_duplicates(self):
+        RoomBookingQ.objects.create(user=User.objects.create(name='User1'), room=Room.objects.create(name='Room1'))
+        out = self.call('testapp.RoomBookingQ', index=RoomBookingQ._meta.indexes[0].name)
+        self.assertEqual(out.splitlines(), ['user,room,duplicate_count'])
+
+    def test_unknown_index(self):
+        with self.assertRaisesRegexp(CommandError, 'not found'):
+            self.call('testapp.RoomBookingQ', index='nope')
+
+
+class ResolveDuplicatesTest(TransactionTestCase):
+    def setUp(self):
+        self.a1 = ABC.objects.create(a='1', b='1', c='x')
+        self.a2 = ABC.objects.create(a='1', b='1', c='x')
+        self.a3 = ABC.objects.create(a='1', b='1', c='x')
+        self.b1 = ABC.objects.create(a='2', b='1', c='x')
+        self.b2 = ABC.objects.create(a='2', b='1', c='x')
+        self.unique = ABC.objects.create(a='3', b='1', c='x')
+
+    def remaining(self):
+        return set(ABC.objects.filter(c='x').values_list('pk', flat=True))
+
+    def test_keep_newest_delete(self):
+        self.assertEqual(resolve_duplicates(ABC, ['a', 'b'], PQ(c='x')), (2, 3))
+        self.assertEqual(self.remaining(), {self.a3.pk, self.b2.pk, self.unique.pk})
+        self.assertEqual(ABC.objects.count(), 3)
+
+    def test_keep_oldest_soft_delete(self):
+        progress = []
+        result = resolve_duplicates(ABC, ['a', 'b'], PQ(c='x'), keep='oldest', soft_delete={'c': 'deleted'},
+                                    batch_size=1, progress=lambda groups, rows: progress.append((groups, rows)))
+        self.assertEqual(result, (2, 3))
+        self.assertEqual(progress, [(1, 2), (2, 3)])
+        self.assertEqual(self.remaining(), {self.a1.pk, self.b1.pk, self.unique.pk})
+        self.assertEqual(ABC.objects.filter(c='deleted').count(), 3)
+
+    def test_soft_delete_must_leave_condition(self):
+        with self.assertRaisesRegexp(ValueError, 'still match'):
+            resolve_duplicates(ABC, ['a', 'b'], PQ(c='x'), soft_delete={'c': 'x'})
+        self.assertEqual(ABC.objects.count(), 6)
+
+    def test_dry_run(self):
+        self.assertEqual(resolve_duplicates(ABC, ['a', 'b'], PQ(c='x'), dry_run=True), (2, 3))
+        self.assertEqual(ABC.objects.count(), 6)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('partial_index_dedupe', 'testapp.ABC', fields='a,b', where='{"c": "x"}',
+                     soft_delete='{"c": "deleted"}', stdout=out)
+        self.assertIn('Resolved 2 duplicate groups, 3 rows updated.', out.getvalue())
+        self.assertEqual(self.remaining(), {self.a3.pk, self.b2.pk, self.unique.pk})
+
+    def test_descending_order_by(self):
+        with self.assertRaisesMessage(ValueError, 'order_by must be a field name without "-"'):
+            resolve_duplicates(ABC, ['a', 'b'], PQ(c='x'), order_by='-pk')
+        with self.assertRaisesMessage(CommandError, '--order-by must be a field name without "-"'):
+            call_command('partial_index_dedupe', 'testapp.ABC', fields='a,b', where='{"c": "x"}', order_by='-pk',
+                         stdout=StringIO())
+        self.assertEqual(ABC.objects.count(), 6)
+
+    def test_command_unknown_soft_delete_field(self):
+        with self.assertRaisesMessage(CommandError, "Invalid --soft-delete: ABC has no field named 'nope'"):
+            call_command('partial_index_dedupe', 'testapp.ABC', fields='a,b', where='{"c": "x"}',
+                         soft_delete='{"nope": "deleted"}', stdout=StringIO())
+        self.assertEqual(ABC.objects.count(), 6)
+
+
+class ResolveDuplicatesNullOrderTest(TransactionTestCase):
+    """Rows where the order_by field is NULL are never kept over rows with a value, whichever end is kept."""
+
+    def setUp(self):
+        room = Room.objects.create(name='Room')
+        self.null = NullableRoomNumberQ.objects.create(room=room, room_number=None)
+        self.high = NullableRoomNumberQ.objects.create(room=room, room_number=5)
+        self.low = NullableRoomNumberQ.objects.create(room=room, room_number=2)
+
+    def remaining(self):
+        return set(NullableRoomNumberQ.objects.values_list('pk', flat=True))
+
+    def test_keep_newest(self):
+        resolve_duplicates(NullableRoomNumberQ, ['room'], PQ(deleted_at__isnull=True), order_by='room_number')
+        self.assertEqual(self.remaining(), {self.high.pk})
+
+    def test_keep_oldest(self):
+        resolve_duplicates(NullableRoomNumberQ, ['room'], PQ(deleted_at__isnull=True), order_by='room_number', keep='oldest')
+        self.assertEqual(self.remaining(), {self.low.pk})
@@ -3,10 +3,11 @@ Tests for actual use of the indexes after creating models with them.
 """
 import datetime
 
-from django.core.exceptions import ImproperlyConfigured
-from django.test import TransactionTestCase
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.test import TransactionTestCase, override_settings
 
-from testapp.forms import RoomBookingAllFieldsForm, RoomBookingNoConditionFieldForm, RoomBookingJustRoomForm, RoomBookingTextForm, NullableRoomNumberAllFieldsForm
+from partial_index.signals import partial_unique_checked
+from testapp.forms import RoomBookingAllFieldsForm, RoomBookingNoConditionFieldForm, RoomBookingJustRoomForm, RoomBookingTextForm, NullableRoomNumberAllFieldsForm, RoomBookingFormSet
 from testapp.models import User, Room, RoomBookingQ, NullableRoomNumberQ
 
 
@@ -82,6 +83,12 @@ class AllFieldsFormTest(FormTestCase, TransactionTestCase):
     formclass = RoomBookingAllFieldsForm
 
 
+@override_settings(DJANGO_PARTIAL_INDEX_PRECOMPILED_QUERIES=True)
+class AllFieldsFormPrecompiledLookupTest(FormTestCase, TransactionTestCase):
+    """Test that partial unique validation works with precompiled conflict lookups instead of QuerySets."""
+    formclass = RoomBookingAllFieldsForm
+
+
 class NoConditionFieldFormTest(FormTestCase, TransactionTestCase):
     """Test that partial unique validation on a ModelForm works when all index fields, but not the condition field are present on the form."""
     formclass = RoomBookingNoConditionFieldForm
@@ -153,3 +160,64 @@ class NullableFieldFormTest(TransactionTestCase):
         form = self.formclass(data={'room': self.room1.id, 'room_number': 1}, instance=self.number2_none)
         self.assertTrue(form.is_valid(), 'Form errors: %s' % form.errors)
         self.assertFalse(form.errors)
+
+
+class FormSetTest(TransactionTestCase):
+    """Test that PartialUniqueFormSetMixin validates all forms at once."""
+    conflict_error = 'Room booking q with this Room and User already exists.'
+
+    def setUp(self):
+        self.user1 = User.objects.create(name='User1')
+        self.user2 = User.objects.create(name='User2')
+        self.room1 = Room.objects.create(name='Room1')
+        self.room2 = Room.objects.create(name='Room2')
+        self.booking1 = RoomBookingQ.objects.create(user=self.user1, room=self.room1)
+        self.checks = []
+        partial_unique_checked.connect(self.receiver)
+
+    def tearDown(self):
+        partial_unique_checked.disconnect(self.receiver)
+
+    def receiver(self, **kwargs):
+        self.checks.append(kwargs)
+
+    def formset(self, rows, existing=()):
+        data = {
+            'form-TOTAL_FORMS': str(len(existing) + len(rows)),
+            'form-INITIAL_FORMS': str(len(existing)),
+        }
+        for i, (booking, user, room) in enumerate([(b, b.user, b.room) for b in existing] + [(None, u, r) for u, r in rows]):
+            data['form-%d-id' % i] = str(booking.id) if booking else ''
+            data['form-%d-user' % i] = str(user.id)
+            data['form-%d-room' % i] = str(room.id)
+        return RoomBookingFormSet(data=data, queryset=RoomBookingQ.objects.filter(id__in=[b.id for b in existing]))
+
+    def test_valid(self):
+        formset = self.formset([(self.user1, self.room2), (self.user2, self.room1)])
+        self.assertTrue(formset.is_valid(), 'Formset errors: %s' % formset.errors)
+        self.assertEqual(self.checks, [])
+        formset.save()
+        self.assertEqual(RoomBookingQ.objects.count(), 3)
+
+    def test_conflict_with_existing(self):
+        formset = self.formset([(self.user1, self.room2), (self.user1, self.room1)])
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(formset.errors[0], {})
+        self.assertIn(self.conflict_error, formset.errors[1]['__all__'])
+        self.assertEqual(self.checks, [])
+
+    def test_conflict_between_forms(self):
+        formset = self.formset([(self.user2, self.room2), (self.user2, self.room2)])
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(formset.errors[0], {})
+        self.assertIn(self.conflict_error, formset.errors[1]['__all__'])
+
+    def test_existing_unchanged_valid(self):
+        formset = self.formset([(self.user2, self.room2)], existing=[self.booking1])
+        self.assertTrue(formset.is_valid(), 'Formset errors: %s' % formset.errors)
+
+    def test_instances_validate_normally_afterwards(self):
+        formset = self.formset([(self.user1, self.room1)])
+        self.assertFalse(formset.is_valid())
+        with self.assertRaises(ValidationError):
+            formset.forms[0].instance.full_clean()
@@ -0,0 +1,116 @@
+"""
+Tests for serializing partial unique validation with locks.
+"""
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from partial_index.cache import partial_unique_cache
+from partial_index.locks import acquire_partial_unique_locks, partial_unique_lock_key
+from partial_index.mixins import PartialUniqueValidationError
+from testapp.models import Room, RoomBookingQ, User
+
+
+class PartialUniqueLockKeyTest(SimpleTestCase):
+    def setUp(self):
+        self.idx = RoomBookingQ._meta.indexes[0]
+
+    def test_key(self):
+        key = partial_unique_lock_key(self.idx, {'user': 1, 'room': 2})
+        self.assertEqual(key, partial_unique_lock_key(self.idx, {'room': 2, 'user': 1}))
+        self.assertTrue(-2 ** 63 <= key < 2 ** 63)
+        self.assertNotEqual(key, partial_unique_lock_key(self.idx, {'user': 1, 'room': 3}))
+
+    def test_where_fields_ignored(self):
+        self.assertEqual(partial_unique_lock_key(self.idx, {'user': 1, 'room': 2, 'deleted_at': None}),
+                         partial_unique_lock_key(self.idx, {'user': 1, 'room': 2, 'deleted_at': timezone.now()}))
+
+
+class PartialUniqueLockTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(name='User')
+        self.room = Room.objects.create(name='Room')
+
+    def lock_queries(self, queries):
+        return [query['sql'] for query in queries if 'pg_advisory_xact_lock' in query['sql'] or 'WHERE 0 = 1' in query['sql']]
+
+    def test_outside_transaction(self):
+        with self.assertRaisesMessage(transaction.TransactionManagementError, 'inside a transaction'):
+            acquire_partial_unique_locks(connection, RoomBookingQ, [1])
+
+    def test_save_partial_unique(self):
+        booking = RoomBookingQ(user=self.user, room=self.room)
+        with CaptureQueriesContext(connection) as queries:
+            booking.save_partial_unique()
+        self.assertIsNotNone(booking.pk)
+        self.assertEqual(len(self.lock_queries(queries)), 1)
+
+        with self.assertRaises(PartialUniqueValidationError):
+            RoomBookingQ(user=self.user, room=self.room).save_partial_unique()
+        self.assertEqual(RoomBookingQ.objects.count(), 1)
+
+    def test_null_values_not_locked(self):
+        booking = RoomBookingQ(user=self.user, room=self.room)
+        booking.room_id = None
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            booking.lock_partial_unique()
+        self.assertEqual(self.lock_queries(queries), [])
+
+    def test_validation_setting(self):
+        booking = RoomBookingQ(user=self.user, room=self.room)
+        with CaptureQueriesContext(connection) as queries:
+            booking.validate_partial_unique()
+        self.assertEqual(self.lock_queries(queries), [])
+
+        with self.settings(DJANGO_PARTIAL_INDEX_LOCK_VALIDATION=True):
+            # Outside a transaction, the lock would be released right away.
+            with CaptureQueriesContext(connection) as queries:
+                booking.validate_partial_unique()
+            self.assertEqual(self.lock_queries(queries), [])
+
+            with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                booking.full_clean()
+                booking.save()
+            self.assertEqual(len(self.lock_queries(queries)), 1)
+
+
+class PartialUniqueLockCacheTest(TransactionTestCase):
+    """Lookups cached before the locks are taken must not hide rows committed by other writers since."""
+
+    def setUp(self):
+        self.user = User.objects.create(name='User')
+        self.room = Room.objects.create(name='Room')
+
+    def commit_conflict(self):
+        # bulk_create() sends no post_save signal, like a commit by another worker.
+        RoomBookingQ.objects.bulk_create([RoomBookingQ(user=self.user, room=self.room)])
+
+    def test_save_partial_unique(self):
+        booking = RoomBookingQ(user=self.user, room=self.room)
+        with partial_unique_cache():
+            booking.full_clean()
+            self.commit_conflict()
+            with self.assertRaises(PartialUniqueValidationError):
+                booking.save_partial_unique()
+        self.assertEqual(RoomBookingQ.objects.count(), 1)
+
+    def test_lock_partial_unique(self):
+        booking = RoomBookingQ(user=self.user, room=self.room)
+        with partial_unique_cache():
+            booking.full_clean()
+            self.commit_conflict()
+            with transaction.atomic():
+                booking.lock_partial_unique()
+                with self.assertRaisesMessage(ValidationError, 'already exists'):
+                    booking.full_clean()
+
+    def test_validation_setting(self):
+        booking = RoomBookingQ(user=self.user, room=self.room)
+        with partial_unique_cache(), self.settings(DJANGO_PARTIAL_INDEX_LOCK_VALIDATION=True):
+            booking.full_clean()
+            self.commit_conflict()
+            with transaction.atomic():
+                with self.assertRaisesMessage(ValidationError, 'already exists'):
+                    booking.full_clean()
@@ -0,0 +1,191 @@
+"""
+Tests for index sets managed at runtime, such as RollingPartialIndex.
+"""
+import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+from io import StringIO
+
+from partial_index import PQ
+from partial_index.managed import ManagedIndexSet, all_index_sets
+from partial_index.rolling import RollingPartialIndex, add_periods, period_start
+from testapp.models import Event, User
+
+
+class PeriodTest(SimpleTestCase):
+    def test_period_start(self):
+        day = datetime.date(2026, 10, 18)
+        self.assertEqual(period_start(day, 'day'), day)
+        self.assertEqual(period_start(day, 'week'), datetime.date(2026, 10, 12))
+        self.assertEqual(period_start(day, 'month'), datetime.date(2026, 10, 1))
+
+    def test_add_periods(self):
+        self.assertEqual(add_periods(datetime.date(2026, 12, 31), 'day', 1), datetime.date(2027, 1, 1))
+        self.assertEqual(add_periods(datetime.date(2026, 10, 12), 'week', -2), datetime.date(2026, 9, 28))
+        self.assertEqual(add_periods(datetime.date(2026, 11, 1), 'month', 2), datetime.date(2027, 1, 1))
+        self.assertEqual(add_periods(datetime.date(2026, 1, 1), 'month', -1), datetime.date(2025, 12, 1))
+
+
+class RollingPartialIndexTest(SimpleTestCase):
+    def test_validation(self):
+        with self.assertRaisesMessage(ValueError, 'Granularity must be one of day, week, month.'):
+            RollingPartialIndex(fields=['user'], field='created_at', granularity='year')
+        with self.assertRaisesMessage(ValueError, 'window must be at least 1.'):
+            RollingPartialIndex(fields=['user'], field='created_at', window=0)
+
+    def test_registered(self):
+        self.assertIn(Event.recent, all_index_sets())
+        self.assertIs(Event.recent.model, Event)
+        self.assertEqual(Event.recent.name, 'recent')
+
+    def test_window_start(self):
+        self.assertEqual(Event.recent.window_start(datetime.date(2026, 10, 18)), datetime.date(2026, 9, 1))
+
+    def test_today_utc(self):
+        # 12:00 UTC on the last day of October is already November 1st in Kiritimati (UTC+14).
+        now = datetime.datetime(2026, 10, 31, 12, tzinfo=datetime.timezone.utc)
+        with self.settings(USE_TZ=True, TIME_ZONE='Pacific/Kiritimati'):
+            self.assertEqual(timezone.localdate(now), datetime.date(2026, 11, 1))
+            self.assertEqual(Event.recent.today(now), datetime.date(2026, 10, 31))
+            start = Event.recent.window_start(Event.recent.today(now))
+            self.assertEqual(Event.recent.boundary(start), datetime.datetime(2026, 9, 1, tzinfo=datetime.timezone.utc))
+
+    def test_today_naive(self):
+        self.assertEqual(Event.recent.today(datetime.datetime(2026, 10, 31, 23, 30)), datetime.date(2026, 10, 31))
+
+    def test_indexes(self):
+        conditions = Event.recent.get_conditions(datetime.date(2026, 10, 18))
+        current, following = [Event.recent.make_index(condition) for condition in conditions]
+        self.assertEqual(current.where, PQ(created_at__gte=datetime.datetime(2026, 9, 1)) & PQ(is_public=True))
+        self.assertEqual(following.where, PQ(created_at__gte=datetime.datetime(2026, 10, 1)) & PQ(is_public=True))
+        self.assertTrue(current.name.startswith('testapp_eve_user_id_'))
+        self.assertTrue(current.name.endswith('_rolling'))
+        self.assertNotEqual(current.name, following.name)
+        self.assertTrue(Event.recent.is_managed_name(current.name))
+        self.assertFalse(Event.recent.is_managed_name('testapp_eve_user_id_123456_partial'))
+
+    def test_stable_names(self):
+        # Names must not change between runs, or reconciling would rebuild the indexes.
+        index = Event.recent.make_index(Event.recent.condition(datetime.date(2026, 9, 1)))
+        self.assertEqual(index.name, Event.recent.make_index(Event.recent.condition(datetime.date(2026, 9, 1))).name)
+
+    def test_filter(self):
+        queryset = Event.recent.filter(today=datetime.date(2026, 10, 18))
+        self.assertEqual(str(queryset.query), str(Event.objects.filter(
+            PQ(created_at__gte=datetime.datetime(2026, 9, 1)) & PQ(is_public=True)).query))
+
+
+class ManagedIndexSetTest(SimpleTestCase):
+    def make_index_set(self, cls):
+        # Not contributed to the model, so that it is not registered with the other index sets.
+        index_set = cls(fields=['user'])
+        index_set.model = Event
+        index_set.name = 'custom'
+        return index_set
+
+    def test_abstract_hooks(self):
+        class Incomplete(ManagedIndexSet):
+            suffix = 'custom'
+
+        index_set = self.make_index_set(Incomplete)
+        with self.assertRaisesMessage(NotImplementedError, 'Subclasses must implement get_conditions()'):
+            index_set.get_indexes()
+        with self.assertRaisesMessage(NotImplementedError, 'Subclasses must implement filter()'):
+            index_set.filter()
+
+    def test_duplicate_names(self):
+        class Duplicates(ManagedIndexSet):
+            suffix = 'custom'
+
+            def get_conditions(self):
+                return [PQ(is_public=True), PQ(is_public=True)]
+
+        index_set = self.make_index_set(Duplicates)
+        with self.assertRaisesMessage(ImproperlyConfigured, 'Index set testapp.Event.custom generates the name '):
+            index_set.reconcile(dry_run=True)
+
+
+class ReconcileTest(TransactionTestCase):
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            for name in Event.recent.existing_index_names(connection):
+                cursor.execute('DROP INDEX %s' % connection.ops.quote_name(name))
+
+    def test_reconcile(self):
+        expected = sorted(index.name for index in Event.recent.get_indexes())
+        self.assertEqual(Event.recent.reconcile(dry_run=True), (expected, []))
+        self.assertEqual(Event.recent.existing_index_names(connection), set())
+
+        self.assertEqual(Event.recent.reconcile(), (expected, []))
+        self.assertEqual(Event.recent.existing_index_names(connection), set(expected))
+        self.assertEqual(Event.recent.reconcile(), ([], []))
+
+        user = User.objects.create(name='User')
+        Event.objects.create(user=user, created_at=datetime.datetime.now())
+        self.assertEqual(Event.recent.filter().filter(user=user).count(), 1)
+
+    def test_drop_expired(self):
+        expired = Event.recent.make_index(Event.recent.condition(datetime.date(2020, 1, 1)))
+        with connection.schema_editor() as editor:
+            editor.add_index(Event, expired)
+        created, dropped = Event.recent.reconcile()
+        self.assertEqual(dropped, [expired.name])
+        self.assertNotIn(expired.name, Event.recent.existing_index_names(connection))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('partial_index_reconcile', 'testapp', '--dry-run', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('Would create index testapp_eve_user_id_'), lines)
+        self.assertTrue(lines[0].endswith('_rolling for testapp.Event.recent.'), lines)
+
+        out = StringIO()
+        call_command('partial_index_reconcile', 'otherapp', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+
+class TenantPartialIndexesTest(TransactionTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(name='User1')
+        self.user2 = User.objects.create(name='User2')
+        Event.large_users.values = [self.user2, self.user1.pk]
+
+    def tearDown(self):
+        Event.large_users.values = []
+        with connection.cursor() as cursor:
+            for name in Event.large_users.existing_index_names(connection):
+                cursor.execute('DROP INDEX %s' % connection.ops.quote_name(name))
+
+    def test_indexes(self):
+        indexes = Event.large_users.get_indexes()
+        self.assertEqual([index.where for index in indexes], [PQ(user=self.user1.pk), PQ(user=self.user2.pk)])
+        self.assertTrue(all(index.name.startswith('testapp_eve_created_') for index in indexes))
+        self.assertTrue(all(index.name.endswith('_tenant') for index in indexes))
+        self.assertNotEqual(indexes[0].name, indexes[1].name)
+        self.assertEqual([index.name for index in indexes], [index.name for index in Event.large_users.get_indexes()])
+
+    def test_callable_values(self):
+        Event.large_users.values = lambda: [self.user1.pk]
+        self.assertEqual(Event.large_users.get_conditions(), [PQ(user=self.user1.pk)])
+
+    def test_reconcile(self):
+        created, dropped = Event.large_users.reconcile()
+        self.assertEqual((len(created), dropped), (2, []))
+        self.assertEqual(Event.large_users.existing_index_names(connection), set(created))
+        # Rolling indexes on the same table are not touched.
+        self.assertEqual(Event.recent.existing_index_names(connection), set())
+
+        Event.large_users.values = [self.user1]
+        self.assertEqual(Event.large_users.reconcile(), ([], [Event.large_users.make_index(PQ(user=self.user2.pk)).name]))
+        self.assertEqual(len(Event.large_users.existing_index_names(connection)), 1)
+
+    def test_filter(self):
+        Event.objects.create(user=self.user1, created_at=datetime.datetime.now())
+        Event.objects.create(user=self.user2, created_at=datetime.datetime.now())
+        self.assertEqual(Event.large_users.filter(self.user1).get().user, self.user1)
+        self.assertEqual(Event.large_users.filter(self.user2.pk, Event.objects.filter(is_public=False)).count(), 0)
@@ -0,0 +1,332 @@
+"""
+Tests for the migration operations.
+"""
+from io import StringIO
+import os
+import tempfile
+import threading
+
+from django.apps import apps
+from django.core.management import call_command, CommandError
+from django.db import connection, connections, DEFAULT_DB_ALIAS, IntegrityError
+from django.db.migrations.state import ProjectState
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from partial_index import operations, PartialIndex, PQ
+from partial_index.operations import (AddPartialIndexes, AddPartitionedIndex, CreateIndexStatistics, build_indexes_in_parallel,
+                                      statistics_columns, statistics_name)
+from partial_index.partitions import (attached_partitions, create_partitioned_index, index_is_valid, partition_index_name,
+                                      prepare_partition, _build_partition_index)
+from testapp.models import AB, ABC, JobQ, JobText, Measurement
+
+
+class OperationTestCase(TransactionTestCase):
+    created_indexes = ['testapp_ab_a_partial', 'testapp_abc_a_partial', 'testapp_abc_ab_partial']
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            for name in self.created_indexes:
+                cursor.execute('DROP INDEX IF EXISTS %s' % connection.ops.quote_name(name))
+
+    def index_names(self, table):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, table).keys())
+
+    def apply(self, operation):
+        from_state = ProjectState.from_apps(apps)
+        to_state = from_state.clone()
+        operation.state_forwards('testapp', to_state)
+        with connection.schema_editor() as editor:
+            operation.database_forwards('testapp', editor, from_state, to_state)
+        return from_state, to_state
+
+    def unapply(self, operation, from_state, to_state):
+        with connection.schema_editor() as editor:
+            operation.database_backwards('testapp', editor, from_state, to_state)
+
+
+class AddPartialIndexesTest(OperationTestCase):
+    def setUp(self):
+        self.ab_index = PartialIndex(fields=['a'], unique=False, where=PQ(b='x'), name='testapp_ab_a_partial')
+        self.abc_index = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(c='x'), name='testapp_abc_ab_partial')
+        self.operation = AddPartialIndexes([('ab', self.ab_index), ('abc', self.abc_index)], parallel=2)
+
+    def test_state_forwards(self):
+        state = ProjectState.from_apps(apps)
+        self.operation.state_forwards('testapp', state)
+        self.assertIn(self.ab_index, state.models['testapp', 'ab'].options['indexes'])
+        self.assertIn(self.abc_index, state.models['testapp', 'abc'].options['indexes'])
+
+    def test_forwards_backwards(self):
+        from_state, to_state = self.apply(self.operation)
+        self.assertIn('testapp_ab_a_partial', self.index_names('testapp_ab'))
+        self.assertIn('testapp_abc_ab_partial', self.index_names('testapp_abc'))
+
+        self.unapply(self.operation, from_state, to_state)
+        self.assertNotIn('testapp_ab_a_partial', self.index_names('testapp_ab'))
+        self.assertNotIn('testapp_abc_ab_partial', self.index_names('testapp_abc'))
+
+    def test_deconstruct(self):
+        name, args, kwargs = self.operation.deconstruct()
+        self.assertEqual(name, 'AddPartialIndexes')
+        self.assertEqual(kwargs, {'indexes': [('ab', self.ab_index), ('abc', self.abc_index)], 'parallel': 2})
+
+    def test_parallel_only_outside_transactions(self):
+        with connection.schema_editor(collect_sql=True) as editor:
+            self.assertFalse(self.operation.can_build_in_parallel(editor))
+
+
+class BuildIndexesInParallelTest(OperationTestCase):
+    """On SQLite, builds on a database file, as concurrent DDL on the shared in-memory test database fails with
+    "database schema is locked"."""
+    parallel = 2
+
+    def setUp(self):
+        self.alias = DEFAULT_DB_ALIAS
+        if connection.vendor == 'sqlite':
+            fd, self.path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            self.alias = 'parallel'
+            connections.databases[self.alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path}
+            connections.ensure_defaults(self.alias)
+            connections.prepare_test_settings(self.alias)
+            with connections[self.alias].schema_editor() as editor:
+                editor.create_model(AB)
+                editor.create_model(ABC)
+        # Both builds wait for each other to start, which fails unless they run at the same time.
+        barrier = threading.Barrier(self.parallel, timeout=5)
+        self.threads = set()
+        self.build_index = operations._build_index
+
+        def build_index(*args):
+            self.threads.add(threading.current_thread())
+            barrier.wait()
+            return self.build_index(*args)
+        operations._build_index = build_index
+
+    def tearDown(self):
+        operations._build_index = self.build_index
+        super(BuildIndexesInParallelTest, self).tearDown()
+        if self.alias != DEFAULT_DB_ALIAS:
+            connections[self.alias].close()
+            del connections[self.alias]
+            del connections.databases[self.alias]
+            os.remove(self.path)
+
+    def index_names(self, table):
+        with connections[self.alias].cursor() as cursor:
+            return set(connections[self.alias].introspection.get_constraints(cursor, table).keys())
+
+    def test_build(self):
+        indexes = [
+            (AB, PartialIndex(fields=['a'], unique=False, where=PQ(b='x'), name='testapp_ab_a_partial')),
+            (ABC, PartialIndex(fields=['a'], unique=False, where=PQ(c='x'), name='testapp_abc_a_partial')),
+        ]
+        with connections[self.alias].schema_editor(atomic=False) as editor:
+            durations = build_indexes_in_parallel(editor, indexes, self.parallel)
+        self.assertEqual(len(durations), 2)
+        self.assertNotIn(threading.current_thread(), self.threads)
+        self.assertIn('testapp_ab_a_partial', self.index_names('testapp_ab'))
+        self.assertIn('testapp_abc_a_partial', self.index_names('testapp_abc'))
+
+    def test_failure_drops_built_indexes(self):
+        AB.objects.using(self.alias).create(a='1', b='x')
+        AB.objects.using(self.alias).create(a='1', b='x')
+        indexes = [
+            (ABC, PartialIndex(fields=['a'], unique=False, where=PQ(c='x'), name='testapp_abc_a_partial')),
+            (AB, PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='testapp_ab_a_partial')),
+        ]
+        with self.assertRaises(IntegrityError):
+            with connections[self.alias].schema_editor(atomic=False) as editor:
+                build_indexes_in_parallel(editor, indexes, self.parallel)
+        self.assertNotIn(threading.current_thread(), self.threads)
+        self.assertNotIn('testapp_abc_a_partial', self.index_names('testapp_abc'))
+        self.assertNotIn('testapp_ab_a_partial', self.index_names('testapp_ab'))
+
+
+class AddPartitionedIndexTest(OperationTestCase):
+    def setUp(self):
+        self.index = PartialIndex(fields=['a'], unique=False, where=PQ(b='x'), name='testapp_ab_a_partial')
+        self.operation = AddPartitionedIndex('ab', self.index, parallel=2)
+
+    def test_deconstruct(self):
+        name, args, kwargs = self.operation.deconstruct()
+        self.assertEqual(name, 'AddPartitionedIndex')
+        self.assertEqual(kwargs, {'model_name': 'ab', 'index': self.index, 'parallel': 2})
+
+    def test_forwards_backwards(self):
+        # Tables that are not partitioned get a regular index.
+        from_state, to_state = self.apply(self.operation)
+        self.assertIn('testapp_ab_a_partial', self.index_names('testapp_ab'))
+        self.unapply(self.operation, from_state, to_state)
+        self.assertNotIn('testapp_ab_a_partial', self.index_names('testapp_ab'))
+
+    def test_partition_index_name(self):
+        name = partition_index_name(self.index, 'testapp_ab_2026_10')
+        self.assertEqual(name, partition_index_name(self.index, 'testapp_ab_2026_10'))
+        self.assertNotEqual(name, partition_index_name(self.index, 'testapp_ab_2026_11'))
+        self.assertTrue(name.startswith('testapp_ab_2026_10_'))
+        self.assertLessEqual(len(partition_index_name(self.index, 'x' * 63)), 63)
+
+    def test_command_requires_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Requires a database other than PostgreSQL.')
+        with self.assertRaisesMessage(CommandError, 'Partitioned tables are only supported on PostgreSQL.'):
+            call_command('partial_index_partitions', 'testapp.RoomBookingQ')
+
+    def test_command_unknown_model(self):
+        with self.assertRaisesMessage(CommandError, "App 'testapp' doesn't have a 'Nope' model."):
+            call_command('partial_index_partitions', 'testapp.Nope')
+
+
+class PartitionedTableTest(TransactionTestCase):
+    """Builds the index of Measurement on a PostgreSQL table partitioned by month."""
+    partitions = ['testapp_measurement_2026_10', 'testapp_measurement_2026_11']
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Partitioned tables are only supported on PostgreSQL.')
+        self.index = Measurement._meta.indexes[0]
+        self.execute(
+            'CREATE TABLE testapp_measurement (id serial, logdate date NOT NULL, value integer NOT NULL, '
+            'archived boolean NOT NULL DEFAULT false) PARTITION BY RANGE (logdate)',
+            "CREATE TABLE testapp_measurement_2026_10 PARTITION OF testapp_measurement "
+            "FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')",
+            "CREATE TABLE testapp_measurement_2026_11 PARTITION OF testapp_measurement "
+            "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')",
+        )
+
+    def tearDown(self):
+        self.execute('DROP TABLE IF EXISTS testapp_measurement CASCADE',
+                     'DROP TABLE IF EXISTS testapp_measurement_2026_12')
+
+    def execute(self, *statements):
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def index_names(self, table):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, table).keys())
+
+    def test_create(self):
+        with CaptureQueriesContext(connection) as queries:
+            with connection.schema_editor(atomic=False) as editor:
+                durations = create_partitioned_index(editor, Measurement, self.index, parallel=2)
+        self.assertEqual(sorted(durations), self.partitions)
+        self.assertIn('ON ONLY "testapp_measurement"', '\n'.join(query['sql'] for query in queries))
+        self.assertEqual(attached_partitions(connection, self.index.name), self.partitions)
+        self.assertIs(index_is_valid(connection, self.index.name), True)
+        for partition in self.partitions:
+            name = partition_index_name(self.index, partition)
+            self.assertIn(name, self.index_names(partition))
+            self.assertIs(index_is_valid(connection, name), True)
+
+    def test_partition_concurrently(self):
+        name = partition_index_name(self.index, self.partitions[0])
+        with CaptureQueriesContext(connection) as queries:
+            _build_partition_index(connection, Measurement, self.index, self.partitions[0], name)
+        self.assertIn('CREATE INDEX CONCURRENTLY "%s"' % name, '\n'.join(query['sql'] for query in queries))
+        self.assertIs(index_is_valid(connection, name), True)
+
+    def test_resume(self):
+        # As left by a run that failed after building the index of the first partition only.
+        with connection.cursor() as cursor:
+            with connection.schema_editor(atomic=False) as editor:
+                self.index.execute_create_sql(cursor, Measurement, editor, only=True)
+        self.assertIs(index_is_valid(connection, self.index.name), False)
+        name = partition_index_name(self.index, self.partitions[0])
+        _build_partition_index(connection, Measurement, self.index, self.partitions[0], name)
+        self.execute('ALTER INDEX "%s" ATTACH PARTITION "%s"' % (self.index.name, name))
+        self.assertIs(index_is_valid(connection, self.index.name), False)
+
+        with connection.schema_editor(atomic=False) as editor:
+            durations = create_partitioned_index(editor, Measurement, self.index)
+        self.assertEqual(list(durations), self.partitions[1:])
+        self.assertEqual(attached_partitions(connection, self.index.name), self.partitions)
+        self.assertIs(index_is_valid(connection, self.index.name), True)
+
+    def test_prepare(self):
+        with connection.schema_editor(atomic=False) as editor:
+            create_partitioned_index(editor, Measurement, self.index)
+        table = 'testapp_measurement_2026_12'
+        self.execute('CREATE TABLE %s (LIKE testapp_measurement INCLUDING DEFAULTS)' % table)
+        call_command('partial_index_partitions', 'testapp.Measurement', '--prepare', table, stdout=StringIO())
+        name = partition_index_name(self.index, table)
+        self.assertIn(name, self.index_names(table))
+
+        self.execute("ALTER TABLE testapp_measurement ATTACH PARTITION %s FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+                     % table)
+        # The prepared index is attached, instead of a new one being built.
+        self.assertEqual(attached_partitions(connection, self.index.name), self.partitions + [table])
+        self.assertEqual([n for n in self.index_names(table) if n.endswith('_partial')], [name])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('partial_index_partitions', 'testapp.Measurement', '--parallel', '2', stdout=out)
+        self.assertEqual(out.getvalue(), 'Index testapp_meas_value_partial: built on 2 partitions.\n')
+        self.assertEqual(attached_partitions(connection, self.index.name), self.partitions)
+        self.assertIs(index_is_valid(connection, self.index.name), True)
+
+    def test_unique_without_partition_key(self):
+        index = PartialIndex(fields=['value'], unique=True, where=PQ(archived=False), name='testapp_meas_unique_partial')
+        message = ('Unique index testapp_meas_unique_partial on partitioned table testapp_measurement must include '
+                   'the partition key columns (logdate).')
+        with connection.schema_editor(atomic=False) as editor:
+            with self.assertRaisesMessage(ValueError, message):
+                create_partitioned_index(editor, Measurement, index)
+            with self.assertRaisesMessage(ValueError, message):
+                prepare_partition(editor, Measurement, index, self.partitions[0])
+        # Rejected before building anything.
+        self.assertIsNone(index_is_valid(connection, index.name))
+        self.assertEqual(attached_partitions(connection, index.name), [])
+
+    def test_unique_with_partition_key(self):
+        index = PartialIndex(fields=['logdate', 'value'], unique=True, where=PQ(archived=False),
+                             name='testapp_meas_unique_partial')
+        with connection.schema_editor(atomic=False) as editor:
+            create_partitioned_index(editor, Measurement, index)
+        self.assertIs(index_is_valid(connection, index.name), True)
+
+
+class CreateIndexStatisticsTest(OperationTestCase):
+    def setUp(self):
+        self.index = JobQ._meta.indexes[0]
+        self.operation = CreateIndexStatistics('jobq', self.index.name)
+
+    def test_deconstruct(self):
+        name, args, kwargs = self.operation.deconstruct()
+        self.assertEqual(name, 'CreateIndexStatistics')
+        self.assertEqual(kwargs, {'model_name': 'jobq', 'index_name': self.index.name})
+        operation = CreateIndexStatistics('jobq', self.index.name, kinds=['dependencies'], analyze=False)
+        self.assertEqual(operation.deconstruct()[2]['kinds'], ['dependencies'])
+        self.assertIs(operation.deconstruct()[2]['analyze'], False)
+        operation = CreateIndexStatistics('jobq', self.index.name, kinds=['ndistinct', 'dependencies', 'mcv'])
+        self.assertEqual(operation.deconstruct()[2]['kinds'], ['ndistinct', 'dependencies', 'mcv'])
+
+    def test_invalid_kinds(self):
+        with self.assertRaisesMessage(ValueError, 'kinds must be a non-empty list of ndistinct, dependencies, mcv.'):
+            CreateIndexStatistics('jobq', self.index.name, kinds=['histogram'])
+
+    def test_statistics_columns(self):
+        self.assertEqual(statistics_columns(JobQ, self.index), ['order', 'is_complete'])
+        self.assertEqual(statistics_columns(JobText, JobText._meta.indexes[0]), ['order'])
+        self.assertEqual(statistics_name(self.index), self.index.name + '_stat')
+
+    def test_unknown_index(self):
+        with self.assertRaisesMessage(ValueError, 'Index nope not found on model testapp.JobQ.'):
+            self.apply(CreateIndexStatistics('jobq', 'nope'))
+
+    def test_sql(self):
+        from_state = ProjectState.from_apps(apps)
+        with connection.schema_editor(collect_sql=True) as editor:
+            self.operation.database_forwards('testapp', editor, from_state, from_state)
+        if connection.vendor == 'postgresql':
+            self.assertEqual(editor.collected_sql[0], 'CREATE STATISTICS IF NOT EXISTS "%s" (ndistinct, dependencies) '
+                                                      'ON "order", "is_complete" FROM "testapp_jobq";' % statistics_name(self.index))
+        self.assertEqual(editor.collected_sql[-1], 'ANALYZE "testapp_jobq";')
+
+    def test_forwards_backwards(self):
+        from_state, to_state = self.apply(self.operation)
+        self.unapply(self.operation, from_state, to_state)
@@ -4,10 +4,16 @@ Tests for basic fields and functions in the PartialIndex class.
 Tests interacting with a real PostgreSQL database are elsewhere.
 """
 
+import copy
+
+from django.db import models
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.state import ModelState, ProjectState
+from django.db.models import Q
 from django.test import SimpleTestCase
 
-from partial_index import PartialIndex, PQ
-from testapp.models import AB
+from partial_index import index, PartialIndex, PQ
+from testapp.models import AB, JobText, RoomBookingQ, RoomBookingText
 
 
 class PartialIndexTextBasedWhereRulesTest(SimpleTestCase):
@@ -259,3 +265,203 @@ class PartialIndexSinglePQWhereTest(SimpleTestCase):
         idx2 = PartialIndex(fields=['a', 'b'], unique=False, where=PQ(a__isnull=False))
         idx2.set_name_with_model(AB)
         self.assertNotEqual(idx1.name, idx2.name)
+
+    def test_changed_where_changes_generated_name(self):
+        # Names are cached by the value of the where condition, not the condition object.
+        where = PQ(a__isnull=True)
+        idx = PartialIndex(fields=['a', 'b'], unique=False, where=where)
+        idx.set_name_with_model(AB)
+        name = idx.name
+        where.children[0] = ('a__isnull', False)
+        idx.set_name_with_model(AB)
+        self.assertNotEqual(idx.name, name)
+        other = PartialIndex(fields=['a', 'b'], unique=False, where=PQ(a__isnull=False))
+        other.set_name_with_model(AB)
+        self.assertEqual(idx.name, other.name)
+
+    def test_name_cache_size(self):
+        size = index.NAME_CACHE_SIZE
+        index.NAME_CACHE_SIZE = 2
+        try:
+            for value in range(5):
+                PartialIndex(fields=['a'], unique=False, where=PQ(b=str(value))).set_name_with_model(AB)
+            self.assertEqual(len(index._name_cache), 2)
+        finally:
+            index.NAME_CACHE_SIZE = size
+
+
+class PartialIndexBuildSettingsTest(SimpleTestCase):
+    """Test the build_settings argument."""
+
+    def test_default_empty(self):
+        idx = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True))
+        self.assertEqual(idx.build_settings, {})
+        self.assertNotIn('build_settings', idx.deconstruct()[2])
+
+    def test_deconstruct(self):
+        idx = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True), build_settings={'maintenance_work_mem': '1GB'})
+        self.assertEqual(idx.deconstruct()[2]['build_settings'], {'maintenance_work_mem': '1GB'})
+
+    def test_build_settings_do_not_change_generated_name(self):
+        idx1 = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True))
+        idx1.set_name_with_model(AB)
+        idx2 = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True), build_settings={'maintenance_work_mem': '1GB'})
+        idx2.set_name_with_model(AB)
+        self.assertEqual(idx1.name, idx2.name)
+
+    def test_ignored_in_comparison(self):
+        idx1 = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='ab_a_partial')
+        idx2 = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='ab_a_partial', build_settings={'maintenance_work_mem': '1GB'})
+        self.assertEqual(idx1, idx2)
+        self.assertEqual(idx1.fingerprint(), idx2.fingerprint())
+
+    def test_no_migration(self):
+        def state(**kwargs):
+            project_state = ProjectState()
+            project_state.add_model(ModelState('testapp', 'ab', [('id', models.AutoField(primary_key=True)), ('a', models.CharField(max_length=50))], {
+                'indexes': [PartialIndex(fields=['a'], unique=True, where=PQ(a='x'), name='ab_a_partial', **kwargs)],
+            }))
+            return project_state
+
+        changes = MigrationAutodetector(state(), state(build_settings={'maintenance_work_mem': '1GB'}))._detect_changes()
+        self.assertEqual(changes, {})
+
+    def test_invalid_name(self):
+        with self.assertRaisesMessage(ValueError, 'Invalid build setting name'):
+            PartialIndex(fields=['a'], unique=True, where=PQ(a__isnull=True), build_settings={'work_mem = 1; DROP': '1GB'})
+
+    def test_settings_default(self):
+        idx = PartialIndex(fields=['a'], unique=True, where=PQ(a__isnull=True), build_settings={'maintenance_work_mem': '1GB'})
+        with self.settings(DJANGO_PARTIAL_INDEX_BUILD_SETTINGS={'maintenance_work_mem': '64MB', 'max_parallel_maintenance_workers': 4}):
+            self.assertEqual(idx.get_build_settings(), {'maintenance_work_mem': '1GB', 'max_parallel_maintenance_workers': 4})
+
+
+class PartialIndexNormalizeWhereTest(SimpleTestCase):
+    """Test the normalize_where argument."""
+
+    def test_default_off(self):
+        idx = PartialIndex(fields=['a'], unique=True, where=PQ(a__exact='x'))
+        self.assertEqual(idx.where, PQ(a__exact='x'))
+        self.assertNotIn('normalize_where', idx.deconstruct()[2])
+
+    def test_normalized(self):
+        idx = PartialIndex(fields=['a'], unique=True, where=~PQ(a__isnull=False) & PQ(b__in=['x']), normalize_where=True)
+        self.assertEqual(idx.where, PQ(a__isnull=True, b='x'))
+        self.assertIs(idx.deconstruct()[2]['normalize_where'], True)
+
+    def test_equivalent_conditions_same_name(self):
+        idx1 = PartialIndex(fields=['a'], unique=True, where=PQ(b='x') & PQ(a__isnull=True), normalize_where=True)
+        idx1.set_name_with_model(AB)
+        idx2 = PartialIndex(fields=['a'], unique=True, where=~PQ(a__isnull=False) & PQ(b__exact='x'), normalize_where=True)
+        idx2.set_name_with_model(AB)
+        self.assertEqual(idx1.name, idx2.name)
+
+    def test_text_where(self):
+        with self.assertRaisesMessage(ValueError, 'normalize_where can only be used with where=PQ().'):
+            PartialIndex(fields=['a'], unique=True, where='a IS NULL', normalize_where=True)
+
+
+class PartialIndexDeconstructCacheTest(SimpleTestCase):
+    """Test the cached deconstruction and fingerprint used for fast comparisons."""
+
+    def setUp(self):
+        self.idx = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True), name='ab_partial')
+
+    def test_deconstruct_cached(self):
+        first = self.idx.deconstruct()
+        self.assertEqual(first, self.idx.deconstruct())
+        first[2]['name'] = 'changed'
+        self.assertEqual(self.idx.deconstruct()[2]['name'], 'ab_partial')
+
+    def test_rename_invalidates(self):
+        fingerprint = self.idx.fingerprint()
+        self.idx.name = 'other_partial'
+        self.assertEqual(self.idx.deconstruct()[2]['name'], 'other_partial')
+        self.assertNotEqual(fingerprint, self.idx.fingerprint())
+
+    def test_where_change_invalidates(self):
+        fingerprint = self.idx.fingerprint()
+        self.idx.where = PQ(a__isnull=False)
+        self.assertEqual(self.idx.deconstruct()[2]['where'], PQ(a__isnull=False))
+        self.assertNotEqual(fingerprint, self.idx.fingerprint())
+
+    def test_index_attributes_invalidate(self):
+        fingerprint = self.idx.fingerprint()
+        self.idx.db_tablespace = 'fast_disk'
+        self.assertEqual(self.idx.deconstruct()[2]['db_tablespace'], 'fast_disk')
+        self.assertNotEqual(fingerprint, self.idx.fingerprint())
+
+        other = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True), name='ab_partial')
+        other.fingerprint()
+        other.opclasses = ['varchar_pattern_ops', 'varchar_pattern_ops']
+        self.assertEqual(other.deconstruct()[2]['opclasses'], ['varchar_pattern_ops', 'varchar_pattern_ops'])
+        self.assertNotEqual(other, PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True), name='ab_partial'))
+
+    def test_fields_changed_in_place_invalidate(self):
+        self.idx.deconstruct()
+        self.idx.fields.append('c')
+        self.assertEqual(self.idx.deconstruct()[2]['fields'], ['a', 'b', 'c'])
+
+    def test_equal(self):
+        other = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True), name='ab_partial')
+        self.assertEqual(self.idx.fingerprint(), other.fingerprint())
+        self.assertEqual(self.idx, other)
+        self.assertEqual(self.idx, self.idx.clone())
+
+    def test_not_equal(self):
+        self.assertNotEqual(self.idx, PartialIndex(fields=['a', 'b'], unique=False, where=PQ(a__isnull=True), name='ab_partial'))
+        self.assertNotEqual(self.idx, PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=False), name='ab_partial'))
+        self.assertNotEqual(self.idx, PartialIndex(fields=['a'], unique=True, where=PQ(a__isnull=True), name='ab_partial'))
+
+    def test_same_repr_not_equal(self):
+        # Q and PQ children have the same repr(), but are different where conditions.
+        idx1 = PartialIndex(fields=['a'], unique=True, where=PQ(Q(a=1) | Q(b=2), c=3), name='a_partial')
+        idx2 = PartialIndex(fields=['a'], unique=True, where=PQ(PQ(a=1) | PQ(b=2), c=3), name='a_partial')
+        self.assertNotEqual(idx1._comparable_deconstruct(), idx2._comparable_deconstruct())
+        self.assertNotEqual(idx1, idx2)
+
+    def test_equal_values_with_different_repr(self):
+        idx1 = PartialIndex(fields=['a'], unique=True, where=PQ(a=1), name='a_partial')
+        idx2 = PartialIndex(fields=['a'], unique=True, where=PQ(a=1.0), name='a_partial')
+        self.assertNotEqual(idx1.fingerprint(), idx2.fingerprint())
+        self.assertEqual(idx1, idx2)
+
+    def test_deepcopy(self):
+        fingerprint = self.idx.fingerprint()
+        clone = copy.deepcopy(self.idx)
+        self.assertIs(clone.where, self.idx.where)
+        self.assertIsNot(clone.fields, self.idx.fields)
+        self.assertEqual(clone.fingerprint(), fingerprint)
+        clone.set_name_with_model(AB)
+        self.assertEqual(self.idx.name, 'ab_partial')
+        self.assertNotEqual(clone, self.idx)
+
+
+class PartialIndexNameCacheTest(SimpleTestCase):
+    """Generated names must never change, as that would rename existing indexes."""
+
+    def test_names_unchanged(self):
+        self.assertEqual(RoomBookingText._meta.indexes[0].name, 'testapp_roo_user_id_0146d4_partial')
+        self.assertEqual(RoomBookingQ._meta.indexes[0].name, 'testapp_roo_user_id_6abb46_partial')
+        self.assertEqual(JobText._meta.indexes[0].name, 'testapp_job_order_f1011b_partial')
+        self.assertEqual(JobText._meta.indexes[1].name, 'testapp_job_group_35c9de_partial')
+
+    def test_cached_name(self):
+        where = PQ(a__isnull=True)
+        idx1 = PartialIndex(fields=['a', 'b'], unique=True, where=where)
+        idx1.set_name_with_model(AB)
+        idx2 = PartialIndex(fields=['a', 'b'], unique=True, where=where)
+        idx2.set_name_with_model(AB)
+        idx3 = PartialIndex(fields=['a', 'b'], unique=True, where=PQ(a__isnull=True))
+        idx3.set_name_with_model(AB)
+        self.assertEqual(idx1.name, idx2.name)
+        self.assertEqual(idx1.name, idx3.name)
+
+    def test_cache_key(self):
+        where = PQ(a__isnull=True)
+        names = set()
+        for fields, unique in [(['a', 'b'], True), (['a', 'b'], False), (['b', 'a'], True), (['a', '-b'], True)]:
+            idx = PartialIndex(fields=fields, unique=unique, where=where)
+            idx.set_name_with_model(AB)
+            names.add(idx.name)
+        self.assertEqual(len(names), 4)
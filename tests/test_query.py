@@ -2,11 +2,12 @@
 Tests for SQL CREATE INDEX statements.
 """
 
-from django.db import connection
-from django.test import TransactionTestCase
+from django.db import connection, models
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import isolate_apps
 
-from partial_index import query, PQ, PF
-from testapp.models import AB, ABC
+from partial_index import query, PartialIndex, PQ, PF
+from testapp.models import AB, ABC, RoomBookingQ, JobQ, Room, User
 
 
 class QueryToSqlTest(TransactionTestCase):
@@ -77,3 +78,175 @@ class QueryMentionedFieldsTest(TransactionTestCase):
 
     def test_or_extra(self):
         self.assertMentioned(PQ(a=12, b=34) | PQ(c=56), ['a', 'b', 'c'])
+
+
+class QueryMatchesTest(TransactionTestCase):
+    """Check that Q objects are evaluated in Python like in the database."""
+
+    def test_isnull(self):
+        self.assertTrue(query.q_matches(PQ(a__isnull=True), {'a': None}))
+        self.assertFalse(query.q_matches(PQ(a__isnull=True), {'a': 'x'}))
+        self.assertTrue(query.q_matches(PQ(a__isnull=False), {'a': 'x'}))
+
+    def test_exact(self):
+        self.assertTrue(query.q_matches(PQ(a='x'), {'a': 'x'}))
+        self.assertTrue(query.q_matches(PQ(a__exact='x'), {'a': 'x'}))
+        self.assertFalse(query.q_matches(PQ(a='x'), {'a': 'y'}))
+        self.assertTrue(query.q_matches(PQ(a=None), {'a': None}))
+
+    def test_f(self):
+        self.assertTrue(query.q_matches(PQ(a=PF('b')), {'a': 1, 'b': 1}))
+        self.assertFalse(query.q_matches(PQ(a=PF('b')), {'a': 1, 'b': 2}))
+
+    def test_comparisons(self):
+        self.assertTrue(query.q_matches(PQ(a__gt=1, a__lte=2), {'a': 2}))
+        self.assertFalse(query.q_matches(PQ(a__gt=1), {'a': None}))
+        self.assertTrue(query.q_matches(PQ(a__in=[1, 2]), {'a': 2}))
+
+    def test_connectors(self):
+        self.assertTrue(query.q_matches(PQ(a=1) | PQ(b=1), {'a': 2, 'b': 1}))
+        self.assertFalse(query.q_matches(PQ(a=1) & PQ(b=1), {'a': 2, 'b': 1}))
+        self.assertTrue(query.q_matches(~PQ(a=1), {'a': 2}))
+        self.assertTrue(query.q_matches(PQ(), {}))
+
+    def test_not_implemented(self):
+        with self.assertRaises(query.CannotEvaluate):
+            query.q_matches(PQ(a__contains='x'), {'a': 'xyz'})
+        with self.assertRaises(query.CannotEvaluate):
+            query.q_matches(PQ(a=PF('b') + 1), {'a': 1, 'b': 0})
+        with self.assertRaises(query.CannotEvaluate):
+            query.q_matches(PQ(c=1), {'a': 1})
+
+
+class NormalizeQTest(TransactionTestCase):
+    """Check that equivalent Q objects normalize to the same PQ, and compile to the same SQL."""
+
+    def assertSameSql(self, q1, q2):
+        with connection.schema_editor(collect_sql=True) as editor:
+            sql1 = query.q_to_sql(query.normalize_q(q1), AB, editor)
+            sql2 = query.q_to_sql(query.normalize_q(q2), AB, editor)
+        self.assertEqual(sql1, sql2)
+
+    def test_flatten_and_sort(self):
+        self.assertEqual(query.normalize_q(PQ(b='x') & (PQ(a='y') & PQ(b='z'))), PQ(a='y', b='x') & PQ(b='z'))
+        self.assertSameSql(PQ(b='x') & (PQ(a='y') & PQ(b='z')), PQ(a='y') & PQ(b='x', b__exact='z'))
+
+    def test_deduplicate(self):
+        self.assertEqual(query.normalize_q(PQ(a='x') & PQ(a__exact='x')), PQ(a='x'))
+        self.assertEqual(query.normalize_q(PQ(a='x') | (PQ(b='y') | PQ(a='x'))), PQ(a='x') | PQ(b='y'))
+
+    def test_negation(self):
+        self.assertEqual(query.normalize_q(~PQ(a__isnull=False)), PQ(a__isnull=True))
+        self.assertEqual(query.normalize_q(~~PQ(a='x')), PQ(a='x'))
+        self.assertEqual(query.normalize_q(~(PQ(a__isnull=False) | PQ(b='x'))), PQ(a__isnull=True) & ~PQ(b='x'))
+        self.assertEqual(query.normalize_q(~PQ(a='x', b__isnull=True)), PQ(b__isnull=False) | ~PQ(a='x'))
+
+    def test_fold_lookups(self):
+        self.assertEqual(query.normalize_q(PQ(a__exact='x')), PQ(a='x'))
+        self.assertEqual(query.normalize_q(PQ(a__in=['x'])), PQ(a='x'))
+        self.assertEqual(query.normalize_q(PQ(a__in=['y', 'x', 'y'])), PQ(a__in=['x', 'y']))
+        self.assertEqual(query.normalize_q(PQ(a__in=[None])), PQ(a__in=[None]))
+        self.assertEqual(query.normalize_q(PQ(a=None)), PQ(a__isnull=True))
+        self.assertEqual(query.normalize_q(PQ(a__isnull=1)), PQ(a__isnull=True))
+        self.assertEqual(query.normalize_q(PQ(a=PF('b'))), PQ(a=PF('b')))
+
+    def test_empty(self):
+        self.assertEqual(query.normalize_q(PQ()), PQ())
+
+    def test_idempotent(self):
+        q = PQ(b__exact='x') & ~(PQ(a__isnull=False) | PQ(c__in=['y']))
+        self.assertEqual(query.normalize_q(q), PQ(a__isnull=True, b='x') & ~PQ(c='y'))
+        self.assertEqual(query.normalize_q(query.normalize_q(q)), query.normalize_q(q))
+
+    def test_same_as_q_matches(self):
+        q = ~(PQ(a__isnull=False) | PQ(b__in=[1, 2])) | PQ(a=1)
+        for values in [{'a': None, 'b': 3}, {'a': None, 'b': 1}, {'a': 1, 'b': 1}, {'a': 2, 'b': 3}]:
+            self.assertEqual(query.q_matches(query.normalize_q(q), values), query.q_matches(q, values))
+
+
+class ConflictSqlTest(TransactionTestCase):
+    """Check the precompiled conflict lookup queries used by ValidatePartialUniqueMixin."""
+
+    def test_sql(self):
+        idx = RoomBookingQ._meta.indexes[0]
+        sql, params = query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], ['deleted_at'], True, connection)
+        self.assertEqual(sql, 'SELECT 1 FROM "testapp_roombookingq" WHERE "testapp_roombookingq"."room_id" = %s AND ' +
+                              '"testapp_roombookingq"."user_id" = %s AND "testapp_roombookingq"."deleted_at" IS NULL AND ' +
+                              '("testapp_roombookingq"."deleted_at" IS NULL) AND NOT ("testapp_roombookingq"."id" = %s) LIMIT 1')
+        self.assertEqual(params, [])
+
+    def test_cached(self):
+        idx = RoomBookingQ._meta.indexes[0]
+        first = query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], False, connection)
+        self.assertIs(first, query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], False, connection))
+        self.assertIsNot(first, query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], True, connection))
+
+    def test_where_params(self):
+        idx = JobQ._meta.indexes[1]
+        sql, params = query.conflict_sql(JobQ, idx, ['group', 'is_complete'], [], False, connection)
+        self.assertEqual(sql.count('%s'), 2 + len(params))
+
+    def test_clear_cache(self):
+        idx = RoomBookingQ._meta.indexes[0]
+        first = query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], False, connection)
+        query.clear_conflict_sql_cache()
+        self.assertIsNot(first, query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], False, connection))
+
+    def test_same_name_different_where(self):
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True), name='roombookingq_same_partial')
+        other = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=False), name='roombookingq_same_partial')
+        sql, params = query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], False, connection)
+        other_sql, other_params = query.conflict_sql(RoomBookingQ, other, ['room', 'user'], [], False, connection)
+        self.assertIn('("testapp_roombookingq"."deleted_at" IS NULL)', sql)
+        self.assertIn('("testapp_roombookingq"."deleted_at" IS NOT NULL)', other_sql)
+
+    def test_cache_size(self):
+        query.clear_conflict_sql_cache()
+        size = query.CONFLICT_SQL_CACHE_SIZE
+        query.CONFLICT_SQL_CACHE_SIZE = 2
+        try:
+            idx = RoomBookingQ._meta.indexes[0]
+            for field_names in (['room'], ['user'], ['room', 'user']):
+                query.conflict_sql(RoomBookingQ, idx, field_names, [], False, connection)
+            self.assertEqual([key[4] for key in query._conflict_sql_cache], [('user',), ('room', 'user')])
+        finally:
+            query.CONFLICT_SQL_CACHE_SIZE = size
+            query.clear_conflict_sql_cache()
+
+    def test_joined_where(self):
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(room__name='Room'), name='roombookingq_join_partial')
+        self.assertIsNone(query.conflict_sql(RoomBookingQ, idx, ['room', 'user'], [], False, connection))
+
+    @isolate_apps('testapp')
+    def test_inherited_field(self):
+        class Place(models.Model):
+            name = models.CharField(max_length=50)
+
+            class Meta:
+                app_label = 'testapp'
+
+        class Venue(Place):
+            deleted_at = models.DateTimeField(null=True)
+
+            class Meta:
+                app_label = 'testapp'
+
+        idx = PartialIndex(fields=['name'], unique=True, where=PQ(deleted_at__isnull=True), name='venue_name_partial')
+        self.assertIsNone(query.conflict_sql(Venue, idx, ['name'], [], True, connection))
+        idx = PartialIndex(fields=['deleted_at'], unique=True, where=PQ(name='x'), name='venue_deleted_partial')
+        self.assertIsNone(query.conflict_sql(Venue, idx, ['deleted_at'], [], True, connection))
+
+
+@override_settings(DJANGO_PARTIAL_INDEX_PRECOMPILED_QUERIES=True)
+class PrecompiledFallbackTest(TransactionTestCase):
+    """Check that conflict lookups that cannot be precompiled fall back to QuerySets."""
+
+    def test_joined_where(self):
+        user = User.objects.create(name='User')
+        room = Room.objects.create(name='Room')
+        RoomBookingQ.objects.create(user=user, room=room, deleted_at=None)
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(room__name='Room'), name='roombookingq_join_partial')
+        booking = RoomBookingQ(user=user, room=room)
+        self.assertTrue(booking._partial_unique_conflict_exists(idx, {'user': user.pk, 'room': room.pk}))
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(room__name='Other'), name='roombookingq_join_partial')
+        self.assertFalse(booking._partial_unique_conflict_exists(idx, {'user': user.pk, 'room': room.pk}))
@@ -0,0 +1,168 @@
+"""
+Tests for QuerySets scoped to a PartialIndex, with inlined where conditions.
+"""
+import datetime
+
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.db import connection, models
+from django.db.models import Exists, F, OuterRef
+from django.test import TestCase
+from django.test.utils import isolate_apps
+
+from partial_index import PartialIndex, PQ
+from partial_index.mixins import PartialUniqueValidationError
+from partial_index.queryset import PartialIndexQuerySet, PartialUniqueQuerySet, filter_for_index, inline_where_sql
+from testapp.models import JobQ, JobText, Label, Room, RoomBookingQ, User
+
+
+class InlineWhereSqlTest(TestCase):
+    def test_pq(self):
+        index = JobQ._meta.indexes[0]
+        self.assertEqual(inline_where_sql(JobQ, index, connection), '"testapp_jobq"."is_complete" = 0')
+
+    def test_text(self):
+        self.assertEqual(inline_where_sql(JobText, JobText._meta.indexes[0], connection), 'is_complete = 0')
+
+    @isolate_apps('testapp')
+    def test_percent_escaped(self):
+        class Product(models.Model):
+            name = models.CharField(max_length=50)
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [PartialIndex(fields=['id'], unique=False, where=PQ(name__startswith='50%'))]
+
+        sql = inline_where_sql(Product, Product._meta.indexes[0], connection)
+        self.assertIn("'50\\%%%%'", sql)
+        self.assertNotIn('%s', sql)
+
+    def test_recompiled_when_where_changes(self):
+        index = JobQ._meta.indexes[0]
+        inline_where_sql(JobQ, index, connection)
+        other = PartialIndex(fields=['-order'], unique=False, where=PQ(is_complete=True), name=index.name)
+        self.assertEqual(inline_where_sql(JobQ, other, connection), '"testapp_jobq"."is_complete" = 1')
+
+
+class PartialIndexQuerySetTest(TestCase):
+    def setUp(self):
+        for order in range(4):
+            JobQ.objects.create(order=order, group=order, is_complete=order % 2 == 0)
+            JobText.objects.create(order=order, group=order, is_complete=order % 2 == 0)
+
+    def test_for_index(self):
+        jobs = JobQ.objects.for_index(JobQ._meta.indexes[0]).order_by('order')
+        self.assertEqual([job.order for job in jobs], [1, 3])
+
+    def test_for_index_by_name(self):
+        jobs = JobText.objects.for_index(JobText._meta.indexes[1].name).filter(order__gt=1)
+        self.assertEqual([job.order for job in jobs], [3])
+
+    def test_user_values_stay_parameters(self):
+        queryset = JobQ.objects.for_index(JobQ._meta.indexes[0]).filter(group=3)
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        self.assertIn('"testapp_jobq"."is_complete" = 0', sql)
+        self.assertEqual(params, (3,))
+
+    def test_unknown_index(self):
+        with self.assertRaisesMessage(ValueError, 'PartialIndex not found on model testapp.JobQ.'):
+            JobQ.objects.for_index('nope')
+
+    def test_filter_for_index(self):
+        self.assertEqual(filter_for_index(JobQ.objects.all(), JobQ._meta.indexes[0]).count(), 2)
+
+    def test_aliased_table(self):
+        # In subqueries, Django relabels the table to U0, which the inlined condition must follow.
+        pending = JobQ.objects.for_index(JobQ._meta.indexes[0])
+        queryset = JobQ.objects.filter(pk__in=pending.values('pk'))
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        self.assertIn('U0."is_complete" = 0', sql)
+        self.assertEqual([job.order for job in queryset.order_by('order')], [1, 3])
+
+        pending = JobQ.objects.for_index(JobQ._meta.indexes[0]).filter(group=OuterRef('group'))
+        queryset = JobQ.objects.annotate(pending=Exists(pending)).filter(pending=True)
+        self.assertEqual([job.order for job in queryset.order_by('order')], [1, 3])
+
+    def test_text_aliased_table(self):
+        # Text-based conditions are added as written, without table names.
+        pending = JobText.objects.for_index(JobText._meta.indexes[0])
+        queryset = JobText.objects.filter(pk__in=pending.values('pk'))
+        self.assertEqual([job.order for job in queryset.order_by('order')], [1, 3])
+
+    def test_as_manager(self):
+        self.assertIsInstance(JobQ.objects.all(), PartialIndexQuerySet)
+
+    def test_filter_normalized(self):
+        queryset = JobQ.objects.filter_normalized(~PQ(is_complete=True) | PQ(order__in=[0]))
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        self.assertIn('("testapp_jobq"."order" = %s OR NOT ("testapp_jobq"."is_complete" = %s))', sql)
+        self.assertEqual([job.order for job in queryset.order_by('order')], [0, 1, 3])
+
+
+class PartialUniqueQuerySetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(name='User')
+        self.room1 = Room.objects.create(name='Room 1')
+        self.room2 = Room.objects.create(name='Room 2')
+        self.room3 = Room.objects.create(name='Room 3')
+        self.now = datetime.datetime(2026, 10, 18)
+        self.active = RoomBookingQ.objects.create(user=self.user, room=self.room1)
+        # Conflicts with the active booking.
+        self.deleted1 = RoomBookingQ.objects.create(user=self.user, room=self.room1, deleted_at=self.now)
+        # Conflict with each other.
+        self.deleted2a = RoomBookingQ.objects.create(user=self.user, room=self.room2, deleted_at=self.now)
+        self.deleted2b = RoomBookingQ.objects.create(user=self.user, room=self.room2, deleted_at=self.now)
+        # No conflicts.
+        self.deleted3 = RoomBookingQ.objects.create(user=self.user, room=self.room3, deleted_at=self.now)
+
+    def deleted(self):
+        return RoomBookingQ.objects.filter(deleted_at__isnull=False)
+
+    def test_update_conflicts(self):
+        conflicts = self.deleted().update_conflicts(deleted_at=None)
+        self.assertEqual(list(conflicts), [RoomBookingQ._meta.indexes[0].name])
+        conflicting = conflicts[RoomBookingQ._meta.indexes[0].name]
+        self.assertEqual(sorted(conflicting.values_list('pk', flat=True)), [self.deleted1.pk, self.deleted2b.pk])
+
+    def test_unrelated_update(self):
+        self.assertEqual(self.deleted().update_conflicts(deleted_at=self.now + datetime.timedelta(days=1)), {})
+        self.assertEqual(RoomBookingQ.objects.all().update_conflicts(user=self.user), {})
+
+    def test_key_update(self):
+        # Moving the active booking to room 3 does not conflict with the deleted booking there.
+        self.assertEqual(RoomBookingQ.objects.filter(pk=self.active.pk).update_conflicts(room=self.room3), {})
+        self.deleted3.deleted_at = None
+        self.deleted3.save()
+        conflicts = RoomBookingQ.objects.filter(pk=self.active.pk).update_conflicts(room=self.room3.pk)
+        self.assertEqual(len(conflicts), 1)
+        # Swapping rooms is allowed, as both rows are updated.
+        self.assertEqual(RoomBookingQ.objects.filter(pk__in=[self.active.pk, self.deleted3.pk]).update_conflicts(
+            room=F('room')), {})
+
+    def test_safe_update_raise(self):
+        with self.assertRaises(PartialUniqueValidationError) as context:
+            self.deleted().safe_update(deleted_at=None)
+        message = 'Updating would violate the unique index %s on user, room for 2 rows.' % RoomBookingQ._meta.indexes[0].name
+        self.assertEqual(context.exception.message_dict, {NON_FIELD_ERRORS: [message]})
+        self.assertEqual(self.deleted().count(), 4)
+
+    def test_safe_update_skip(self):
+        self.assertEqual(self.deleted().safe_update(deleted_at=None, on_conflict='skip'), 2)
+        self.assertEqual(sorted(self.deleted().values_list('pk', flat=True)), [self.deleted1.pk, self.deleted2b.pk])
+
+    def test_safe_update_no_conflicts(self):
+        self.assertEqual(RoomBookingQ.objects.filter(pk=self.deleted3.pk).safe_update(deleted_at=None), 1)
+
+    def test_invalid_on_conflict(self):
+        with self.assertRaisesMessage(ValueError, 'on_conflict must be "raise" or "skip".'):
+            self.deleted().safe_update(deleted_at=None, on_conflict='ignore')
+
+    def test_several_indexes(self):
+        labels = PartialUniqueQuerySet(Label)
+        Label.objects.create(room=self.room1, label='a', uuid='%032x' % 1, created_at=self.now)
+        Label.objects.create(room=self.room1, label='a', uuid='%032x' % 2, created_at=self.now + datetime.timedelta(seconds=1),
+                             deleted_at=self.now)
+        Label.objects.create(room=self.room2, label='b', uuid='%032x' % 1, created_at=self.now + datetime.timedelta(seconds=2),
+                             deleted_at=self.now)
+        conflicts = labels.filter(deleted_at__isnull=False).update_conflicts(deleted_at=None)
+        self.assertEqual(sorted(conflicts), sorted([Label._meta.indexes[0].name, Label._meta.indexes[2].name]))
+        self.assertEqual(labels.filter(deleted_at__isnull=False).safe_update(deleted_at=None, on_conflict='skip'), 0)
@@ -0,0 +1,82 @@
+"""
+Tests for PartialIndexQueue.
+"""
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from partial_index import PartialIndex
+from partial_index.queue import PartialIndexQueue
+from testapp.models import JobQ
+
+
+class PartialIndexQueueValidationTest(SimpleTestCase):
+    def test_index_by_name(self):
+        queue = PartialIndexQueue(JobQ, JobQ._meta.indexes[0].name, completed={'is_complete': True})
+        self.assertIs(queue.index, JobQ._meta.indexes[0])
+
+    def test_unknown_index(self):
+        with self.assertRaisesMessage(ValueError, 'PartialIndex not found on model testapp.JobQ.'):
+            PartialIndexQueue(JobQ, 'nope', completed={'is_complete': True})
+
+    def test_text_where(self):
+        index = PartialIndex(fields=['order'], unique=False, where='is_complete = 0')
+        with self.assertRaisesMessage(ValueError, 'PartialIndexQueue requires a PartialIndex with a PQ where condition.'):
+            PartialIndexQueue(JobQ, index, completed={'is_complete': True})
+
+    def test_completed_still_matches(self):
+        with self.assertRaisesMessage(ValueError, "The completed values {'is_complete': False} still match the index condition."):
+            PartialIndexQueue(JobQ, JobQ._meta.indexes[0], completed={'is_complete': False})
+
+    def test_claim_query_matches_index(self):
+        queue = PartialIndexQueue(JobQ, JobQ._meta.indexes[0], completed={'is_complete': True})
+        sql, params = queue.pending().query.get_compiler(connection=connection).as_sql()
+        where_sql = JobQ._meta.indexes[0].get_where_sql(JobQ, connection.schema_editor())
+        self.assertIn('WHERE %s ORDER BY' % where_sql, sql)
+        self.assertEqual(params, ())
+        self.assertTrue(sql.endswith('ORDER BY "testapp_jobq"."order" DESC'))
+
+
+class PartialIndexQueueTest(TestCase):
+    def setUp(self):
+        self.queue = PartialIndexQueue(JobQ, JobQ._meta.indexes[0], completed={'is_complete': True})
+        for order in range(5):
+            JobQ.objects.create(order=order, group=order, is_complete=order == 4)
+
+    def test_claim_and_complete(self):
+        with transaction.atomic():
+            jobs = self.queue.claim(2)
+            self.assertEqual([job.order for job in jobs], [3, 2])
+            self.assertEqual(self.queue.complete(jobs), 2)
+            self.assertTrue(all(job.is_complete for job in jobs))
+        with transaction.atomic():
+            jobs = self.queue.claim(5)
+            self.assertEqual([job.order for job in jobs], [1, 0])
+            self.queue.complete(jobs)
+        with transaction.atomic():
+            self.assertEqual(self.queue.claim(5), [])
+
+        metrics = self.queue.get_metrics()
+        self.assertEqual(metrics['claims'], 3)
+        self.assertEqual(metrics['claimed'], 4)
+        self.assertEqual(metrics['empty_claims'], 1)
+        self.assertEqual(metrics['completed'], 4)
+        self.assertGreaterEqual(metrics['completed_per_second'], 0)
+
+    def test_complete_by_pk(self):
+        pks = list(JobQ.objects.filter(order__lt=2).values_list('pk', flat=True))
+        self.assertEqual(self.queue.complete(pks), 2)
+        self.assertEqual(JobQ.objects.filter(is_complete=False).count(), 2)
+
+    def test_reset_metrics(self):
+        with transaction.atomic():
+            self.queue.claim(1)
+        self.queue.reset_metrics()
+        self.assertEqual(self.queue.get_metrics()['claims'], 0)
+        self.assertEqual(self.queue.get_metrics()['completed_per_second'], 0.0)
+
+
+class PartialIndexQueueTransactionTest(TransactionTestCase):
+    def test_claim_outside_transaction(self):
+        queue = PartialIndexQueue(JobQ, JobQ._meta.indexes[0], completed={'is_complete': True})
+        with self.assertRaisesMessage(transaction.TransactionManagementError, 'must be called inside a transaction'):
+            queue.claim(1)
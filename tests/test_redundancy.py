@@ -0,0 +1,204 @@
+"""
+Tests for finding redundant indexes.
+"""
+from django.core.checks.registry import registry
+from django.core.management import call_command, CommandError
+from django.db import connection, models
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import isolate_apps
+from io import StringIO
+
+from partial_index import PartialIndex, PQ, checks, redundancy
+from testapp.models import JobQ, User
+
+
+class WhereImpliesTest(SimpleTestCase):
+    def test_full_index(self):
+        self.assertTrue(redundancy.where_implies(PQ(a=1), None))
+        self.assertTrue(redundancy.where_implies(None, None))
+        self.assertFalse(redundancy.where_implies(None, PQ(a=1)))
+
+    def test_equal(self):
+        self.assertTrue(redundancy.where_implies(PQ(a=1) | PQ(b=2), PQ(a=1) | PQ(b=2)))
+        self.assertFalse(redundancy.where_implies(PQ(a=1) | PQ(b=2), PQ(a=1) | PQ(b=3)))
+
+    def test_conjunction(self):
+        self.assertTrue(redundancy.where_implies(PQ(a=1, b=2), PQ(a=1)))
+        self.assertTrue(redundancy.where_implies(PQ(a=1) & (PQ(b=2) & PQ(c=3)), PQ(c=3, a=1)))
+        self.assertFalse(redundancy.where_implies(PQ(a=1), PQ(a=1, b=2)))
+        self.assertFalse(redundancy.where_implies(PQ(a=1, b=2), PQ(a=2)))
+
+    def test_not_provable(self):
+        self.assertFalse(redundancy.where_implies(PQ(a=1) | PQ(b=2), PQ(a=1)))
+        self.assertFalse(redundancy.where_implies(~PQ(a=1, b=2), PQ(a=1)))
+        self.assertFalse(redundancy.where_implies(PQ(a=1), PQ(a__in=[1, 2])))
+
+    def test_text(self):
+        self.assertTrue(redundancy.where_implies('a is null', 'a is null'))
+        self.assertFalse(redundancy.where_implies('a is null and b is null', 'a is null'))
+
+
+@isolate_apps('testapp')
+class FindRedundantIndexesTest(SimpleTestCase):
+    def find(self, model, **kwargs):
+        return [(found.kind, found.index.name, found.covered_by.name) for found in redundancy.find_redundant_indexes(model, **kwargs)]
+
+    def test_duplicate(self):
+        class Model(models.Model):
+            a = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [
+                    PartialIndex(fields=['a'], unique=False, where=PQ(a__gt=0), name='first'),
+                    PartialIndex(fields=['a'], unique=False, where=PQ(a__gt=0), name='second'),
+                ]
+
+        self.assertEqual(self.find(Model), [('duplicate', 'second', 'first')])
+
+    def test_prefix(self):
+        class Model(models.Model):
+            a = models.IntegerField()
+            b = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [
+                    PartialIndex(fields=['a'], unique=False, where=PQ(a__gt=0, b=1), name='short'),
+                    PartialIndex(fields=['a', 'b'], unique=False, where=PQ(b=1), name='long'),
+                    PartialIndex(fields=['b'], unique=False, where=PQ(b=1), name='other'),
+                ]
+
+        self.assertEqual(self.find(Model), [('prefix', 'short', 'long')])
+
+    def test_predicate(self):
+        class Model(models.Model):
+            a = models.IntegerField(db_index=True)
+            b = models.BooleanField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [PartialIndex(fields=['a'], unique=False, where=PQ(b=True), name='narrow')]
+
+        self.assertEqual(self.find(Model), [('predicate', 'narrow', 'a (field index)')])
+
+    def test_unique(self):
+        class Model(models.Model):
+            a = models.IntegerField(db_index=True)
+            b = models.BooleanField()
+
+            class Meta:
+                app_label = 'testapp'
+                unique_together = [('a', 'b')]
+                indexes = [
+                    PartialIndex(fields=['a'], unique=True, where=PQ(b=True), name='unique_narrow'),
+                    PartialIndex(fields=['a', 'b'], unique=True, where=PQ(b=True), name='unique_both'),
+                ]
+
+        self.assertEqual(self.find(Model), [('predicate', 'unique_both', 'unique_together a, b')])
+
+    def test_order(self):
+        class Model(models.Model):
+            a = models.IntegerField()
+            b = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [
+                    PartialIndex(fields=['-a'], unique=False, where=PQ(b=1), name='desc'),
+                    PartialIndex(fields=['a', 'b'], unique=False, where=PQ(b=1), name='asc'),
+                ]
+
+        self.assertEqual(self.find(Model), [])
+
+    def test_partial_only(self):
+        class Model(models.Model):
+            a = models.IntegerField(db_index=True)
+            b = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                index_together = [('a', 'b')]
+
+        self.assertEqual(self.find(Model), [])
+        self.assertEqual(self.find(Model, partial_only=False), [('prefix', 'a (field index)', 'index_together a, b')])
+
+    def test_check(self):
+        class Model(models.Model):
+            a = models.IntegerField(db_index=True)
+            b = models.BooleanField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [PartialIndex(fields=['a'], unique=False, where=PQ(b=True), name='narrow')]
+
+        warnings = checks.check_redundant_indexes(app_configs=[Model._meta.apps.get_app_config('testapp')])
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0].id, 'partial_index.W003')
+        self.assertIs(warnings[0].obj, Model)
+        self.assertIn('Maintained on inserts matching its condition, and on updates of a, b.', warnings[0].hint)
+
+
+class RedundantIndexesTest(SimpleTestCase):
+    def test_installed_apps(self):
+        self.assertEqual(checks.check_redundant_indexes(), [])
+
+    def test_deploy_check(self):
+        self.assertNotIn(checks.check_redundant_indexes, registry.get_checks())
+        self.assertIn(checks.check_redundant_indexes, registry.get_checks(include_deployment_checks=True))
+
+
+class WriteCostTest(TestCase):
+    def setUp(self):
+        for order in range(4):
+            JobQ.objects.create(order=order, group=order, is_complete=order > 0)
+
+    def test_estimate(self):
+        index = redundancy.model_indexes(JobQ)[-1]
+        self.assertEqual(redundancy.write_cost(index), {'fields': ['group', 'is_complete'], 'entries_per_insert': 0.25})
+        # Only the first rows by primary key are scanned.
+        self.assertEqual(redundancy.write_cost(index, sample_size=2)['entries_per_insert'], 0.5)
+        self.assertEqual(redundancy.write_cost(index, estimate=False), {'fields': ['group', 'is_complete'], 'entries_per_insert': None})
+
+    def test_estimate_empty(self):
+        JobQ.objects.all().delete()
+        index = redundancy.model_indexes(JobQ)[-1]
+        self.assertEqual(redundancy.write_cost(index), {'fields': ['group', 'is_complete'], 'entries_per_insert': None})
+
+    def test_estimate_planner(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Planner estimates are only read on PostgreSQL.')
+        for order in range(4, 100):
+            JobQ.objects.create(order=order, group=order, is_complete=True)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE testapp_jobq')
+        index = redundancy.model_indexes(JobQ)[-1]
+        # The sample would find 25% of the first 4 rows.
+        self.assertAlmostEqual(redundancy.write_cost(index, sample_size=4)['entries_per_insert'], 0.01, delta=0.01)
+
+    def test_analyze(self):
+        index = redundancy.model_indexes(JobQ)[-1]
+        cost = redundancy.write_cost(index, analyze=True)
+        self.assertEqual(cost, {'fields': ['group', 'is_complete'], 'entries_per_insert': 0.25, 'rows': 4, 'indexed_rows': 1})
+        self.assertEqual(redundancy.describe_write_cost(cost), 'Maintained on 25% of inserts, and on updates of group, is_complete.')
+
+    def test_full_index(self):
+        index = redundancy.model_indexes(User)[0]
+        cost = redundancy.write_cost(index, analyze=True)
+        self.assertEqual(cost, {'fields': ['id'], 'entries_per_insert': 1.0, 'rows': 0, 'indexed_rows': 0})
+
+    def test_command(self):
+        out = StringIO()
+        call_command('partial_index_redundant', 'testapp', '--analyze', stdout=out)
+        self.assertEqual(out.getvalue(), 'Found 0 redundant indexes.\n')
+
+    def test_command_options(self):
+        # The command selects models by label, not one index of a model.
+        with self.assertRaisesMessage(TypeError, 'Unknown option(s) for partial_index_redundant command: index.'):
+            call_command('partial_index_redundant', 'testapp', index='testapp_jobq_group_partial', stdout=StringIO())
+
+    def test_command_unknown_label(self):
+        with self.assertRaisesMessage(CommandError, "No installed app with label 'nosuchapp'."):
+            call_command('partial_index_redundant', 'nosuchapp', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "App 'testapp' doesn't have a 'NoSuchModel' model."):
+            call_command('partial_index_sparse', 'testapp.NoSuchModel', stdout=StringIO())
@@ -0,0 +1,212 @@
+"""
+Tests for the reverse lookup registry of PartialIndexes, and the system checks for migrations and index names.
+"""
+from django.core.checks.registry import registry as registry_checks
+from django.core.exceptions import FieldError
+from django.db import migrations, models
+from django.db.migrations.exceptions import NodeNotFoundError
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import F
+from django.test import SimpleTestCase
+from django.test.utils import isolate_apps
+
+from partial_index import PartialIndex, PQ, checks, registry
+from testapp.models import JobQ, RoomBookingQ, RoomBookingText
+
+
+class RegistryTest(SimpleTestCase):
+    def test_indexed_field(self):
+        self.assertEqual(registry.indexes_for_field(RoomBookingQ, 'user'), tuple(RoomBookingQ._meta.indexes))
+        self.assertEqual(registry.indexes_for_field(RoomBookingQ, 'room'), tuple(RoomBookingQ._meta.indexes))
+
+    def test_where_field(self):
+        self.assertEqual(registry.indexes_for_field(RoomBookingQ, 'deleted_at'), tuple(RoomBookingQ._meta.indexes))
+        self.assertEqual(registry.indexes_for_field(JobQ, 'is_complete'), tuple(JobQ._meta.indexes))
+
+    def test_descending_field(self):
+        self.assertEqual(registry.indexes_for_field(JobQ, 'order'), (JobQ._meta.indexes[0],))
+        self.assertEqual(registry.indexes_for_field(JobQ, 'group'), (JobQ._meta.indexes[1],))
+
+    def test_text_where(self):
+        self.assertEqual(registry.indexes_for_field(RoomBookingText, 'user'), tuple(RoomBookingText._meta.indexes))
+        self.assertEqual(registry.indexes_for_field(RoomBookingText, 'deleted_at'), ())
+
+    def test_attname(self):
+        self.assertEqual(registry.indexes_for_field(RoomBookingQ, 'user_id'), tuple(RoomBookingQ._meta.indexes))
+
+    def test_label(self):
+        self.assertEqual(registry.indexes_for_field('testapp.RoomBookingQ', 'user'), tuple(RoomBookingQ._meta.indexes))
+
+    def test_unreferenced(self):
+        self.assertEqual(registry.indexes_for_field(RoomBookingQ, 'id'), ())
+        self.assertEqual(registry.indexes_for_field(RoomBookingQ, 'missing'), ())
+        self.assertEqual(registry.indexes_for_field('testapp.missing', 'user'), ())
+
+    def test_reset(self):
+        first = registry.get_registry()
+        self.assertIs(registry.get_registry(), first)
+        registry.reset_registry()
+        self.assertIsNot(registry.get_registry(), first)
+        self.assertEqual(registry.get_registry(), first)
+
+
+class RemovedFieldCheckTest(SimpleTestCase):
+    def migration(self, name, operations, app_label='testapp'):
+        migration = migrations.Migration(name, app_label)
+        migration.operations = operations
+        return migration
+
+    def initial(self, app_label='testapp'):
+        return self.migration('0001_initial', [migrations.CreateModel('Booking', [
+            ('id', models.AutoField(primary_key=True)),
+            ('user', models.IntegerField()),
+            ('deleted_at', models.DateTimeField(null=True)),
+            ('group', models.IntegerField()),
+            ('team', models.IntegerField()),
+        ], options={'indexes': [
+            PartialIndex(fields=['user'], unique=True, where=PQ(deleted_at__isnull=True), name='booking_user_partial'),
+            PartialIndex(fields=['team'], unique=False, where=PQ(group=F('team')), name='booking_team_partial'),
+        ]})], app_label=app_label)
+
+    def test_remove_field(self):
+        warnings = checks.removed_field_warnings([
+            self.initial(),
+            self.migration('0002_remove', [migrations.RemoveField('Booking', 'deleted_at')]),
+        ])
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0].id, 'partial_index.W001')
+        self.assertEqual(warnings[0].obj.name, 'booking_user_partial')
+        self.assertEqual(warnings[0].msg, 'Migration testapp.0002_remove removes field booking.deleted_at, '
+                                          'but PartialIndex booking_user_partial still references it.')
+
+    def test_rename_field(self):
+        warnings = checks.removed_field_warnings([
+            self.initial(),
+            self.migration('0002_rename', [migrations.RenameField('Booking', 'user', 'owner')]),
+        ])
+        self.assertEqual([(warning.id, warning.obj.name) for warning in warnings],
+                         [('partial_index.W002', 'booking_user_partial')])
+
+    def test_expression_field(self):
+        warnings = checks.removed_field_warnings([
+            self.initial(),
+            self.migration('0002_remove', [migrations.RemoveField('Booking', 'group')]),
+        ])
+        self.assertEqual([warning.obj.name for warning in warnings], ['booking_team_partial'])
+
+    def test_index_removed_first(self):
+        warnings = checks.removed_field_warnings([
+            self.initial(),
+            self.migration('0002_remove', [
+                migrations.RemoveIndex('Booking', 'booking_user_partial'),
+                migrations.RemoveField('Booking', 'deleted_at'),
+            ]),
+        ])
+        self.assertEqual(warnings, [])
+
+    def test_unreferenced_field(self):
+        warnings = checks.removed_field_warnings([
+            self.initial(),
+            self.migration('0002_remove', [migrations.RemoveField('Booking', 'id')]),
+        ])
+        self.assertEqual(warnings, [])
+
+    def test_app_labels(self):
+        migration_list = [
+            self.initial('otherapp'),
+            self.migration('0002_remove', [migrations.RemoveField('Booking', 'deleted_at')], app_label='otherapp'),
+        ]
+        self.assertEqual(checks.removed_field_warnings(migration_list, app_labels={'testapp'}), [])
+        self.assertEqual(len(checks.removed_field_warnings(migration_list, app_labels={'otherapp'})), 1)
+
+    def test_migration_files(self):
+        # The field no longer exists on any model, only in the migrations.
+        with self.settings(MIGRATION_MODULES={'testapp': 'testapp.removed_field_migrations'}):
+            warnings = checks.check_removed_fields()
+        self.assertEqual(len(warnings), 1)
+        self.assertEqual(warnings[0].id, 'partial_index.W001')
+        self.assertEqual(warnings[0].msg, 'Migration testapp.0002_remove_archived_archived_at removes field '
+                                          'archived.archived_at, but PartialIndex testapp_arc_number_partial still '
+                                          'references it.')
+
+    def test_installed_apps(self):
+        self.assertEqual(checks.check_removed_fields(), [])
+
+    def test_deploy_check(self):
+        self.assertNotIn(checks.check_removed_fields, registry_checks.get_checks())
+        self.assertIn(checks.check_removed_fields, registry_checks.get_checks(include_deployment_checks=True))
+
+    def test_bad_graph(self):
+        def build_graph(loader):
+            raise NodeNotFoundError('Migration testapp.0002 dependencies reference 0001', ('testapp', '0001'))
+
+        original = MigrationLoader.build_graph
+        MigrationLoader.build_graph = build_graph
+        try:
+            errors = checks.check_removed_fields()
+        finally:
+            MigrationLoader.build_graph = original
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].id, 'partial_index.E002')
+        self.assertEqual(errors[0].msg, 'Could not check migrations for removed fields: NodeNotFoundError: '
+                                        'Migration testapp.0002 dependencies reference 0001')
+
+    def test_field_error(self):
+        def removed_field_warnings(migrations, app_labels=None):
+            raise FieldError('Cannot resolve keyword')
+
+        original = checks.removed_field_warnings
+        checks.removed_field_warnings = removed_field_warnings
+        try:
+            errors = checks.check_removed_fields()
+        finally:
+            checks.removed_field_warnings = original
+        self.assertEqual([error.id for error in errors], ['partial_index.E002'])
+
+
+@isolate_apps('testapp')
+class IndexNameCheckTest(SimpleTestCase):
+    def test_collision(self):
+        class First(models.Model):
+            a = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [PartialIndex(fields=['a'], unique=True, where=PQ(a__gt=0), name='same_partial')]
+
+        class Second(models.Model):
+            a = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [PartialIndex(fields=['a'], unique=True, where=PQ(a__gt=1), name='same_partial')]
+
+        errors = checks.check_index_names(app_configs=[First._meta.apps.get_app_config('testapp')])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].id, 'partial_index.E001')
+        self.assertEqual(errors[0].msg, 'Index name same_partial is used by 2 indexes, on testapp.First, testapp.Second.')
+
+    def test_installed_apps(self):
+        self.assertEqual(checks.check_index_names(), [])
+
+    def test_deploy_check(self):
+        self.assertNotIn(checks.check_index_names, registry_checks.get_checks())
+        self.assertIn(checks.check_index_names, registry_checks.get_checks(include_deployment_checks=True))
+
+    def test_unhashable_cache_key(self):
+        class ListKeyIndex(PartialIndex):
+            def name_hash_cache_key(self):
+                return (self.unique, [self.where_postgresql])
+
+        class Model(models.Model):
+            a = models.IntegerField()
+
+            class Meta:
+                app_label = 'testapp'
+                indexes = [ListKeyIndex(fields=['a'], unique=True, where=PQ(a__gt=0), name='list_key_partial')]
+
+        errors = checks.check_index_names(app_configs=[Model._meta.apps.get_app_config('testapp')])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].id, 'partial_index.E003')
+        self.assertEqual(errors[0].msg, 'Could not compute the name cache key of index list_key_partial on '
+                                        "testapp.Model: TypeError: unhashable type: 'list'")
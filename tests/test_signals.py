@@ -0,0 +1,89 @@
+"""
+Tests for the partial_unique_checked signal and the instrumentation receivers.
+"""
+import logging
+
+from django.test import TransactionTestCase
+
+from partial_index import PartialUniqueValidationError
+from partial_index.instrumentation import DurationHistogram, LoggingReceiver
+from partial_index.signals import partial_unique_checked
+from testapp.models import User, Room, RoomBookingQ, NullableRoomNumberQ
+
+
+class PartialUniqueCheckedSignalTest(TransactionTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(name='User1')
+        self.room1 = Room.objects.create(name='Room1')
+        self.calls = []
+        partial_unique_checked.connect(self.receiver)
+
+    def tearDown(self):
+        partial_unique_checked.disconnect(self.receiver)
+
+    def receiver(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def test_no_conflict(self):
+        RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+        self.assertEqual(len(self.calls), 1)
+        call = self.calls[0]
+        self.assertIs(call['sender'], RoomBookingQ)
+        self.assertIs(call['index'], RoomBookingQ._meta.indexes[0])
+        self.assertFalse(call['skipped'])
+        self.assertFalse(call['conflict'])
+        self.assertGreaterEqual(call['duration'], 0)
+
+    def test_conflict(self):
+        RoomBookingQ.objects.create(user=self.user1, room=self.room1)
+        with self.assertRaises(PartialUniqueValidationError):
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(self.calls[0]['conflict'])
+
+    def test_skipped_null(self):
+        NullableRoomNumberQ(room=self.room1, room_number=None).validate_partial_unique()
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(self.calls[0]['skipped'])
+        self.assertIsNone(self.calls[0]['duration'])
+
+    def test_skipped_excluded(self):
+        RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique(exclude=['room'])
+        self.assertEqual(len(self.calls), 1)
+        self.assertTrue(self.calls[0]['skipped'])
+
+
+class InstrumentationReceiversTest(TransactionTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create(name='User1')
+        self.room1 = Room.objects.create(name='Room1')
+
+    def test_histogram(self):
+        histogram = DurationHistogram(buckets=[10]).connect()
+        try:
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+            RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique(exclude=['user'])
+        finally:
+            histogram.disconnect()
+        key = 'testapp.RoomBookingQ.%s' % RoomBookingQ._meta.indexes[0].name
+        stats = histogram.snapshot()[key]
+        self.assertEqual(stats['checks'], 1)
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(stats['conflicts'], 0)
+        self.assertEqual(stats['counts'], [1, 0])
+        self.assertEqual([key], [k for k, total in histogram.slowest()])
+
+        histogram.reset()
+        self.assertEqual(histogram.snapshot(), {})
+
+    def test_logging(self):
+        receiver = LoggingReceiver(level=logging.INFO)
+        partial_unique_checked.connect(receiver)
+        try:
+            with self.assertLogs('partial_index', level='INFO') as cm:
+                RoomBookingQ(user=self.user1, room=self.room1).validate_partial_unique()
+        finally:
+            partial_unique_checked.disconnect(receiver)
+        self.assertEqual(len(cm.output), 1)
+        self.assertIn('testapp.RoomBookingQ', cm.output[0])
+        self.assertIn('conflict=False', cm.output[0])
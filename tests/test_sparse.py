@@ -0,0 +1,121 @@
+"""
+Tests for finding sparse indexed columns.
+"""
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, models
+from django.db.migrations import operations
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import isolate_apps
+
+from partial_index import PQ
+from partial_index.sparse import (ColumnStats, SparseColumn, column_stats, find_sparse_columns, indexed_sparse_candidates,
+                                  _index_bytes, _index_db_name)
+from testapp.models import Label, Room, User
+
+
+class IndexedSparseCandidatesTest(SimpleTestCase):
+    def test_label(self):
+        # Foreign keys are indexed. Unique fields and partial indexes are skipped.
+        self.assertEqual([field.name for field, index in indexed_sparse_candidates(Label)], ['room', 'user'])
+
+    @isolate_apps('testapp')
+    def test_indexes(self):
+        class Sparse(models.Model):
+            a = models.IntegerField(null=True, db_index=True)
+            b = models.IntegerField(null=True)
+            c = models.IntegerField(null=True)
+            d = models.IntegerField(db_index=True)
+            e = models.IntegerField(null=True, unique=True)
+
+            class Meta:
+                app_label = 'testapp'
+                index_together = [['b']]
+                indexes = [models.Index(fields=['c'], name='sparse_c_idx'), models.Index(fields=['a', 'c'], name='sparse_ac_idx')]
+
+        candidates = list(indexed_sparse_candidates(Sparse))
+        self.assertEqual([field.name for field, index in candidates], ['a', 'b', 'c'])
+
+        stats = ColumnStats(1000, 0.95, 3)
+        a, b, c = [SparseColumn(Sparse, field, index, stats).operations() for field, index in candidates]
+        self.assertIsInstance(a[0], operations.AlterField)
+        self.assertFalse(a[0].field.db_index)
+        self.assertTrue(a[0].field.null)
+        self.assertIsInstance(b[0], operations.AlterIndexTogether)
+        self.assertEqual(b[0].option_value, set())
+        self.assertIsInstance(c[0], operations.RemoveIndex)
+        self.assertEqual(c[0].name, 'sparse_c_idx')
+        self.assertEqual(c[1].index.where, PQ(c__isnull=False))
+        self.assertEqual(c[1].index.fields, ['c'])
+        self.assertTrue(c[1].index.name.endswith('_partial'))
+
+
+class ColumnStatsTest(SimpleTestCase):
+    def test_saved_bytes(self):
+        self.assertEqual(ColumnStats(1000, 0.5, 10).saved_bytes, 8000)
+        self.assertEqual(ColumnStats(1000, 0.5, 10, index_bytes=65536).saved_bytes, 32768)
+
+
+class FindSparseColumnsTest(TestCase):
+    def setUp(self):
+        room = Room.objects.create(name='Room')
+        user = User.objects.create(name='User')
+        now = datetime.datetime(2026, 10, 18)
+        for i in range(20):
+            Label.objects.create(room=room if i == 0 else None, user=user if i < 10 else None, label=str(i), uuid='%032x' % i,
+                                 created_at=now + datetime.timedelta(seconds=i))
+
+    def test_column_stats(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('PostgreSQL statistics require ANALYZE.')
+        stats = column_stats(Label, Label._meta.get_field('room'))
+        self.assertEqual((stats.rows, stats.null_frac, stats.n_distinct), (20, 0.95, 1))
+        stats = column_stats(Label, Label._meta.get_field('room'), sample_size=10)
+        self.assertEqual((stats.rows, stats.null_frac), (20, 0.9))
+
+    def test_find(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('PostgreSQL statistics require ANALYZE.')
+        found = find_sparse_columns(Label)
+        self.assertEqual([sparse.field.name for sparse in found], ['room'])
+        self.assertEqual([sparse.field.name for sparse in find_sparse_columns(Label, min_null_frac=0.5)], ['room', 'user'])
+
+    def test_index_db_name(self):
+        field = Label._meta.get_field('room')
+        (index,) = [index for candidate, index in indexed_sparse_candidates(Label) if candidate == field]
+        name = _index_db_name(connection, Label, field, index)
+        # The size of this index is read, not of another index on the column.
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'testapp_label')
+        self.assertEqual(constraints[name]['columns'], ['room_id'])
+        self.assertFalse(constraints[name]['unique'])
+
+    def test_index_bytes(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Index sizes are only read on PostgreSQL.')
+        field = Label._meta.get_field('room')
+        (index,) = [index for candidate, index in indexed_sparse_candidates(Label) if candidate == field]
+        name = _index_db_name(connection, Label, field, index)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_relation_size(%s::regclass)', [name])
+            expected = cursor.fetchone()[0]
+        self.assertEqual(_index_bytes(connection, name), expected)
+        self.assertIsNone(_index_bytes(connection, 'no_such_index'))
+
+    def test_empty_table(self):
+        self.assertEqual(find_sparse_columns(Room), [])
+
+    def test_command(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('PostgreSQL statistics require ANALYZE.')
+        out = StringIO()
+        call_command('partial_index_sparse', 'testapp.Label', stdout=out)
+        output = out.getvalue()
+        self.assertIn('# testapp.Label.room: 95.0% NULL, 1 distinct values, saves about 304 bytes.', output)
+        self.assertIn("# Declaration: PartialIndex(fields=['room'], unique=False, where=PQ(room__isnull=False)),", output)
+        self.assertIn("migrations.AlterField(\n    model_name='label',\n    name='room',", output)
+        self.assertIn("where=partial_index.PQ(room__isnull=False)", output)
+        self.assertIn('import partial_index', output)
+        self.assertTrue(output.endswith('Found 1 sparse indexed columns.\n'))
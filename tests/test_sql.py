@@ -1,8 +1,8 @@
 """
 Tests for SQL CREATE INDEX statements.
 """
-from django.db import connection
-from django.test import TransactionTestCase
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TransactionTestCase
 import re
 
 from partial_index import PartialIndex, PQ
@@ -120,6 +120,76 @@ class PartialIndexSqlTest(TransactionTestCase):
             editor.create_model(ComparisonQ)
         self.assertContainsMatch(editor.collected_sql, COMPARISON_Q_SQL)
 
+    def test_build_settings_createsql(self):
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True),
+                           name='testapp_roombookingq_build_partial', build_settings={'maintenance_work_mem': '1GB'})
+        with self.schema_editor() as editor:
+            sql = idx.create_sql(RoomBookingQ, editor)
+            if editor.connection.vendor == 'postgresql':
+                self.assertTrue(sql.startswith("SET LOCAL maintenance_work_mem = '1GB'; CREATE UNIQUE INDEX "), sql)
+            else:
+                self.assertTrue(sql.startswith('CREATE UNIQUE INDEX '), sql)
+
+    def test_partition_createsql(self):
+        idx = RoomBookingQ._meta.indexes[0]
+        with self.schema_editor() as editor:
+            sql = idx.create_sql(RoomBookingQ, editor, concurrently=True, table='testapp_roombookingq_2026', name='part_partial')
+            if editor.connection.vendor == 'postgresql':
+                self.assertEqual(sql, 'CREATE UNIQUE INDEX CONCURRENTLY "part_partial" ON "testapp_roombookingq_2026" '
+                                      '("user_id", "room_id") WHERE "testapp_roombookingq_2026"."deleted_at" IS NULL')
+                sql = idx.create_sql(RoomBookingQ, editor, only=True)
+                self.assertRegex(sql, r'^CREATE UNIQUE INDEX "testapp_[a-zA-Z0-9_]+_partial" ON ONLY "testapp_roombookingq" ')
+            else:
+                self.assertEqual(sql, 'CREATE UNIQUE INDEX "part_partial" ON "testapp_roombookingq_2026" '
+                                      '("user_id", "room_id") WHERE "testapp_roombookingq_2026"."deleted_at" IS NULL')
+                with self.assertRaisesMessage(ValueError, 'only supported on PostgreSQL'):
+                    idx.create_sql(RoomBookingQ, editor, only=True)
+
+    def test_createsql_statements(self):
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True),
+                           name='testapp_roombookingq_build_partial', build_settings={'maintenance_work_mem': '1GB'})
+        with self.schema_editor() as editor:
+            statements = idx.create_sql_statements(RoomBookingQ, editor, concurrently=True)
+            if editor.connection.vendor == 'postgresql':
+                self.assertTrue(statements[0].startswith('SET '), statements)
+                self.assertTrue(statements[1].startswith('CREATE UNIQUE INDEX CONCURRENTLY '), statements)
+            else:
+                self.assertEqual(statements, [idx.create_sql(RoomBookingQ, editor)])
+
+
+class ExecuteCreateSqlTest(SimpleTestCase):
+    class RecordingCursor(object):
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, sql):
+            self.statements.append(sql)
+            if sql.startswith('CREATE'):
+                raise DatabaseError('could not create index')
+
+    class SettingsIndex(PartialIndex):
+        def build_settings_wrapper(self, schema_editor):
+            return ["SET maintenance_work_mem = '1GB'"], ['RESET maintenance_work_mem']
+
+    def test_reset_after_failure(self):
+        idx = self.SettingsIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True),
+                                 name='testapp_roombookingq_build_partial')
+        cursor = self.RecordingCursor()
+        with self.assertRaisesMessage(DatabaseError, 'could not create index'):
+            idx.execute_create_sql(cursor, RoomBookingQ, connection.schema_editor())
+        self.assertEqual(cursor.statements[0], "SET maintenance_work_mem = '1GB'")
+        self.assertTrue(cursor.statements[1].startswith('CREATE UNIQUE INDEX '), cursor.statements)
+        self.assertEqual(cursor.statements[2:], ['RESET maintenance_work_mem'])
+
+    def test_statements(self):
+        idx = PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True),
+                           name='testapp_roombookingq_build_partial', build_settings={'maintenance_work_mem': '1GB'})
+        cursor = self.RecordingCursor()
+        editor = connection.schema_editor()
+        with self.assertRaises(DatabaseError):
+            idx.execute_create_sql(cursor, RoomBookingQ, editor)
+        self.assertEqual(cursor.statements, idx.create_sql_statements(RoomBookingQ, editor))
+
 
 class PartialIndexCreateTest(TransactionTestCase):
     """Check that the index really can be added to and removed from the model in the DB."""
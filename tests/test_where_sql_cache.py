@@ -0,0 +1,95 @@
+"""
+Tests for PartialIndex where_sql_cache, and the command verifying it.
+"""
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import SimpleTestCase
+from io import StringIO
+
+from partial_index import PartialIndex, PQ
+from testapp.models import AB, PinnedWhere
+
+
+class WhereSqlCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.idx = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='ab_a_partial',
+                                where_sql_cache={'sqlite': '"testapp_ab"."b" = \'cached\''})
+
+    def test_validation(self):
+        with self.assertRaisesMessage(ValueError, 'where_sql_cache can only be used with where=PQ().'):
+            PartialIndex(fields=['a'], unique=True, where='b IS NULL', where_sql_cache={'sqlite': 'b IS NULL'})
+        with self.assertRaisesMessage(ValueError, "Invalid where_sql_cache vendor 'mysql'."):
+            PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), where_sql_cache={'mysql': 'b IS NULL'})
+        with self.assertRaisesMessage(ValueError, 'where_sql_cache values must be non-empty strings.'):
+            PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), where_sql_cache={'sqlite': ''})
+
+    def test_deconstruct(self):
+        path, args, kwargs = self.idx.deconstruct()
+        self.assertEqual(kwargs['where_sql_cache'], {'sqlite': '"testapp_ab"."b" = \'cached\''})
+        self.assertEqual(self.idx.clone().where_sql_cache, self.idx.where_sql_cache)
+        self.assertNotIn('where_sql_cache', PartialIndex(fields=['a'], unique=True, where=PQ(b='x')).deconstruct()[2])
+
+    def test_ignored_in_comparison(self):
+        other = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='ab_a_partial')
+        self.assertEqual(self.idx.fingerprint(), other.fingerprint())
+        self.assertEqual(self.idx, other)
+        other.where = PQ(b='y')
+        self.assertNotEqual(self.idx, other)
+
+    def test_name_unchanged(self):
+        idx1 = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'))
+        idx1.set_name_with_model(AB)
+        idx2 = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), where_sql_cache={'sqlite': 'b = 1'})
+        idx2.set_name_with_model(AB)
+        self.assertEqual(idx1.name, idx2.name)
+
+    def test_stale_table(self):
+        idx = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='ab_a_partial',
+                           where_sql_cache={'sqlite': '"testapp_old_ab"."b" = \'x\'', 'postgresql': '"testapp_old_ab"."b" = \'x\''})
+        with self.assertRaisesMessage(ValueError, 'where_sql_cache of index ab_a_partial does not reference table "testapp_ab"'):
+            idx.create_sql(AB, connection.schema_editor())
+
+    def test_verify_setting(self):
+        editor = connection.schema_editor()
+        with self.settings(DJANGO_PARTIAL_INDEX_VERIFY_WHERE_SQL_CACHE=True):
+            with self.assertRaisesMessage(ValueError, 'but the where condition compiles to'):
+                self.idx.create_sql(AB, editor)
+            idx = PartialIndex(fields=['a'], unique=True, where=PQ(b='x'), name='ab_a_partial',
+                               where_sql_cache={'sqlite': '"testapp_ab"."b" = \'x\'', 'postgresql': '"testapp_ab"."b" = \'x\''})
+            self.assertIn('WHERE "testapp_ab"."b" = \'x\'', str(idx.create_sql(AB, editor)))
+
+    def test_create_sql(self):
+        editor = connection.schema_editor()
+        self.assertIn('WHERE "testapp_ab"."b" = \'cached\'', str(self.idx.create_sql(AB, editor)))
+        self.assertEqual(self.idx.compile_where_sql(AB, editor), '"testapp_ab"."b" = \'x\'')
+
+
+class WhereSqlCommandTest(SimpleTestCase):
+    def test_print(self):
+        out = StringIO()
+        call_command('partial_index_where_sql', 'testapp.PinnedWhere', stdout=out)
+        self.assertEqual(out.getvalue(), (
+            '# testapp.PinnedWhere testapp_pin_number_9bdebe_partial\n'
+            'where_sql_cache={\'sqlite\': \'"testapp_pinnedwhere"."deleted_at" IS NULL\'},\n'
+        ))
+
+    def test_check(self):
+        out = StringIO()
+        call_command('partial_index_where_sql', '--check', stdout=out)
+        self.assertEqual(out.getvalue(), (
+            'model testapp.PinnedWhere, testapp_pin_number_9bdebe_partial: not verified for postgresql, '
+            'no such database configured.\n'
+            'Verified where_sql_cache of 1 indexes.\n'
+        ))
+
+    def test_check_mismatch(self):
+        idx = PinnedWhere._meta.indexes[0]
+        where_sql_cache = idx.where_sql_cache
+        idx.where_sql_cache = {'sqlite': 'stale'}
+        try:
+            err = StringIO()
+            with self.assertRaisesMessage(CommandError, '1 where_sql_cache entries do not match their where conditions.'):
+                call_command('partial_index_where_sql', '--check', stdout=StringIO(), stderr=err)
+        finally:
+            idx.where_sql_cache = where_sql_cache
+        self.assertIn("where_sql_cache for sqlite is 'stale'", err.getvalue())
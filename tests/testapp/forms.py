@@ -1,6 +1,8 @@
 """ModelForms for testing ValidatePartialUniqueMixin."""
 from django import forms
 
+from partial_index.forms import PartialUniqueModelFormSet
+
 from testapp.models import RoomBookingQ, RoomBookingText, NullableRoomNumberQ
 
 
@@ -37,3 +39,7 @@ class NullableRoomNumberAllFieldsForm(forms.ModelForm):
     class Meta:
         model = NullableRoomNumberQ
         fields = ('room', 'room_number', 'deleted_at')
+
+
+RoomBookingFormSet = forms.modelformset_factory(
+    RoomBookingQ, formset=PartialUniqueModelFormSet, fields=('user', 'room', 'deleted_at'), extra=0)
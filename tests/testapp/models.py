@@ -4,6 +4,9 @@ from __future__ import unicode_literals
 from django.db import models
 
 from partial_index import PartialIndex, PQ, PF, ValidatePartialUniqueMixin
+from partial_index.queryset import PartialIndexQuerySet, PartialUniqueQuerySet
+from partial_index.rolling import RollingPartialIndex
+from partial_index.tenants import TenantPartialIndexes
 
 
 class AB(models.Model):
@@ -49,6 +52,8 @@ class RoomBookingQ(ValidatePartialUniqueMixin, models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = PartialUniqueQuerySet.as_manager()
+
     class Meta:
         indexes = [PartialIndex(fields=['user', 'room'], unique=True, where=PQ(deleted_at__isnull=True))]
 
@@ -58,6 +63,8 @@ class JobText(models.Model):
     group = models.IntegerField()
     is_complete = models.BooleanField(default=False)
 
+    objects = PartialIndexQuerySet.as_manager()
+
     class Meta:
         indexes = [
             PartialIndex(fields=['-order'], unique=False, where_postgresql='is_complete = false', where_sqlite='is_complete = 0'),
@@ -70,6 +77,8 @@ class JobQ(ValidatePartialUniqueMixin, models.Model):
     group = models.IntegerField()
     is_complete = models.BooleanField(default=False)
 
+    objects = PartialIndexQuerySet.as_manager()
+
     class Meta:
         indexes = [
             PartialIndex(fields=['-order'], unique=False, where=PQ(is_complete=False)),
@@ -117,6 +126,18 @@ class NullableRoomNumberQ(ValidatePartialUniqueMixin, models.Model):
         indexes = [PartialIndex(fields=['room', 'room_number'], unique=True, where=PQ(deleted_at__isnull=True))]
 
 
+class PinnedWhere(models.Model):
+    """Partial index with its compiled where condition pinned in where_sql_cache."""
+    number = models.IntegerField()
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [PartialIndex(fields=['number'], unique=True, where=PQ(deleted_at__isnull=True), where_sql_cache={
+            'postgresql': '"testapp_pinnedwhere"."deleted_at" IS NULL',
+            'sqlite': '"testapp_pinnedwhere"."deleted_at" IS NULL',
+        })]
+
+
 class Label(ValidatePartialUniqueMixin, models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -132,3 +153,33 @@ class Label(ValidatePartialUniqueMixin, models.Model):
             PartialIndex(fields=['uuid'], unique=True, where=PQ(deleted_at__isnull=True)),
         ]
         unique_together = [['room', 'user']]  # Regardless of deletion status
+
+
+class Ticket(ValidatePartialUniqueMixin, models.Model):
+    """Partial unique index whose condition is matched by several values of a field."""
+    code = models.CharField(max_length=50)
+    status = models.IntegerField()
+
+    class Meta:
+        indexes = [PartialIndex(fields=['code'], unique=True, where=PQ(status__lt=3))]
+
+
+class Event(models.Model):
+    """Partial indexes managed at runtime, instead of in Meta.indexes."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    is_public = models.BooleanField(default=True)
+
+    recent = RollingPartialIndex(fields=['user'], field='created_at', granularity='month', window=2, where=PQ(is_public=True))
+    large_users = TenantPartialIndexes(fields=['created_at'], field='user', values=[])
+
+
+class Measurement(models.Model):
+    """Not managed, as the partition tests create its table as a PostgreSQL partitioned table."""
+    logdate = models.DateField()
+    value = models.IntegerField()
+    archived = models.BooleanField(default=False)
+
+    class Meta:
+        managed = False
+        indexes = [PartialIndex(fields=['value'], unique=False, where=PQ(archived=False), name='testapp_meas_value_partial')]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+import partial_index
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='Archived',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('archived_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [partial_index.PartialIndex(fields=['number'], name='testapp_arc_number_partial', unique=True, where=partial_index.PQ(archived_at__isnull=True))],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from testapp.models import RoomBookingText, RoomBookingQ
+from partial_index.serializers import PartialUniqueListSerializer
+from testapp.models import RoomBookingText, RoomBookingQ, Label
 
 
 class RoomBookingTextSerializer(serializers.ModelSerializer):
@@ -29,3 +30,19 @@ class RoomBookingJustRoomSerializer(serializers.ModelSerializer):
     class Meta:
         model = RoomBookingQ
         fields = ('room', )
+
+
+class RoomBookingBulkSerializer(serializers.ModelSerializer):
+    """Validates partial unique indexes for all items at once with many=True."""
+    class Meta:
+        model = RoomBookingQ
+        fields = ('user', 'room', 'deleted_at')
+        list_serializer_class = PartialUniqueListSerializer
+
+
+class LabelBulkSerializer(serializers.ModelSerializer):
+    """Model with several partial unique indexes, one of them on a single field."""
+    class Meta:
+        model = Label
+        fields = ('room', 'user', 'label', 'uuid', 'created_at', 'deleted_at')
+        list_serializer_class = PartialUniqueListSerializer